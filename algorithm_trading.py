@@ -2,28 +2,216 @@ import threading
 import order_queue as oq
 import market_data as m
 import time
-import heapq
+from typing import Iterator, Sequence
+import numpy as np
+import bar_frame as bf
+import scoring_engine as se
+import parallel_analysis as pa
+import symbol_ranking as sr
+import analysis_pipeline as ap
+import result_cache as rc
 
-# TODO implement max heap to store SymbolStat values, rethink how time_strength and stability_strength are used in
-#  comparisons
+# TODO rethink how time_strength and stability_strength are used in comparisons
 
 
 class SymbolStat:
     """
     Each instance of this class holds a symbol, stability_strength and time_strength used to determine which symbol
     is better, strengths documented in the __init__ method.
+
+    A SymbolStat made with from_bars (or a new one fed bars one at a time) can be kept up to date with update(bar)
+    instead of scoring the whole history again. It keeps running sums n, sum_of_x, sum_of_y, sum_of_xy and sum_of_xx
+    for the line of best fit and prefix sums of y and x * y for the time_strength windows, both grown in O(1) per bar.
+    time_strength is recalculated exactly in O(1) per window. stability_strength adds each new bar's percent off from
+    the line as it was at the last full recalculation, every window_size bars it is recalculated exactly against the
+    current line, so it is exact every window_size bars and an amortized O(1 / window_percent) per bar.
+    Uses __slots__ since one is held per symbol in the universe.
     """
-    def __init__(self, symbol: str):
+    __slots__ = (
+        "symbol", "stability_strength", "time_strength", "strength", "window_percent", "n", "sum_of_x", "sum_of_y",
+        "sum_of_xy", "sum_of_xx", "last_timestamp", "_prices", "_cumulative_y", "_cumulative_xy", "_stability_line",
+        "_stability_sum", "_stability_exact_at"
+    )
+
+    INITIAL_CAPACITY: int = 64  # Bars room is made for before the price and prefix sum arrays are first grown
+
+    def __init__(self, symbol: str, window_percent: float = 0.01):
         """
         stability_strength is how close all the data points are to the line of best fit, max score is 0.0
         time_strength is how consistent the graph is increasing, min score is 0
         :param str as symbol:
+        :param float as window_percent: Window percent update scores time_strength with
         """
         self.symbol: str = symbol
         self.stability_strength: float = 0.0
         self.time_strength: float = 0.0
         self.strength: float = 0.0
 
+        self.window_percent: float = window_percent
+        self.n: int = 0
+        self.sum_of_x: float = 0.0
+        self.sum_of_y: float = 0.0
+        self.sum_of_xy: float = 0.0
+        self.sum_of_xx: float = 0.0
+        self.last_timestamp: int | None = None  # Epoch seconds of the newest bar whatever form its "t" came in
+
+        # Created on the first update so SymbolStats that are never updated stay small
+        self._prices: np.ndarray | None = None
+        self._cumulative_y: np.ndarray | None = None
+        self._cumulative_xy: np.ndarray | None = None
+        self._stability_line: tuple[float, float] = (0.0, 0.0)  # slope, y-intercept the running percents are off from
+        self._stability_sum: float = 0.0
+        self._stability_exact_at: int = 0  # n when stability_strength was last recalculated exactly
+
+    @staticmethod
+    def from_bars(
+            symbol: str,
+            symbol_data: list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray,
+            window_percent: float = 0.01
+    ) -> "SymbolStat":
+        """
+        Scores the bars like DataAnalysis.score_symbol and keeps the running state so later bars can be added with
+        update
+        :param str as symbol:
+        :param list[dict[str, float | int | str]] or BarFrame or np.ndarray as symbol_data: np.ndarray holds only the prices
+        :param float as window_percent:
+        :return SymbolStat:
+        """
+        symbol_stat: SymbolStat = SymbolStat(symbol, window_percent)
+        prices: np.ndarray = se.ScoringEngine.prices_of(symbol_data)
+        if len(prices) == 0:
+            return symbol_stat
+
+        symbol_stat.__reserve(len(prices))
+        n: int = len(prices)
+        x: np.ndarray = np.arange(n, dtype=np.float64)
+        symbol_stat._prices[:n] = prices
+        np.cumsum(prices, out=symbol_stat._cumulative_y[1:n + 1])
+        np.cumsum(prices * x, out=symbol_stat._cumulative_xy[1:n + 1])
+
+        symbol_stat.n = n
+        symbol_stat.sum_of_x = float(x.sum())
+        symbol_stat.sum_of_y = float(symbol_stat._cumulative_y[n])
+        symbol_stat.sum_of_xy = float(symbol_stat._cumulative_xy[n])
+        symbol_stat.sum_of_xx = float(x @ x)
+        if isinstance(symbol_data, bf.BarFrame):
+            symbol_stat.last_timestamp = int(symbol_data.t[-1])
+        elif isinstance(symbol_data, list):
+            symbol_stat.last_timestamp = SymbolStat.__epoch(symbol_data[-1]["t"])
+
+        symbol_stat.__recalculate_stability()
+        symbol_stat.__recalculate_time_strength()
+        return symbol_stat
+
+    def update(self, bar: dict[str, float | int | str]) -> float:
+        """
+        Adds a bar after the ones already scored and updates stability_strength, time_strength and strength. A bar
+        with the same "t" as the newest one replaces it like the API's corrected bars do, bars without "t" are always
+        added.
+        :param dict[str, float | int | str] as bar: Must contain "vw"
+        :return float: The new strength
+        """
+        price: float = float(bar["vw"])
+        timestamp: int | None = SymbolStat.__epoch(bar.get("t"))
+        replacing: bool = self.n > 0 and timestamp is not None and timestamp == self.last_timestamp
+        slope, y_intercept = self._stability_line
+
+        if replacing:
+            x: float = float(self.n - 1)
+            old_price: float = float(self._prices[self.n - 1])
+            self.sum_of_y += price - old_price
+            self.sum_of_xy += x * (price - old_price)
+            self._stability_sum -= SymbolStat.__percent_off(old_price, slope * x + y_intercept)
+        else:
+            self.__reserve(self.n + 1)
+            x = float(self.n)
+            self.n += 1
+            self.sum_of_x += x
+            self.sum_of_y += price
+            self.sum_of_xy += x * price
+            self.sum_of_xx += x * x
+
+        self._prices[self.n - 1] = price
+        self._cumulative_y[self.n] = self._cumulative_y[self.n - 1] + price
+        self._cumulative_xy[self.n] = self._cumulative_xy[self.n - 1] + x * price
+        self.last_timestamp = timestamp
+
+        if self.n - self._stability_exact_at >= max(1, int(self.n * self.window_percent)):
+            self.__recalculate_stability()
+        else:
+            self._stability_sum += SymbolStat.__percent_off(price, slope * x + y_intercept)
+            self.stability_strength = -self._stability_sum / self.n
+
+        self.__recalculate_time_strength()
+        return self.strength
+
+    @staticmethod
+    def __epoch(timestamp: str | int | None) -> int | None:
+        """
+        Private helper that converts an RFC-3339 "t" to epoch seconds so bars from lists and BarFrames compare equal,
+        epoch seconds and None are returned as is
+        :param str or int or None as timestamp:
+        :return int | None:
+        """
+        if isinstance(timestamp, str):
+            return int(bf.BarFrame.parse_timestamps([timestamp])[0])
+        return timestamp
+
+    def __reserve(self, capacity: int) -> None:
+        """
+        Private helper that makes sure the price and prefix sum arrays can hold capacity bars, growing them to double
+        the size needed so appending is amortized O(1)
+        :param int as capacity:
+        :return:
+        """
+        if self._prices is None:
+            size: int = max(SymbolStat.INITIAL_CAPACITY, capacity)
+            self._prices = np.zeros(size, dtype=np.float64)
+            self._cumulative_y = np.zeros(size + 1, dtype=np.float64)
+            self._cumulative_xy = np.zeros(size + 1, dtype=np.float64)
+        elif capacity > len(self._prices):
+            size = max(2 * len(self._prices), capacity)
+            self._prices = np.concatenate((self._prices, np.zeros(size - len(self._prices), dtype=np.float64)))
+            self._cumulative_y = np.concatenate((self._cumulative_y, np.zeros(size + 1 - len(self._cumulative_y), dtype=np.float64)))
+            self._cumulative_xy = np.concatenate((self._cumulative_xy, np.zeros(size + 1 - len(self._cumulative_xy), dtype=np.float64)))
+
+    @staticmethod
+    def __percent_off(price: float, expected_value: float) -> float:
+        """
+        Private helper that returns how far off the price is from the expected value as a positive percent, 0.0 when
+        the expected value is 0.0 the same as DataAnalysis skips those points
+        :param float as price:
+        :param float as expected_value:
+        :return float:
+        """
+        return 0.0 if expected_value == 0.0 else abs((price - expected_value) / expected_value)
+
+    def __recalculate_stability(self) -> None:
+        """
+        Private helper that recalculates stability_strength exactly against the current line of best fit and makes
+        that line the one new bars are compared to until the next recalculation
+        :return:
+        """
+        self._stability_line = DataAnalysis.calculate_regression(
+            self.n, self.sum_of_x, self.sum_of_y, self.sum_of_xy, self.sum_of_xx
+        )
+        self.stability_strength = DataAnalysis.calculate_stability_strength(self._prices[:self.n], *self._stability_line)
+        self._stability_sum = -self.stability_strength * self.n
+        self._stability_exact_at = self.n
+
+    def __recalculate_time_strength(self) -> None:
+        """
+        Private helper that recalculates time_strength from the prefix sums then strength
+        :return:
+        """
+        self.time_strength = float(se.ScoringEngine.time_strength_of(
+            self._cumulative_y[None, :self.n + 1],
+            self._cumulative_xy[None, :self.n + 1],
+            np.array([self.n], dtype=np.int64),
+            self.window_percent
+        )[0])
+        self.set_strength()
+
     def set_strength(self) -> float:
         self.strength = self.time_strength - self.stability_strength
         return self.strength
@@ -43,37 +231,204 @@ class SymbolStat:
     def __ge__(self, other: "SymbolStat") -> bool:
         return self.strength >= other.strength
 
+    def __repr__(self) -> str:
+        return f"SymbolStat({self.symbol}, strength={self.strength})"
+
 
 class DataAnalysis:
-    tradable_symbol_stats_heap: list[SymbolStat] = []
+    tradable_symbol_ranking: "sr.SymbolRanking" = sr.SymbolRanking()
+    # Extra window_percent to a ranking of SymbolStat scored with it, filled by analyze_requested_historical_bars
+    multi_scale_symbol_rankings: dict[float, "sr.SymbolRanking"] = {}
 
     @staticmethod
-    def __calculate_linear_regression_by_least_squares(symbol_data: list[dict[str, float | int | str]]) -> tuple[float, float]:
+    def calculate_prefix_sums(symbol_data: list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray) -> tuple[list[float], list[float]]:
         """
-        Calculates the line of best fit in O(n) then returns the slope and y-intercept
-        :param list[dict[str, float | int | str]] as symbol_data: list of data about a certain symbol, dict must contain "vw" for average price
-        :return tuple[float, float]: slope, y-intercept
+        Returns the cumulative sums of y and x * y of a symbol's "vw" (volume weighted average
+        price) where x is the index of each bar, both start with 0.0 so the sum of bars [start, end) is
+        cumulative[end] - cumulative[start]
+        :param list[dict[str, float | int | str]] or BarFrame or np.ndarray as symbol_data: np.ndarray holds only the prices
+        :return tuple[list[float], list[float]]: cumulative y, cumulative x * y
         """
-        n: float = 0.0
-        sum_of_xy: float = 0.0
-        sum_of_x: float = 0.0
-        sum_of_y: float = 0.0
-        sum_of_xx: float = 0.0
+        prices: np.ndarray = se.ScoringEngine.prices_of(symbol_data)
+        cumulative_y: np.ndarray = np.zeros(len(prices) + 1, dtype=np.float64)
+        cumulative_xy: np.ndarray = np.zeros(len(prices) + 1, dtype=np.float64)
+        np.cumsum(prices, out=cumulative_y[1:])
+        np.cumsum(prices * np.arange(len(prices), dtype=np.float64), out=cumulative_xy[1:])
+        # Lists are faster than arrays for the one value at a time reads done per window
+        return cumulative_y.tolist(), cumulative_xy.tolist()
 
-        for symbol_info in symbol_data:
-            sum_of_x += n
-            sum_of_xy += n * symbol_info["vw"]  # volume weighted average price
-            sum_of_y += symbol_info["vw"]
-            sum_of_xx += n * n
-            n += 1.0
-
-        slope: float = (n * sum_of_xy - sum_of_x * sum_of_y) / (n * sum_of_xx - sum_of_x * sum_of_x)
+    @staticmethod
+    def calculate_regression(
+            n: float,
+            sum_of_x: float,
+            sum_of_y: float,
+            sum_of_xy: float,
+            sum_of_xx: float
+    ) -> tuple[float, float]:
+        """
+        Calculates the line of best fit from the sums of its points in O(1) then returns the slope and y-intercept
+        :param float as n: Number of points, must be at least 1
+        :param float as sum_of_x:
+        :param float as sum_of_y:
+        :param float as sum_of_xy:
+        :param float as sum_of_xx:
+        :return tuple[float, float]: slope, y-intercept
+        """
+        # A single data point has no slope, its line is flat through that point
+        denominator: float = n * sum_of_xx - sum_of_x * sum_of_x
+        slope: float = 0.0 if denominator == 0.0 else (n * sum_of_xy - sum_of_x * sum_of_y) / denominator
         y_intercept: float = (sum_of_y - slope * sum_of_x) / n
 
         return slope, y_intercept
 
     @staticmethod
-    def analyze_requested_historical_bars(days_ago: int = 1825, timeframe: str = "1Day", window_percent: float = 0.01) -> None:
+    def calculate_window_regression(
+            cumulative_y: Sequence[float],
+            cumulative_xy: Sequence[float],
+            start_index: int,
+            end_index: int
+    ) -> tuple[float, float]:
+        """
+        Calculates the line of best fit of bars [start_index, end_index) in O(1) from the sums returned by
+        calculate_prefix_sums then returns the slope and y-intercept, x restarts at 0 at start_index. The sums of x
+        and x * x of a window only depend on its length so they are not stored.
+        :param Sequence[float] as cumulative_y:
+        :param Sequence[float] as cumulative_xy:
+        :param int as start_index:
+        :param int as end_index: Must be greater than start_index
+        :return tuple[float, float]: slope, y-intercept
+        """
+        n: float = float(end_index - start_index)
+        sum_of_y: float = cumulative_y[end_index] - cumulative_y[start_index]
+        # x * y was summed with x starting at the first bar so the window's start is taken back out
+        sum_of_xy: float = cumulative_xy[end_index] - cumulative_xy[start_index] - start_index * sum_of_y
+        return DataAnalysis.calculate_regression(
+            n, n * (n - 1.0) / 2.0, sum_of_y, sum_of_xy, (n - 1.0) * n * (2.0 * n - 1.0) / 6.0
+        )
+
+    @staticmethod
+    def calculate_stability_strength(prices: np.ndarray, slope: float, y_intercept: float) -> float:
+        """
+        Calculates stability_strength of the prices against the line slope * x + y_intercept with NumPy, check
+        analyze_requested_historical_bars for how it is calculated
+        :param np.ndarray as prices: Must contain at least one price
+        :param float as slope:
+        :param float as y_intercept:
+        :return float:
+        """
+        expected_values: np.ndarray = slope * np.arange(len(prices), dtype=np.float64) + y_intercept
+        nonzero: np.ndarray = expected_values != 0.0
+        return -float(np.sum(np.abs(
+            np.abs(prices[nonzero] - expected_values[nonzero]) / expected_values[nonzero]
+        ))) / len(prices)
+
+    @staticmethod
+    def calculate_time_strength(cumulative_y: Sequence[float], cumulative_xy: Sequence[float], window_percent: float) -> float:
+        """
+        Calculates time_strength for one window_percent from the sums returned by calculate_prefix_sums in O(1) per
+        window, check analyze_requested_historical_bars for how it is calculated
+        :param Sequence[float] as cumulative_y:
+        :param Sequence[float] as cumulative_xy:
+        :param float as window_percent:
+        :return float:
+        """
+        symbol_data_len: int = len(cumulative_y) - 1
+        window_size: int = max(1, int(symbol_data_len * window_percent))
+        start_index: int = symbol_data_len - window_size
+        end_index: int = symbol_data_len
+        time_strength: float = 0.0
+        time_strength_multiplier: int = 16
+        num_windows: int = 0
+        while end_index > start_index:
+            slope, y_intercept = DataAnalysis.calculate_window_regression(cumulative_y, cumulative_xy, start_index, end_index)
+
+            time_strength += (
+                time_strength_multiplier * ((slope * (end_index - start_index - 1) + y_intercept) / y_intercept - 1)
+            )
+
+            end_index = start_index
+            start_index = max(0, start_index - window_size)
+            num_windows += 1
+
+            if time_strength_multiplier > 1:
+                time_strength_multiplier >>= 1
+        return time_strength / num_windows
+
+    @staticmethod
+    def score_symbol(symbol: str, symbol_data: list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray, window_percent: float = 0.01) -> SymbolStat:
+        """
+        Calculates the stability_strength, time_strength and strength of one symbol's bars, check
+        analyze_requested_historical_bars for how each is calculated. A BarFrame or array of prices is scored with
+        NumPy instead of looping over each bar.
+        :param str as symbol:
+        :param list[dict[str, float | int | str]] or BarFrame or np.ndarray as symbol_data: Must contain at least one bar
+        :param float as window_percent: Approximate percent of the data that will represent each window that will be analyzed for time_strength
+        :return SymbolStat:
+        """
+        return DataAnalysis.score_symbol_multi_scale(symbol, symbol_data, [window_percent])[0]
+
+    @staticmethod
+    def score_symbol_multi_scale(
+            symbol: str,
+            symbol_data: list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray,
+            window_percents: list[float]
+    ) -> list[SymbolStat]:
+        """
+        Scores one symbol's bars once for every window_percent. The prefix sums and stability_strength are calculated
+        once and shared, each window_percent only adds its O(1) per window time_strength pass.
+        :param str as symbol:
+        :param list[dict[str, float | int | str]] or BarFrame or np.ndarray as symbol_data: Must contain at least one
+        bar, np.ndarray holds only the prices like ScoringEngine.prices_of returns
+        :param list[float] as window_percents:
+        :return list[SymbolStat]: One SymbolStat per window_percent in the same order
+        """
+        symbol_data_len: int = len(symbol_data)
+        cumulative_y, cumulative_xy = DataAnalysis.calculate_prefix_sums(symbol_data)
+
+        slope, y_intercept = DataAnalysis.calculate_window_regression(cumulative_y, cumulative_xy, 0, symbol_data_len)
+
+        stability_strength: float = 0.0
+        if isinstance(symbol_data, (bf.BarFrame, np.ndarray)):
+            stability_strength = DataAnalysis.calculate_stability_strength(
+                se.ScoringEngine.prices_of(symbol_data), slope, y_intercept
+            )
+        else:
+            curr_x: float = 0.0
+            expected_value: float
+            for symbol_info in symbol_data:
+                """
+                Weighted value that day / expected value, so stability strength decreases relative to the percent 
+                the price was off from the expected price
+                """
+                expected_value = slope * curr_x + y_intercept
+                if expected_value != 0.0:
+                    stability_strength -= abs(abs(symbol_info["vw"] - expected_value) / expected_value)
+                curr_x += 1.0
+            stability_strength /= symbol_data_len
+
+        symbol_stats: list[SymbolStat] = []
+        for window_percent in window_percents:
+            symbol_stat: SymbolStat = SymbolStat(symbol)
+            symbol_stat.stability_strength = stability_strength
+            symbol_stat.time_strength = DataAnalysis.calculate_time_strength(cumulative_y, cumulative_xy, window_percent)
+            symbol_stat.set_strength()
+            symbol_stats.append(symbol_stat)
+        return symbol_stats
+
+    @staticmethod
+    def analyze_requested_historical_bars(
+            days_ago: int = 1825,
+            timeframe: str = "1Day",
+            window_percent: float = 0.01,
+            use_frames: bool = False,
+            vectorized: bool = False,
+            extra_window_percents: tuple[float, ...] = (),
+            parallel: bool = False,
+            max_workers: int | None = None,
+            incremental: bool = False,
+            pipeline: "ap.AnalysisPipeline | None" = None,
+            use_result_cache: bool = True
+    ) -> None:
         """
         This method analyzes historical bar data for all tradable bars in MarketData.paper_symbol_tradable from some
         amount of days ago passed as the days_ago parameter to the current day.
@@ -101,64 +456,123 @@ class DataAnalysis:
         :param int as days_ago: How many days back from the previous day should the data be retrieved from
         :param str as timeframe: Time inbetween each datapoint
         :param float as window_percent: Approximate percent of the data that will represent each window that will be analyzed for time_strength
+        :param bool as use_frames: Request bars as BarFrames so they are held as NumPy columns and scored with NumPy
+        :param bool as vectorized: Keep only each symbol's prices while downloading then score every symbol at once
+        with ScoringEngine, gives the same SymbolStat values
+        :param tuple[float, ...] as extra_window_percents: Also score every symbol with each of these window_percent
+        values in the same pass, each one's ranking is stored in multi_scale_symbol_rankings
+        :param bool as parallel: Keep only each symbol's prices while downloading then score them across a pool of
+        processes with ParallelAnalysis, gives the same SymbolStat values, ignored when vectorized is True
+        :param int or None as max_workers: Processes used when parallel is True, None for every core
+        :param bool as incremental: Rank SymbolStats made with SymbolStat.from_bars so update_symbol can re-rank a
+        symbol as each new bar arrives, ignored when vectorized or parallel is True
+        :param AnalysisPipeline or None as pipeline: Download and score symbols at the same time on the pipeline's
+        threads, its stats describe the run afterward, None downloads and scores one symbol after another
+        :param bool as use_result_cache: Reuse the SymbolStat values ResultCache holds for bars that have not changed
+        since they were last scored and cache the ones that are scored, ignored when incremental is True since cached
+        results cannot be updated bar by bar. Bars come from the BarCache so unchanged bars are not downloaded either.
+
+        Each symbol's SymbolStat replaces the one from any earlier call in tradable_symbol_ranking.
         :return:
         """
         if m.MarketData.paper_symbol_tradable is None:
             return
 
-        for symbol, tradable in m.MarketData.paper_symbol_tradable.items():
-            if not tradable:
-                continue
+        tradable_symbols: list[str] = [
+            symbol for symbol, tradable in m.MarketData.paper_symbol_tradable.items() if tradable
+        ]
 
-            symbol_data: list[dict[str, float | int | str]] = m.MarketData.request_past_prices(
-                symbol=symbol,
+        universe_prices: dict[str, np.ndarray] = {}
+        window_percents: list[float] = [window_percent, *extra_window_percents]
+        symbol_result_keys: dict[str, list[tuple]] = {}  # Keys scored results are cached under, one per window_percent
+        use_result_cache = use_result_cache and not incremental
+        for extra_window_percent in extra_window_percents:
+            DataAnalysis.multi_scale_symbol_rankings.setdefault(extra_window_percent, sr.SymbolRanking())
+
+        def fetch(symbols: list[str]) -> Iterator[tuple[str, list[dict[str, float | int | str]] | bf.BarFrame]]:
+            return m.MarketData.iter_cached_past_prices(
+                symbols=symbols,
                 timeframe=timeframe,
                 days_ago=days_ago,  # Defaults to data since 5 years ago
-                data_points=None
-            ).get(symbol)
-            symbol_data_len: int = len(symbol_data)
+                as_frames=use_frames
+            )
 
-            #if symbol_data_len < days_ago >> 1:
-            #    continue
+        def publish(symbol_stats: list[SymbolStat]) -> None:
+            DataAnalysis.tradable_symbol_ranking.update(symbol_stats[0])
+            for extra_window_percent, symbol_stat in zip(extra_window_percents, symbol_stats[1:]):
+                DataAnalysis.multi_scale_symbol_rankings[extra_window_percent].update(symbol_stat)
 
-            slope, y_intercept = DataAnalysis.__calculate_linear_regression_by_least_squares(symbol_data)
+        def remember(symbol: str, symbol_stats: list[SymbolStat]) -> None:
+            if use_result_cache:
+                for result_key, symbol_stat in zip(symbol_result_keys[symbol], symbol_stats):
+                    rc.ResultCache.put(result_key, symbol_stat)
 
-            symbol_stats: SymbolStat = SymbolStat(symbol)
-            curr_x: float = 0.0
-            expected_value: float
-            for symbol_info in symbol_data:
-                """
-                Weighted value that day / expected value, so stability strength decreases relative to the percent 
-                the price was off from the expected price
-                """
-                expected_value = slope * curr_x + y_intercept
-                if expected_value != 0.0:
-                    symbol_stats.stability_strength -= abs(abs(symbol_info["vw"] - expected_value) / expected_value)
-                curr_x += 1.0
-            symbol_stats.stability_strength /= symbol_data_len
-
-            window_size: int = max(1, int(symbol_data_len * window_percent))
-            start_index: int = symbol_data_len - window_size
-            end_index: int = symbol_data_len
-            time_strength_multiplier: int = 16
-            num_windows: int = 0
-            while end_index > start_index:
-                slope, y_intercept = DataAnalysis.__calculate_linear_regression_by_least_squares(
-                    symbol_data[start_index:end_index]
-                )
-
-                symbol_stats.time_strength += (
-                    time_strength_multiplier * ((slope * (end_index - start_index - 1) + y_intercept) / y_intercept - 1)
-                )
-
-                end_index = start_index
-                start_index = max(0, start_index - window_size)
-                num_windows += 1
-
-                if time_strength_multiplier > 1:
-                    time_strength_multiplier >>= 1
-            symbol_stats.time_strength /= num_windows
-            symbol_stats.set_strength()
-            DataAnalysis.tradable_symbol_stats_heap.append(symbol_stats)
-
-        heapq.heapify(DataAnalysis.tradable_symbol_stats_heap)
+        def rank(symbol: str, symbol_data: list[dict[str, float | int | str]] | bf.BarFrame) -> None:
+            if len(symbol_data) == 0:
+                return
+
+            #if len(symbol_data) < days_ago >> 1:
+            #    return
+
+            if use_result_cache:
+                result_keys: list[tuple] = [
+                    rc.ResultCache.key(symbol, timeframe, symbol_data, scale) for scale in window_percents
+                ]
+                cached: list[SymbolStat | None] = [rc.ResultCache.get(result_key) for result_key in result_keys]
+                if all(symbol_stat is not None for symbol_stat in cached):
+                    publish(cached)
+                    return
+                symbol_result_keys[symbol] = result_keys
+
+            if vectorized or parallel:
+                universe_prices[symbol] = se.ScoringEngine.prices_of(symbol_data)
+                return
+
+            symbol_stats: list[SymbolStat]
+            if incremental:
+                symbol_stats = [
+                    SymbolStat.from_bars(symbol, symbol_data, window_percent),
+                    *DataAnalysis.score_symbol_multi_scale(symbol, symbol_data, list(extra_window_percents))
+                ]
+            else:
+                symbol_stats = DataAnalysis.score_symbol_multi_scale(symbol, symbol_data, window_percents)
+            publish(symbol_stats)
+            remember(symbol, symbol_stats)
+
+        # Symbols are scored as soon as their bars are ready instead of after every symbol has been downloaded
+        if pipeline is None:
+            for symbol, symbol_data in fetch(tradable_symbols):
+                rank(symbol, symbol_data)
+        else:
+            pipeline.run(tradable_symbols, fetch, rank)
+
+        scored: list[list[SymbolStat]] = []  # One list per window_percent, each with a SymbolStat per symbol
+        if vectorized:
+            scored = [se.ScoringEngine.score_universe(universe_prices, scale) for scale in window_percents]
+        elif parallel:
+            scored = pa.ParallelAnalysis.score_universe(universe_prices, window_percents, max_workers)
+
+        if len(scored) > 0:
+            DataAnalysis.tradable_symbol_ranking.extend(scored[0])
+            for extra_window_percent, symbol_stats in zip(extra_window_percents, scored[1:]):
+                DataAnalysis.multi_scale_symbol_rankings[extra_window_percent].extend(symbol_stats)
+            for symbol_stats in zip(*scored):
+                remember(symbol_stats[0].symbol, list(symbol_stats))
+
+        if use_result_cache:
+            rc.ResultCache.save()
+
+    @staticmethod
+    def update_symbol(symbol: str, bar: dict[str, float | int | str]) -> bool:
+        """
+        Adds a new bar to the symbol's SymbolStat in tradable_symbol_ranking and re-ranks it in O(log n), returns False
+        if the symbol is not ranked or its SymbolStat was not made with incremental=True
+        :param str as symbol:
+        :param dict[str, float | int | str] as bar: Must contain "vw", see SymbolStat.update
+        :return bool:
+        """
+        symbol_stat: SymbolStat | None = DataAnalysis.tradable_symbol_ranking.get(symbol)
+        if symbol_stat is None or symbol_stat.n == 0:
+            return False
+        symbol_stat.update(bar)
+        return DataAnalysis.tradable_symbol_ranking.reposition(symbol)
@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+
+class AnalysisPipeline:
+    """
+    Bounded producer/consumer pipeline that overlaps downloading bars with scoring them so a run takes about as long
+    as the slower of the two instead of their sum:
+        pipeline = AnalysisPipeline(fetch_threads=4)
+        DataAnalysis.analyze_requested_historical_bars(pipeline=pipeline)
+        pipeline.display_stats()
+    The symbols are split between fetch_threads fetcher threads, each one iterates fetch(its symbols) and puts every
+    (symbol, symbol_data) pair onto a queue holding at most queue_size symbols. score_threads scorer threads take
+    pairs off the queue and call score(symbol, symbol_data). Fetchers wait on the shared rate limiter and the network
+    so several of them keep requests in flight, scoring holds the GIL for most of its time so one scorer is usually
+    enough.
+    A fetcher stalls when the queue is full (scoring is the slower stage) and a scorer stalls when it is empty
+    (fetching is the slower stage), the seconds spent stalled are counted for each stage along with the seconds spent
+    fetching and scoring (summed over every thread of the stage) and the deepest the queue got. Counters are reset at
+    the start of every run.
+    """
+    def __init__(self, fetch_threads: int = 4, score_threads: int = 1, queue_size: int = 64):
+        """
+        :param int as fetch_threads:
+        :param int as score_threads:
+        :param int as queue_size: Most fetched symbols waiting to be scored, bounds the memory held by the pipeline
+        """
+        self.fetch_threads: int = fetch_threads
+        self.score_threads: int = score_threads
+        self.queue_size: int = queue_size
+
+        self.fetched: int = 0
+        self.scored: int = 0
+        self.fetch_seconds: float = 0.0
+        self.score_seconds: float = 0.0
+        self.fetch_stall_seconds: float = 0.0
+        self.score_stall_seconds: float = 0.0
+        self.max_queue_depth: int = 0
+        self.elapsed_seconds: float = 0.0
+
+        self._queue: queue.Queue[tuple[str, Any] | None] = queue.Queue(maxsize=queue_size)
+        self._lock: threading.Lock = threading.Lock()
+
+    def queue_depth(self) -> int:
+        """
+        Returns how many fetched symbols are waiting to be scored right now
+        :return int:
+        """
+        return self._queue.qsize()
+
+    def run(
+            self,
+            symbols: list[str],
+            fetch: Callable[[list[str]], Iterator[tuple[str, Any]]],
+            score: Callable[[str, Any], None]
+    ) -> None:
+        """
+        Fetches and scores every symbol, returns once every fetched symbol has been scored. An exception raised by
+        fetch stops that fetcher's remaining symbols and one raised by score skips that symbol, both are printed.
+        :param list[str] as symbols:
+        :param Callable as fetch: Called with a part of the symbols, yields (symbol, symbol_data) as each is ready
+        :param Callable as score: Called with each yielded symbol and symbol_data, must be thread safe when
+        score_threads is more than 1
+        :return:
+        """
+        self.fetched = self.scored = self.max_queue_depth = 0
+        self.fetch_seconds = self.score_seconds = self.fetch_stall_seconds = self.score_stall_seconds = 0.0
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        started_at: float = time.perf_counter()
+
+        part_size: int = -(-len(symbols) // max(1, self.fetch_threads))
+        fetchers: list[threading.Thread] = [
+            threading.Thread(target=self.__fetcher, args=(symbols[start:start + part_size], fetch), daemon=True)
+            for start in range(0, len(symbols), max(1, part_size))
+        ]
+        scorers: list[threading.Thread] = [
+            threading.Thread(target=self.__scorer, args=(score,), daemon=True) for _ in range(max(1, self.score_threads))
+        ]
+        for thread in fetchers + scorers:
+            thread.start()
+
+        for fetcher in fetchers:
+            fetcher.join()
+        for _ in scorers:
+            self._queue.put(None)  # One stop marker per scorer, queued after every fetched symbol
+        for scorer in scorers:
+            scorer.join()
+
+        self.elapsed_seconds = time.perf_counter() - started_at
+
+    def __add(self, **amounts: float) -> None:
+        """
+        Private helper that adds to counters while the lock is held
+        :param amounts: Counter name to the amount added
+        :return:
+        """
+        with self._lock:
+            for counter, amount in amounts.items():
+                setattr(self, counter, getattr(self, counter) + amount)
+
+    def __fetcher(self, symbols: list[str], fetch: Callable[[list[str]], Iterator[tuple[str, Any]]]) -> None:
+        """
+        Private helper run by each fetcher thread
+        :param list[str] as symbols:
+        :param Callable as fetch:
+        :return:
+        """
+        fetched: Iterator[tuple[str, Any]] = fetch(symbols)
+        while True:
+            fetch_started_at: float = time.perf_counter()
+            try:
+                item: tuple[str, Any] = next(fetched)
+            except StopIteration:
+                break
+            except Exception as e:
+                print(f"Fetching bars for {len(symbols)} symbols starting with {symbols[0]} failed due to {e}")
+                break
+            put_started_at: float = time.perf_counter()
+
+            self._queue.put(item)
+            put_finished_at: float = time.perf_counter()
+
+            depth: int = self._queue.qsize()
+            with self._lock:
+                self.fetched += 1
+                self.fetch_seconds += put_started_at - fetch_started_at
+                self.fetch_stall_seconds += put_finished_at - put_started_at
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def __scorer(self, score: Callable[[str, Any], None]) -> None:
+        """
+        Private helper run by each scorer thread, stops at the first stop marker
+        :param Callable as score:
+        :return:
+        """
+        while True:
+            get_started_at: float = time.perf_counter()
+            item: tuple[str, Any] | None = self._queue.get()
+            score_started_at: float = time.perf_counter()
+            if item is None:
+                self.__add(score_stall_seconds=score_started_at - get_started_at)
+                return
+
+            try:
+                score(*item)
+            except Exception as e:
+                print(f"Scoring {item[0]} failed due to {e}")
+            self.__add(
+                scored=1,
+                score_stall_seconds=score_started_at - get_started_at,
+                score_seconds=time.perf_counter() - score_started_at
+            )
+
+    def display_stats(self) -> None:
+        """
+        Prints the counters of the last run
+        :return:
+        """
+        with self._lock:
+            print(
+                f"Symbols fetched:        {self.fetched}\n"
+                f"Symbols scored:         {self.scored}\n"
+                f"Seconds fetching:       {self.fetch_seconds:.3f}\n"
+                f"Seconds scoring:        {self.score_seconds:.3f}\n"
+                f"Fetchers stalled (s):   {self.fetch_stall_seconds:.3f}\n"
+                f"Scorers stalled (s):    {self.score_stall_seconds:.3f}\n"
+                f"Deepest queue:          {self.max_queue_depth} of {self.queue_size}\n"
+                f"Elapsed seconds:        {self.elapsed_seconds:.3f}"
+            )
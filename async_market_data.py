@@ -0,0 +1,272 @@
+import asyncio
+import aiohttp
+from typing import Any, AsyncIterator, Awaitable
+import globals as g
+import market_data as m
+import bar_frame as bf
+import request_planner as rp
+import http_transport as ht
+
+
+class AsyncMarketData:
+    """
+    asyncio version of MarketData built on aiohttp, used with async with so its connection pool is closed when done:
+        async with AsyncMarketData() as client:
+            stock_info = await client.request_many_past_prices(symbols, "1Day", start="2021-01-04")
+    Every request waits on the shared alpaca_rate_limit in globals.py with acquire_async() so coroutines and threads
+    share one quota, and uses the same retry and quota header handling as MarketData. Base urls and timeouts are taken
+    from the transport passed in, MarketData.transport by default, so a local server can be used the same way.
+    Cancelling a task cancels its in flight request and gives up its place in the rate limiter's line.
+    """
+    def __init__(self, transport: ht.HttpTransport | None = None, max_concurrency: int = 10):
+        """
+        :param HttpTransport or None as transport: Where base urls and timeouts are taken from, None for MarketData.transport
+        :param int as max_concurrency: Most requests in flight at once, also the size of the connection pool
+        """
+        self.transport: ht.HttpTransport = m.MarketData.transport if transport is None else transport
+        self.max_concurrency: int = max_concurrency
+        self.session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "AsyncMarketData":
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=self.transport.timeout[0], sock_read=self.transport.timeout[1]),
+            headers={"accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.session.close()
+        self.session = None
+
+    async def __request_json(self, url: str, params: dict[str, str | int] | None, priority: int) -> Any:
+        """
+        Private helper that sends a GET request through the shared rate limiter retrying 429 and 5xx responses or
+        connection errors the same way MarketData does, returns the decoded json, {"message": ...} for a non 200
+        response or None if no usable response came back
+        :param str as url:
+        :param dict[str, str | int] or None as params:
+        :param int as priority: See the PRIORITY_ constants in RateLimiter
+        :return Any:
+        """
+        status_code: int | None = None
+        response_json: Any = None
+        for attempt in range(m.MarketData.MAX_RETRIES + 1):
+            await g.alpaca_rate_limit.acquire_async(priority=priority)
+            headers: Any = None
+            try:
+                async with self.session.get(url, params=params, headers=ht.HttpTransport.auth_headers()) as response:
+                    status_code, headers = response.status, response.headers
+                    m.MarketData.update_quota_from_headers(headers)
+                    if status_code not in m.MarketData.RETRY_STATUS_CODES:
+                        response_json = await response.json(content_type=None)
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Request to {url} failed due to {e}")
+                status_code = None
+            except ValueError:
+                print(f"Response from {url} with status code {status_code} is not json")
+                return None
+
+            if attempt == m.MarketData.MAX_RETRIES:
+                break
+
+            delay: float = m.MarketData.retry_delay(status_code, headers, attempt)
+            if status_code == 429:
+                g.alpaca_rate_limit.pause(delay)  # The next acquire waits out the pause
+            else:
+                await asyncio.sleep(delay)
+
+        if status_code is None:
+            return None
+        if status_code != 200 and not (isinstance(response_json, dict) and "message" in response_json):
+            return {"message": f"Status code {status_code}"}
+        return response_json
+
+    async def iter_past_price_pages(
+            self,
+            symbol: str,
+            timeframe: str = '1Min',
+            start: str | None = None,
+            end: str | None = None,
+            page_limit: int | None = None
+    ) -> AsyncIterator[dict[str, list[dict[str, float | int | str]]]]:
+        """
+        Async iterator over the pages of a historical bars request, yields each page's "bars" dict (symbol to its bars
+        in that page) as soon as it arrives, raises RuntimeError if a page fails so a partial range is never mistaken
+        for a complete one
+        :param str as symbol: One or multiple symbols by comma separated list
+        :param str as timeframe: Time inbetween each datapoint
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, None means one day ago
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp, None means up to now
+        :param int or None as page_limit: Most bars per page, at most RequestPlanner.PAGE_LIMIT, None for
+        RequestPlanner.PAGE_LIMIT
+        :return AsyncIterator[dict[str, list[dict[str, float | int | str]]]]:
+        """
+        params: dict[str, str | int] = {
+            "symbols": symbol,
+            "timeframe": timeframe,
+            "start": m.MarketData.days_ago_to_start(1) if start is None else start,
+            "limit": rp.RequestPlanner.PAGE_LIMIT if page_limit is None else page_limit
+        }
+        if end is not None:
+            params["end"] = end
+
+        next_page: str | None = None
+        while True:
+            response_json: Any = await self.__request_json(
+                url=f"{self.transport.data_url}/v2/stocks/bars",
+                params=params if next_page is None else {**params, "page_token": next_page},
+                priority=g.RateLimiter.PRIORITY_BACKFILL
+            )
+            if response_json is None or "bars" not in response_json or "next_page_token" not in response_json:
+                raise RuntimeError(
+                    f"Bars request for {symbol} failed"
+                    + (f": {response_json['message']}" if response_json is not None and "message" in response_json else "")
+                )
+
+            yield response_json["bars"] or {}  # bars is null when there is no data in the range
+            next_page = response_json["next_page_token"]
+            if not next_page:
+                return
+
+    async def request_past_prices(
+            self,
+            symbol: str,
+            timeframe: str = '1Min',
+            days_ago: int = 1,
+            start: str | None = None,
+            end: str | None = None,
+            as_frames: bool = False
+    ) -> dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame] | None:
+        """
+        Async version of MarketData.request_past_prices without a data_points limit, every page is followed
+        :param str as symbol: One or multiple symbols by comma separated list
+        :param str as timeframe: Time inbetween each datapoint
+        :param int as days_ago: The number of days in the past to start gathering data from
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, overrides days_ago when given
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp, None means up to now
+        :param bool as as_frames: Return a BarFrame per symbol instead of a list of dicts
+        :return dict[str, list[dict[str, float | int | str]]] | dict[str, BarFrame] | None: None if a page failed
+        """
+        stock_info: dict[str, list[dict[str, float | int | str]]] | dict[str, list[bf.BarFrame]] = {}
+        try:
+            async for page_bars in self.iter_past_price_pages(
+                symbol=symbol,
+                timeframe=timeframe,
+                start=m.MarketData.days_ago_to_start(days_ago) if start is None else start,
+                end=end
+            ):
+                m.MarketData.merge_bars_page(stock_info, page_bars, as_frames)
+        except RuntimeError as e:
+            print(e)
+            return None
+
+        if as_frames:
+            return {key: bf.BarFrame.concat(frames) for key, frames in stock_info.items()}
+        return stock_info
+
+    async def request_many_past_prices(
+            self,
+            symbols: list[str],
+            timeframe: str = '1Min',
+            start: str | None = None,
+            end: str | None = None,
+            as_frames: bool = False
+    ) -> dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame]:
+        """
+        Async version of MarketData.request_packed_past_prices, the batches RequestPlanner packs the symbols into are
+        paged concurrently, at most max_concurrency at once, under the shared rate limit.
+        Symbols without bars map to an empty list (or empty BarFrame), symbols whose request failed are left out.
+        :param list[str] as symbols:
+        :param str as timeframe: Time inbetween each datapoint
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, None means one day ago
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp, None means up to now
+        :param bool as as_frames: Return a BarFrame per symbol instead of a list of dicts
+        :return dict[str, list[dict[str, float | int | str]]] | dict[str, BarFrame]:
+        """
+        if start is None:
+            start = m.MarketData.days_ago_to_start(1)
+
+        expected_count: int = rp.RequestPlanner.expected_bar_count(timeframe, start, end)
+        batches: list[list[str]] = rp.RequestPlanner.plan_batches({symbol: expected_count for symbol in symbols})
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(self.max_concurrency)
+        stock_info: dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame] = {}
+
+        async def request_batch(batch: list[str]) -> None:
+            async with semaphore:
+                batch_info: dict[str, Any] | None = await self.request_past_prices(
+                    symbol=",".join(batch),
+                    timeframe=timeframe,
+                    start=start,
+                    end=end,
+                    as_frames=as_frames
+                )
+            if batch_info is None:
+                print(f"Failed to get bars for {len(batch)} symbols starting with {batch[0]}")
+                return
+            for batch_symbol in batch:
+                stock_info[batch_symbol] = batch_info.get(batch_symbol, bf.BarFrame.empty() if as_frames else [])
+
+        await AsyncMarketData.gather_or_cancel([request_batch(batch) for batch in batches])
+        return stock_info
+
+    async def request_current_prices(self, symbol: str) -> dict[str, dict[str, float | int | str]] | None:
+        """
+        Async version of MarketData.request_current_prices
+        :param str as symbol: one or multiple symbols by comma separated list
+        :return dict[str, dict[str, float | int | str]] | None:
+        """
+        response_json: Any = await self.__request_json(
+            url=f"{self.transport.data_url}/v2/stocks/bars/latest",
+            params={"symbols": symbol},
+            priority=g.RateLimiter.PRIORITY_MARKET_DATA
+        )
+
+        if response_json is None:
+            pass  # Already printed why by __request_json
+        elif "message" in response_json:
+            print(f"Latest bars request for {symbol} failed: {response_json['message']}")
+        elif "bars" in response_json:
+            return response_json["bars"]
+        else:
+            print(f"Latest bars request for {symbol} returned an unknown response")
+
+        return None
+
+    async def get_paper_symbol_data(self) -> None:
+        """
+        Async version of MarketData.get_paper_symbol_data, updates MarketData.paper_data and
+        MarketData.paper_symbol_tradable the same way
+        :return:
+        """
+        response_json: Any = await self.__request_json(
+            url=f"{self.transport.paper_url}/v2/assets",
+            params=None,
+            priority=g.RateLimiter.PRIORITY_MARKET_DATA
+        )
+
+        if not isinstance(response_json, list):
+            print(f"Assets request failed {response_json} no paper symbol data has been gathered.")
+            return
+
+        m.MarketData.paper_data = response_json
+        m.MarketData.paper_symbol_tradable = {asset["symbol"]: asset["tradable"] for asset in response_json}
+        print("Got paper data, updated paper_data and paper_symbols!")
+
+    @staticmethod
+    async def gather_or_cancel(awaitables: list[Awaitable[Any]]) -> list[Any]:
+        """
+        Runs the awaitables concurrently and returns their results in order, if one raises or the caller is cancelled
+        the rest are cancelled and awaited before the exception is raised so nothing keeps running in the background
+        :param list[Awaitable[Any]] as awaitables:
+        :return list[Any]:
+        """
+        tasks: list[asyncio.Task] = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
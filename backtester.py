@@ -0,0 +1,346 @@
+import numpy as np
+from typing import Any
+import algorithm_trading as at
+import bar_cache as bc
+import bar_frame as bf
+import scoring_engine as se
+import symbol_ranking as sr
+
+
+class BacktestResult:
+    """
+    Output of Backtester.run, every array has one value per aligned bar:
+        timestamps: int64 epoch seconds of each bar
+        equity: cash plus the value of every position at each bar's close
+        cash: cash after each bar
+        trades: one dict per fill in the order they happened, keys are "t", "symbol", "side", "qty", "price",
+        "notional" and "fee"
+        rebalance_indexes: indexes of the bars the portfolio was rebalanced at
+    """
+    def __init__(
+            self,
+            timestamps: np.ndarray,
+            equity: np.ndarray,
+            cash: np.ndarray,
+            trades: list[dict[str, Any]],
+            rebalance_indexes: list[int]
+    ):
+        self.timestamps: np.ndarray = timestamps
+        self.equity: np.ndarray = equity
+        self.cash: np.ndarray = cash
+        self.trades: list[dict[str, Any]] = trades
+        self.rebalance_indexes: list[int] = rebalance_indexes
+
+    def total_return(self) -> float:
+        """
+        Returns the percent change of equity from the first bar to the last
+        :return float:
+        """
+        return float(self.equity[-1] / self.equity[0] - 1.0) if len(self.equity) > 0 else 0.0
+
+    def max_drawdown(self) -> float:
+        """
+        Returns the largest percent equity fell from a previous high, 0.0 or negative
+        :return float:
+        """
+        if len(self.equity) == 0:
+            return 0.0
+        return float(np.min(self.equity / np.maximum.accumulate(self.equity) - 1.0))
+
+    def __str__(self) -> str:
+        return (
+            f"Bars: {len(self.equity)}, rebalances: {len(self.rebalance_indexes)}, trades: {len(self.trades)}\n"
+            f"Final equity: {self.equity[-1] if len(self.equity) > 0 else 0.0:.2f}\n"
+            f"Total return: {self.total_return():.2%}\n"
+            f"Max drawdown: {self.max_drawdown():.2%}"
+        )
+
+
+class Backtester:
+    """
+    Replays historical bars through the DataAnalysis strategy offline. Every rebalance_every bars once lookback bars
+    of history exist, each symbol with a full lookback of bars is scored on the "vw" of the lookback bars before the
+    rebalance bar (never the rebalance bar itself so nothing is known early), the top_k strongest from a SymbolRanking
+    are held at equal weight and everything else is sold. Fills happen at the rebalance bar's open moved against the
+    trade by slippage plus fee_per_trade, positions are fractional like Alpaca's and buys are scaled down when cash
+    runs short. Equity is marked at each bar's close, a symbol's last close is carried forward over bars it has none.
+    Every symbol is scored at once with ScoringEngine and equity is one matrix product per rebalance period so five
+    years of daily bars across thousands of symbols run in seconds. Bars come from the BarCache (load_cached) or
+    synthetic_bars so no request is sent.
+    """
+    def __init__(
+            self,
+            initial_cash: float = 100000.0,
+            top_k: int = 10,
+            lookback: int = 252,
+            rebalance_every: int = 21,
+            window_percent: float = 0.01,
+            fee_per_trade: float = 0.0,
+            slippage: float = 0.0005,
+            min_strength: float | None = None
+    ):
+        """
+        :param float as initial_cash:
+        :param int as top_k: Most symbols held at once, each gets 1 / top_k of equity
+        :param int as lookback: Bars each symbol is scored on, symbols with fewer are not bought
+        :param int as rebalance_every: Bars between rebalances
+        :param float as window_percent: Passed to the scoring, see DataAnalysis.analyze_requested_historical_bars
+        :param float as fee_per_trade: Flat fee charged per fill
+        :param float as slippage: Fraction of the price buys pay above and sells receive below the open
+        :param float or None as min_strength: Symbols weaker than this are not bought even if they are in the top_k
+        """
+        self.initial_cash: float = initial_cash
+        self.top_k: int = top_k
+        self.lookback: int = lookback
+        self.rebalance_every: int = rebalance_every
+        self.window_percent: float = window_percent
+        self.fee_per_trade: float = fee_per_trade
+        self.slippage: float = slippage
+        self.min_strength: float | None = min_strength
+
+    @staticmethod
+    def align(
+            stock_info: dict[str, bf.BarFrame | list[dict[str, float | int | str]]]
+    ) -> tuple[list[str], np.ndarray, dict[str, np.ndarray]]:
+        """
+        Lines every symbol's bars up on the union of their timestamps
+        :param dict as stock_info: Symbol to its bars as a BarFrame or list of dicts, symbols without bars are skipped
+        :return tuple[list[str], np.ndarray, dict[str, np.ndarray]]: The symbols, the timestamps and "o", "c" and "vw"
+        each as a (symbols x timestamps) float64 matrix with NaN where a symbol has no bar
+        """
+        frames: dict[str, bf.BarFrame] = {
+            symbol: symbol_data if isinstance(symbol_data, bf.BarFrame) else bf.BarFrame.from_bars(symbol_data)
+            for symbol, symbol_data in stock_info.items() if len(symbol_data) > 0
+        }
+        symbols: list[str] = list(frames)
+        timestamps: np.ndarray = np.unique(np.concatenate([frame.t for frame in frames.values()])) if len(frames) > 0 \
+            else np.empty(0, dtype=np.int64)
+
+        columns: dict[str, np.ndarray] = {
+            column: np.full((len(symbols), len(timestamps)), np.nan, dtype=np.float64) for column in ("o", "c", "vw")
+        }
+        for row, frame in enumerate(frames.values()):
+            indexes: np.ndarray = np.searchsorted(timestamps, frame.t)
+            for column, matrix in columns.items():
+                matrix[row, indexes] = getattr(frame, column)
+        return symbols, timestamps, columns
+
+    @staticmethod
+    def load_cached(symbols: list[str], timeframe: str = "1Day") -> dict[str, bf.BarFrame]:
+        """
+        Returns the bars the BarCache holds for each symbol without sending any request, symbols with nothing cached
+        are left out
+        :param list[str] as symbols:
+        :param str as timeframe:
+        :return dict[str, BarFrame]:
+        """
+        stock_info: dict[str, bf.BarFrame] = {}
+        for symbol in symbols:
+            entry: dict[str, Any] | None = bc.BarCache.get_entry(symbol, timeframe)
+            if entry is not None and len(entry["bars"]) > 0:
+                stock_info[symbol] = entry["bars"]
+        return stock_info
+
+    @staticmethod
+    def synthetic_bars(
+            symbol_count: int,
+            bar_count: int,
+            start: str = "2020-01-02",
+            seed: int | None = None,
+            late_listing_fraction: float = 0.1
+    ) -> dict[str, bf.BarFrame]:
+        """
+        Generates daily bars on business days for made up symbols "SYN0", "SYN1", ... whose closes follow a geometric
+        random walk with a drift and volatility drawn per symbol, used to backtest without any data
+        :param int as symbol_count:
+        :param int as bar_count: Bars of the symbols that exist from start
+        :param str as start: YYYY-MM-DD of the first bar, moved forward to a business day
+        :param int or None as seed: Same seed gives the same bars
+        :param float as late_listing_fraction: Fraction of symbols that start trading part way through
+        :return dict[str, BarFrame]:
+        """
+        rng: np.random.Generator = np.random.default_rng(seed)
+        days: np.ndarray = np.busday_offset(np.datetime64(start, "D"), np.arange(bar_count), roll="forward")
+        # Daily bars are stamped at midnight New York time like the API's
+        timestamps: np.ndarray = days.astype("datetime64[s]").astype(np.int64) + 5 * 3600
+
+        drift: np.ndarray = rng.normal(0.0003, 0.0006, size=(symbol_count, 1))
+        volatility: np.ndarray = rng.uniform(0.005, 0.03, size=(symbol_count, 1))
+        log_returns: np.ndarray = drift + volatility * rng.standard_normal((symbol_count, bar_count))
+        closes: np.ndarray = rng.uniform(5.0, 300.0, size=(symbol_count, 1)) * np.exp(np.cumsum(log_returns, axis=1))
+        opens: np.ndarray = np.concatenate((closes[:, :1], closes[:, :-1]), axis=1) * np.exp(
+            volatility * 0.25 * rng.standard_normal((symbol_count, bar_count))
+        )
+        spread: np.ndarray = np.abs(volatility * rng.standard_normal((symbol_count, bar_count))) * closes
+        highs: np.ndarray = np.maximum(opens, closes) + spread
+        lows: np.ndarray = np.maximum(np.minimum(opens, closes) - spread, 0.01)
+        volumes: np.ndarray = rng.integers(10000, 5000000, size=(symbol_count, bar_count))
+        first_bars: np.ndarray = np.where(
+            rng.random(symbol_count) < late_listing_fraction, rng.integers(0, max(1, bar_count), size=symbol_count), 0
+        )
+
+        stock_info: dict[str, bf.BarFrame] = {}
+        for row in range(symbol_count):
+            listed: slice = slice(int(first_bars[row]), bar_count)
+            stock_info[f"SYN{row}"] = bf.BarFrame(
+                t=timestamps[listed],
+                o=opens[row, listed],
+                h=highs[row, listed],
+                l=lows[row, listed],
+                c=closes[row, listed],
+                v=volumes[row, listed],
+                vw=(highs[row, listed] + lows[row, listed] + closes[row, listed]) / 3.0,
+                n=volumes[row, listed] // 100
+            )
+        return stock_info
+
+    def select(self, symbols: list[str], lookback_prices: np.ndarray) -> list[str]:
+        """
+        Scores every symbol on its lookback prices and returns the top_k strongest, strongest first
+        :param list[str] as symbols:
+        :param np.ndarray as lookback_prices: (symbols x lookback) without NaN
+        :return list[str]:
+        """
+        if len(symbols) == 0:
+            return []
+        stability_strength, time_strength, strength = se.ScoringEngine.score_matrix(
+            lookback_prices, np.full(len(symbols), lookback_prices.shape[1], dtype=np.int64), self.window_percent
+        )
+
+        ranking: sr.SymbolRanking = sr.SymbolRanking()
+        symbol_stats: list[at.SymbolStat] = []
+        for index, symbol in enumerate(symbols):
+            if self.min_strength is not None and strength[index] < self.min_strength:
+                continue
+            symbol_stat: at.SymbolStat = at.SymbolStat(symbol, self.window_percent)
+            symbol_stat.stability_strength = float(stability_strength[index])
+            symbol_stat.time_strength = float(time_strength[index])
+            symbol_stat.strength = float(strength[index])
+            symbol_stats.append(symbol_stat)
+        ranking.extend(symbol_stats)
+        return [symbol_stat.symbol for symbol_stat in ranking.top(self.top_k)]
+
+    def run(self, stock_info: dict[str, bf.BarFrame | list[dict[str, float | int | str]]]) -> BacktestResult:
+        """
+        Backtests the strategy over the bars, see the class docstring for how fills and equity are simulated
+        :param dict as stock_info: Symbol to its bars as a BarFrame or list of dicts
+        :return BacktestResult:
+        """
+        return self.run_aligned(*Backtester.align(stock_info))
+
+    def run_aligned(self, symbols: list[str], timestamps: np.ndarray, columns: dict[str, np.ndarray]) -> BacktestResult:
+        """
+        Same as run for bars already lined up by align, lets many backtests share one alignment
+        :param list[str] as symbols:
+        :param np.ndarray as timestamps:
+        :param dict[str, np.ndarray] as columns: "o", "c" and "vw" as (symbols x timestamps) matrices, NaN where missing
+        :return BacktestResult:
+        """
+        symbol_count, bar_count = columns["c"].shape
+        prices: np.ndarray = columns["vw"]
+        opens: np.ndarray = columns["o"]
+
+        # Carry each symbol's last close forward, NaN until its first bar which counts as 0.0 when nothing is held
+        closes: np.ndarray = columns["c"]
+        has_close: np.ndarray = ~np.isnan(closes)
+        last_close_indexes: np.ndarray = np.maximum.accumulate(
+            np.where(has_close, np.arange(bar_count)[None, :], -1), axis=1
+        )
+        marks: np.ndarray = np.where(
+            last_close_indexes >= 0, np.take_along_axis(closes, np.maximum(last_close_indexes, 0), axis=1), 0.0
+        )
+        # Bars with a price in the lookback window ending at each index, a full window is needed to be scored
+        cumulative_priced: np.ndarray = np.concatenate(
+            (np.zeros((symbol_count, 1), dtype=np.int64), np.cumsum(~np.isnan(prices), axis=1)), axis=1
+        )
+
+        positions: np.ndarray = np.zeros(symbol_count, dtype=np.float64)
+        cash: float = self.initial_cash
+        equity: np.ndarray = np.zeros(bar_count, dtype=np.float64)
+        cash_curve: np.ndarray = np.zeros(bar_count, dtype=np.float64)
+        trades: list[dict[str, Any]] = []
+        rebalance_indexes: list[int] = list(range(self.lookback, bar_count, max(1, self.rebalance_every)))
+
+        segment_start: int = 0
+        for rebalance_index in rebalance_indexes + [bar_count]:
+            # Nothing changes between rebalances so the whole period is marked with one matrix product
+            equity[segment_start:rebalance_index] = cash + positions @ marks[:, segment_start:rebalance_index]
+            cash_curve[segment_start:rebalance_index] = cash
+            if rebalance_index == bar_count:
+                break
+            cash = self.__rebalance(
+                rebalance_index, symbols, timestamps, prices, opens, marks, cumulative_priced, positions, cash, trades
+            )
+            segment_start = rebalance_index
+
+        return BacktestResult(timestamps, equity, cash_curve, trades, rebalance_indexes)
+
+    def __rebalance(
+            self,
+            index: int,
+            symbols: list[str],
+            timestamps: np.ndarray,
+            prices: np.ndarray,
+            opens: np.ndarray,
+            marks: np.ndarray,
+            cumulative_priced: np.ndarray,
+            positions: np.ndarray,
+            cash: float,
+            trades: list[dict[str, Any]]
+    ) -> float:
+        """
+        Private helper that selects symbols with the bars before index then trades positions in place at index's open
+        toward equal weights, appends each fill to trades and returns the cash left
+        :return float:
+        """
+        full_history: np.ndarray = np.flatnonzero(
+            cumulative_priced[:, index] - cumulative_priced[:, index - self.lookback] == self.lookback
+        )
+        fill_prices: np.ndarray = opens[:, index]
+        tradable: np.ndarray = ~np.isnan(fill_prices)
+        candidates: np.ndarray = full_history[tradable[full_history]]
+        selected: list[str] = self.select(
+            [symbols[row] for row in candidates], prices[candidates, index - self.lookback:index]
+        )
+
+        equity: float = cash + float(positions @ marks[:, index - 1])
+        row_of: dict[str, int] = {symbol: row for row, symbol in zip(candidates.tolist(), (symbols[row] for row in candidates))}
+        targets: np.ndarray = np.zeros(len(symbols), dtype=np.float64)
+        for symbol in selected:
+            row: int = row_of[symbol]
+            targets[row] = max(0.0, equity) / self.top_k / fill_prices[row]  # Fees can push equity below 0, never short
+        # A held symbol with no open this bar can not be traded so it is kept
+        targets[~tradable] = positions[~tradable]
+
+        deltas: np.ndarray = np.where(tradable, targets - positions, 0.0)
+        sells: np.ndarray = np.flatnonzero(deltas < 0.0)
+        buys: np.ndarray = np.flatnonzero(deltas > 0.0)
+
+        sell_prices: np.ndarray = fill_prices[sells] * (1.0 - self.slippage)
+        cash += float(-deltas[sells] @ sell_prices) - self.fee_per_trade * len(sells)
+
+        buy_prices: np.ndarray = fill_prices[buys] * (1.0 + self.slippage)
+        buy_cost: float = float(deltas[buys] @ buy_prices) + self.fee_per_trade * len(buys)
+        buy_budget: float = cash - self.fee_per_trade * len(buys)  # Cash left for shares once every buy's fee is paid
+        if buy_cost > cash and buy_budget > 0.0:
+            deltas[buys] *= buy_budget / (buy_cost - self.fee_per_trade * len(buys))
+        elif buy_cost > cash:
+            # Not even the fees can be paid, scaling would turn the buys into shorts
+            deltas[buys] = 0.0
+            buys = buys[:0]
+        cash -= float(deltas[buys] @ fill_prices[buys]) * (1.0 + self.slippage) + self.fee_per_trade * len(buys)
+        positions += deltas
+
+        for rows, side, side_prices in ((sells, "sell", sell_prices), (buys, "buy", fill_prices[buys] * (1.0 + self.slippage))):
+            for row, price in zip(rows.tolist(), side_prices.tolist()):
+                quantity: float = abs(float(deltas[row]))
+                trades.append({
+                    "t": int(timestamps[index]),
+                    "symbol": symbols[row],
+                    "side": side,
+                    "qty": quantity,
+                    "price": price,
+                    "notional": quantity * price,
+                    "fee": self.fee_per_trade
+                })
+        return cash
@@ -0,0 +1,260 @@
+import bisect
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import bar_frame as bf
+
+
+class BarArchive:
+    """
+    Archive of bars on the computer laid out like a BarFrame, one raw little endian file per column:
+        {directory}/{timeframe}/{symbol}/{column}.bin
+    plus {directory}/index.json which holds the bar count, first and last "t" of every (timeframe, symbol) so ranges
+    are known without opening any column. Columns are opened with np.memmap so reading a time range returns a
+    BarFrame of views into the files, only the pages that are touched are ever read and every process reading the
+    archive shares the same page cache instead of its own copy. "t" is sorted so a range is found with a binary
+    search of the mapped column.
+    Appending writes only the new bars to the end of each column and a bar with the same "t" as the newest replaces
+    it like the API's corrected bars. Bars older than the first archived bar, like the ones BarCache downloads when a
+    range is extended backwards, are written in front of the existing ones which rewrites every column of the
+    symbol. Bars between the first and newest archived bar are already archived and are skipped. The index only
+    counts bars written to every column, rows a failed append left past the count are cut off by the next append so
+    the columns stay lined up. There must only be one process appending to an archive at a time.
+    """
+    ARCHIVE_DIRECTORY: str = ".save_info/bar_archive"
+    # Columns are stored little endian whatever the computer is so archives can be copied between computers
+    DISK_TYPES: dict[str, np.dtype] = {
+        column: np.dtype(dtype).newbyteorder("<") for column, dtype in bf.BarFrame.COLUMN_TYPES.items()
+    }
+
+    def __init__(self, directory: str = ARCHIVE_DIRECTORY):
+        """
+        :param str as directory:
+        """
+        self.directory: str = directory
+        self.index: dict[str, dict[str, dict[str, int]]] = {}  # timeframe to symbol to "count", "first_t", "last_t"
+        self._maps: dict[tuple[str, str], bf.BarFrame] = {}  # Mapped columns of every symbol read since its last append
+        self._lock: threading.Lock = threading.Lock()
+
+        try:
+            with open(f"{directory}/index.json", "r") as file:
+                self.index = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    def symbol_directory(self, symbol: str, timeframe: str) -> str:
+        """
+        Returns the directory the symbol's column files are in
+        :param str as symbol:
+        :param str as timeframe:
+        :return str:
+        """
+        return f"{self.directory}/{timeframe}/{symbol.replace('/', '-')}"
+
+    def symbols(self, timeframe: str) -> list[str]:
+        """
+        Returns every symbol with bars archived for the timeframe
+        :param str as timeframe:
+        :return list[str]:
+        """
+        return list(self.index.get(timeframe, {}))
+
+    def time_range(self, symbol: str, timeframe: str) -> tuple[int, int] | None:
+        """
+        Returns the epoch seconds of the first and last archived bar from the index, None if none are archived
+        :param str as symbol:
+        :param str as timeframe:
+        :return tuple[int, int] | None:
+        """
+        entry: dict[str, int] | None = self.index.get(timeframe, {}).get(symbol)
+        return None if entry is None or entry["count"] == 0 else (entry["first_t"], entry["last_t"])
+
+    def __len__(self) -> int:
+        return sum(entry["count"] for symbols in self.index.values() for entry in symbols.values())
+
+    def __save_index(self) -> None:
+        """
+        Private helper that writes the index, must be called while the lock is held
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path: str = f"{self.directory}/index.json"
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.index, file)
+        os.replace(path + ".tmp", path)  # Replacing keeps the old index intact if writing fails halfway
+
+    def append(self, symbol: str, timeframe: str, bars: bf.BarFrame | list[dict[str, float | int | str]]) -> int:
+        """
+        Adds the bars older than the first archived one and the bars newer than the newest archived one and returns
+        how many were added, the bars must be sorted by "t"
+        :param str as symbol:
+        :param str as timeframe:
+        :param BarFrame or list[dict[str, float | int | str]] as bars:
+        :return int:
+        """
+        if not isinstance(bars, bf.BarFrame):
+            time_range: tuple[int, int] | None = self.time_range(symbol, timeframe)
+            if time_range is not None:
+                # Only the bars outside the archived range are parsed, RFC-3339 timestamps sort like strings
+                first, newest = bf.BarFrame.format_timestamps(np.array(time_range, dtype=np.int64))
+                bars = (
+                    bars[:bisect.bisect_left(bars, first, key=lambda bar: bar["t"])]
+                    + bars[bisect.bisect_left(bars, newest, key=lambda bar: bar["t"]):]
+                )
+        frame: bf.BarFrame = bars if isinstance(bars, bf.BarFrame) else bf.BarFrame.from_bars(bars)
+        if len(frame) == 0:
+            return 0
+
+        with self._lock:
+            entry: dict[str, int] = self.index.setdefault(timeframe, {}).setdefault(
+                symbol, {"count": 0, "first_t": int(frame.t[0]), "last_t": int(frame.t[0])}
+            )
+            symbol_directory: str = self.symbol_directory(symbol, timeframe)
+            os.makedirs(symbol_directory, exist_ok=True)
+
+            earlier: int = 0
+            first_new: int = 0
+            try:
+                if entry["count"] > 0:
+                    earlier = int(np.searchsorted(frame.t, entry["first_t"], side="left"))
+                    if earlier > 0:
+                        BarArchive.__prepend(symbol_directory, entry["count"], frame[:earlier])
+                        entry["count"] += earlier
+                        entry["first_t"] = int(frame.t[0])
+                    first_new = int(np.searchsorted(frame.t, entry["last_t"], side="left"))
+                    if first_new < len(frame) and frame.t[first_new] == entry["last_t"]:
+                        # Same bar as the newest archived one, overwrite it in place
+                        for column, dtype in BarArchive.DISK_TYPES.items():
+                            with open(f"{symbol_directory}/{column}.bin", "r+b") as file:
+                                file.seek((entry["count"] - 1) * dtype.itemsize)
+                                file.write(getattr(frame, column)[first_new:first_new + 1].astype(dtype).tobytes())
+                        first_new += 1
+
+                new_bars: bf.BarFrame = frame[first_new:]
+                for column, dtype in BarArchive.DISK_TYPES.items():
+                    with open(f"{symbol_directory}/{column}.bin", "a+b") as file:
+                        # Rows past the count were left by a failed append, writing after them would misalign columns
+                        file.truncate(entry["count"] * dtype.itemsize)
+                        file.write(getattr(new_bars, column).astype(dtype).tobytes())
+
+                if len(new_bars) > 0:
+                    entry["count"] += len(new_bars)
+                    entry["last_t"] = int(new_bars.t[-1])
+                return earlier + len(new_bars)
+            finally:
+                # Also saved when writing failed since a prepend that went through already changed the columns
+                self._maps.pop((symbol, timeframe), None)  # The files changed, map them again on the next read
+                self.__save_index()
+
+    @staticmethod
+    def __prepend(symbol_directory: str, count: int, frame: bf.BarFrame) -> None:
+        """
+        Private helper that writes the bars in front of the count archived ones, each column is rewritten to a new
+        file that replaces the old one so maps that are still open keep seeing the old bars. Every new file is
+        written before any replaces its column so a failed write leaves the archive as it was
+        :param str as symbol_directory:
+        :param int as count: Bars archived, rows past it were left by a failed append and are dropped
+        :param BarFrame as frame:
+        :return:
+        """
+        paths: list[str] = [f"{symbol_directory}/{column}.bin" for column in BarArchive.DISK_TYPES]
+        try:
+            for path, (column, dtype) in zip(paths, BarArchive.DISK_TYPES.items()):
+                with open(path + ".tmp", "wb") as file:
+                    file.write(getattr(frame, column).astype(dtype).tobytes())
+                    with open(path, "rb") as existing:
+                        shutil.copyfileobj(existing, file)
+                    file.truncate((len(frame) + count) * dtype.itemsize)
+        except OSError:
+            for path in paths:
+                try:
+                    os.remove(path + ".tmp")
+                except OSError:
+                    pass
+            raise
+        for path in paths:
+            os.replace(path + ".tmp", path)
+
+    def __mapped(self, symbol: str, timeframe: str) -> bf.BarFrame | None:
+        """
+        Private helper that returns every archived bar of the symbol as a BarFrame of read only memory maps, None if
+        none are archived
+        :param str as symbol:
+        :param str as timeframe:
+        :return BarFrame | None:
+        """
+        with self._lock:
+            frame: bf.BarFrame | None = self._maps.get((symbol, timeframe))
+            if frame is not None:
+                return frame
+            entry: dict[str, int] | None = self.index.get(timeframe, {}).get(symbol)
+            if entry is None or entry["count"] == 0:
+                return None
+
+            symbol_directory: str = self.symbol_directory(symbol, timeframe)
+            frame = bf.BarFrame(**{
+                column: np.memmap(f"{symbol_directory}/{column}.bin", dtype=dtype, mode="r", shape=(entry["count"],))
+                for column, dtype in BarArchive.DISK_TYPES.items()
+            })
+            self._maps[(symbol, timeframe)] = frame
+            return frame
+
+    def read(
+            self,
+            symbol: str,
+            timeframe: str,
+            start: int | str | None = None,
+            end: int | str | None = None
+    ) -> bf.BarFrame:
+        """
+        Returns the archived bars with start <= "t" < end as a BarFrame of read only views into the files, nothing
+        is copied, an empty BarFrame if there are none
+        :param str as symbol:
+        :param str as timeframe:
+        :param int or str or None as start: Epoch seconds or YYYY-MM-DD / RFC-3339 timestamp, None for the first bar
+        :param int or str or None as end: Epoch seconds or YYYY-MM-DD / RFC-3339 timestamp, None for after the last bar
+        :return BarFrame:
+        """
+        frame: bf.BarFrame | None = self.__mapped(symbol, timeframe)
+        if frame is None:
+            return bf.BarFrame.empty()
+
+        first: int = 0 if start is None else int(np.searchsorted(frame.t, BarArchive.to_epoch(start), side="left"))
+        last: int = len(frame) if end is None else int(np.searchsorted(frame.t, BarArchive.to_epoch(end), side="left"))
+        return frame[first:max(first, last)]
+
+    def read_many(
+            self,
+            symbols: list[str],
+            timeframe: str,
+            start: int | str | None = None,
+            end: int | str | None = None
+    ) -> dict[str, bf.BarFrame]:
+        """
+        read for many symbols, symbols with no bars in the range are left out so the result can be passed straight to
+        Backtester.run or ScoringEngine.score_universe
+        :param list[str] as symbols:
+        :param str as timeframe:
+        :param int or str or None as start:
+        :param int or str or None as end:
+        :return dict[str, BarFrame]:
+        """
+        stock_info: dict[str, bf.BarFrame] = {}
+        for symbol in symbols:
+            frame: bf.BarFrame = self.read(symbol, timeframe, start, end)
+            if len(frame) > 0:
+                stock_info[symbol] = frame
+        return stock_info
+
+    @staticmethod
+    def to_epoch(timestamp: int | str) -> int:
+        """
+        Converts YYYY-MM-DD or RFC-3339 timestamps to epoch seconds, epoch seconds are returned as is
+        :param int or str as timestamp:
+        :return int:
+        """
+        if isinstance(timestamp, str):
+            return int(np.datetime64(timestamp[:19], "s").astype(np.int64))
+        return int(timestamp)
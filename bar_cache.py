@@ -0,0 +1,253 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+import numpy as np
+import utilities as u
+import bar_archive as ba
+import bar_frame as bf
+
+
+class BarCache:
+    """
+    Static class that keeps historical bars on the computer keyed by (symbol, timeframe) so repeated requests for the
+    same range do not download it again. Each entry is a dict that looks like
+        "start": str, YYYY-MM-DD of the oldest date the entry covers (bars may start later if the symbol did not trade)
+        "bars": BarFrame, bars sorted by "t" kept as columns so a cached bar costs 64 bytes instead of a dict
+        "fetched_at": float, time.time() of when the newest bars were downloaded
+    Entries are saved under CACHE_DIRECTORY as one .pkl file per (symbol, timeframe) and are loaded the first time
+    they are asked for, only the MAX_LOADED_ENTRIES most recently used are kept in memory. Entries saved before bars
+    were kept as a BarFrame hold a list of dicts and are converted when loaded. Market data is public so cached bars
+    are not encrypted.
+    hits counts requests served without the network, partial_hits counts requests where only the missing head or tail
+    was downloaded and misses counts requests where nothing was cached.
+    When archive is set every entry that is stored also appends its new bars to that BarArchive, so analysis and
+    backtests can read memory mapped ranges of everything the cache has downloaded.
+    """
+    CACHE_DIRECTORY: str = ".save_info/bar_cache"
+    MAX_LOADED_ENTRIES: int = 256  # Least recently used entries past this are dropped from memory, they stay saved
+
+    entries: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+    hits: int = 0
+    partial_hits: int = 0
+    misses: int = 0
+    archive: ba.BarArchive | None = None
+    _lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def entry_path(symbol: str, timeframe: str) -> str:
+        """
+        Returns the file path the entry for the symbol and timeframe is saved to
+        :param str as symbol:
+        :param str as timeframe:
+        :return str:
+        """
+        return f"{BarCache.CACHE_DIRECTORY}/{symbol.replace('/', '-')}_{timeframe}.pkl"
+
+    @staticmethod
+    def get_entry(symbol: str, timeframe: str) -> dict[str, Any] | None:
+        """
+        Returns the cached entry for the symbol and timeframe loading it from the computer if it has not been loaded
+        yet, returns None if there is no entry
+        :param str as symbol:
+        :param str as timeframe:
+        :return dict[str, Any] | None:
+        """
+        key: tuple[str, str] = (symbol, timeframe)
+        with BarCache._lock:
+            if key in BarCache.entries:
+                BarCache.entries.move_to_end(key)
+                return BarCache.entries[key]
+
+        try:
+            with open(BarCache.entry_path(symbol, timeframe), "rb") as file:
+                entry: dict[str, Any] = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(entry["bars"], bf.BarFrame):
+            entry["bars"] = bf.BarFrame.from_bars(entry["bars"])
+
+        with BarCache._lock:
+            entry = BarCache.entries.setdefault(key, entry)
+            BarCache.__evict()
+            return entry
+
+    @staticmethod
+    def set_entry(symbol: str, timeframe: str, entry: dict[str, Any]) -> bool:
+        """
+        Stores the entry in memory and saves it to the computer, returns False if saving failed, the entry is still
+        kept in memory in that case
+        :param str as symbol:
+        :param str as timeframe:
+        :param dict[str, Any] as entry:
+        :return bool:
+        """
+        with BarCache._lock:
+            BarCache.entries[(symbol, timeframe)] = entry
+            BarCache.entries.move_to_end((symbol, timeframe))
+            BarCache.__evict()
+
+        if BarCache.archive is not None:
+            try:
+                BarCache.archive.append(symbol, timeframe, entry["bars"])
+            except OSError:
+                print(f"Failed to append bars of {symbol} to the bar archive")
+
+        path: str = BarCache.entry_path(symbol, timeframe)
+        try:
+            os.makedirs(BarCache.CACHE_DIRECTORY, exist_ok=True)
+            with open(path + ".tmp", "wb") as file:
+                pickle.dump(entry, file)
+            os.replace(path + ".tmp", path)  # Replacing keeps the old entry intact if writing fails halfway
+        except OSError:
+            print(f"Failed to save bar cache entry to {path}")
+            return False
+        return True
+
+    @staticmethod
+    def __evict() -> None:
+        """
+        Private helper that drops the least recently used entries from memory until at most MAX_LOADED_ENTRIES are
+        loaded, must be called while the lock is held
+        :return:
+        """
+        while len(BarCache.entries) > BarCache.MAX_LOADED_ENTRIES:
+            BarCache.entries.popitem(last=False)
+
+    @staticmethod
+    def __count(counter: str) -> None:
+        """
+        Private helper that increments hits, partial_hits or misses while the lock is held
+        :param str as counter:
+        :return:
+        """
+        with BarCache._lock:
+            setattr(BarCache, counter, getattr(BarCache, counter) + 1)
+
+    @staticmethod
+    def needed_ranges(symbol: str, timeframe: str, start: str) -> list[tuple[str, str | None]]:
+        """
+        Returns the (start, end) ranges get_range would call fetch with right now for the same arguments, so the
+        missing ranges of many symbols can be downloaded together before get_range is called for each one
+        :param str as symbol:
+        :param str as timeframe:
+        :param str as start: YYYY-MM-DD
+        :return list[tuple[str, str | None]]:
+        """
+        entry: dict[str, Any] | None = BarCache.get_entry(symbol, timeframe)
+        if entry is None or len(entry["bars"]) == 0 and start < entry["start"]:
+            return [(start, None)]
+
+        ranges: list[tuple[str, str | None]] = []
+        if start < entry["start"]:
+            ranges.append((start, bf.BarFrame.format_timestamps(entry["bars"].t[:1])[0]))
+
+        timeframe_seconds: int | None = u.timeframe_to_seconds(timeframe)
+        if timeframe_seconds is None or time.time() - entry["fetched_at"] >= timeframe_seconds:
+            ranges.append((
+                bf.BarFrame.format_timestamps(entry["bars"].t[-1:])[0] if len(entry["bars"]) > 0 else entry["start"],
+                None
+            ))
+
+        return ranges
+
+    @staticmethod
+    def get_range(
+            symbol: str,
+            timeframe: str,
+            start: str,
+            fetch: Callable[[str, str | None], list[dict[str, float | int | str]] | None]
+    ) -> bf.BarFrame | None:
+        """
+        Returns every bar from start up to now for the symbol and timeframe. Bars that are already cached are reused,
+        fetch is only called for the head that is older than the cached range and for the tail when the newest cached
+        bar is at least one timeframe old. The tail is fetched starting at the newest cached bar so a bar that was
+        still forming when it was cached gets replaced. Returns None if fetch failed.
+        :param str as symbol:
+        :param str as timeframe:
+        :param str as start: YYYY-MM-DD
+        :param Callable as fetch: Called as fetch(start, end) where end can be None for up to now, returns the bars
+        sorted by "t" or None if the request failed
+        :return BarFrame | None: Views of the cached columns, nothing is copied
+        """
+        entry: dict[str, Any] | None = BarCache.get_entry(symbol, timeframe)
+        now: float = time.time()
+
+        if entry is None or len(entry["bars"]) == 0 and start < entry["start"]:
+            page: list[dict[str, float | int | str]] | None = fetch(start, None)
+            if page is None:
+                return None
+            BarCache.__count("misses")
+            bars: bf.BarFrame = bf.BarFrame.from_bars(page)
+            BarCache.set_entry(symbol, timeframe, {"start": start, "bars": bars, "fetched_at": now})
+            return bars
+
+        cached_start: str = entry["start"]
+        fetched_at: float = entry["fetched_at"]
+        bars = entry["bars"]
+        fetched: bool = False
+
+        if start < cached_start:
+            head: list[dict[str, float | int | str]] | None = fetch(start, bf.BarFrame.format_timestamps(bars.t[:1])[0])
+            if head is None:
+                return None
+            head_bars: bf.BarFrame = bf.BarFrame.from_bars(head)
+            bars = bf.BarFrame.concat([head_bars[:int(np.searchsorted(head_bars.t, bars.t[0], side="left"))], bars])
+            cached_start = start
+            fetched = True
+
+        timeframe_seconds: int | None = u.timeframe_to_seconds(timeframe)
+        if timeframe_seconds is None or now - entry["fetched_at"] >= timeframe_seconds:
+            tail: list[dict[str, float | int | str]] | None = fetch(
+                bf.BarFrame.format_timestamps(bars.t[-1:])[0] if len(bars) > 0 else cached_start, None
+            )
+            if tail is None:
+                return None
+            if len(tail) > 0:
+                tail_bars: bf.BarFrame = bf.BarFrame.from_bars(tail)
+                bars = bf.BarFrame.concat([bars[:int(np.searchsorted(bars.t, tail_bars.t[0], side="left"))], tail_bars])
+            fetched_at = now
+            fetched = True
+
+        if fetched:
+            BarCache.__count("partial_hits")
+            BarCache.set_entry(symbol, timeframe, {"start": cached_start, "bars": bars, "fetched_at": fetched_at})
+        else:
+            BarCache.__count("hits")
+
+        return bars[int(np.searchsorted(bars.t, ba.BarArchive.to_epoch(start), side="left")):]
+
+    @staticmethod
+    def clear(remove_files: bool = False) -> None:
+        """
+        Forgets every cached entry and resets the counters, if remove_files is True the saved entries are deleted
+        from the computer as well
+        :param bool as remove_files:
+        :return:
+        """
+        with BarCache._lock:
+            BarCache.entries = OrderedDict()
+            BarCache.hits = BarCache.partial_hits = BarCache.misses = 0
+
+        if remove_files:
+            try:
+                for file_name in os.listdir(BarCache.CACHE_DIRECTORY):
+                    os.remove(f"{BarCache.CACHE_DIRECTORY}/{file_name}")
+            except OSError:
+                pass
+
+    @staticmethod
+    def display_stats() -> None:
+        """
+        Prints how many requests were hits, partial hits and misses along with how many entries are loaded
+        :return:
+        """
+        with BarCache._lock:
+            print(
+                f"Bar cache hits:         {BarCache.hits}\n"
+                f"Bar cache partial hits: {BarCache.partial_hits}\n"
+                f"Bar cache misses:       {BarCache.misses}\n"
+                f"Entries loaded:         {len(BarCache.entries)}"
+            )
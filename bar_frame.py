@@ -0,0 +1,143 @@
+import numpy as np
+from typing import Any
+
+
+class BarFrame:
+    """
+    Columnar container for the bars of a single symbol, each column is a contiguous NumPy array instead of one dict
+    per bar so a bar costs 64 bytes instead of a dict holding eight boxed values. Columns are named after the keys
+    request_past_prices uses:
+        "t": int64, epoch seconds (UTC) the bar starts at
+        "o", "h", "l", "c": float64, open, high, low and close price
+        "v": int64, volume
+        "vw": float64, volume-weighted average price
+        "n": int64, number of trades
+    Slicing a BarFrame returns views of the same arrays so no bars are copied.
+    """
+    __slots__ = ("t", "o", "h", "l", "c", "v", "vw", "n")
+
+    COLUMN_TYPES: dict[str, type] = {
+        "t": np.int64,
+        "o": np.float64,
+        "h": np.float64,
+        "l": np.float64,
+        "c": np.float64,
+        "v": np.int64,
+        "vw": np.float64,
+        "n": np.int64,
+    }
+
+    def __init__(
+            self,
+            t: np.ndarray,
+            o: np.ndarray,
+            h: np.ndarray,
+            l: np.ndarray,
+            c: np.ndarray,
+            v: np.ndarray,
+            vw: np.ndarray,
+            n: np.ndarray
+    ):
+        """
+        Every array must have the same length, they are converted to the dtype in COLUMN_TYPES if needed
+        """
+        self.t: np.ndarray = np.asarray(t, dtype=np.int64)
+        self.o: np.ndarray = np.asarray(o, dtype=np.float64)
+        self.h: np.ndarray = np.asarray(h, dtype=np.float64)
+        self.l: np.ndarray = np.asarray(l, dtype=np.float64)
+        self.c: np.ndarray = np.asarray(c, dtype=np.float64)
+        self.v: np.ndarray = np.asarray(v, dtype=np.int64)
+        self.vw: np.ndarray = np.asarray(vw, dtype=np.float64)
+        self.n: np.ndarray = np.asarray(n, dtype=np.int64)
+
+        if any(len(getattr(self, column)) != len(self.t) for column in BarFrame.COLUMN_TYPES):
+            raise ValueError("Every column of a BarFrame must have the same length!")
+
+    @staticmethod
+    def empty() -> "BarFrame":
+        """
+        Returns a BarFrame with no bars
+        :return BarFrame:
+        """
+        return BarFrame(**{column: np.empty(0, dtype=dtype) for column, dtype in BarFrame.COLUMN_TYPES.items()})
+
+    @staticmethod
+    def parse_timestamps(timestamps: list[str]) -> np.ndarray:
+        """
+        Converts RFC-3339 timestamps such as "2026-01-05T14:30:00Z" to int64 epoch seconds
+        :param list[str] as timestamps:
+        :return np.ndarray:
+        """
+        # The first 19 characters drop the trailing Z and any fraction of a second, bars are always whole seconds
+        return np.array([timestamp[:19] for timestamp in timestamps], dtype="datetime64[s]").astype(np.int64)
+
+    @staticmethod
+    def format_timestamps(timestamps: np.ndarray) -> list[str]:
+        """
+        Converts int64 epoch seconds back to RFC-3339 timestamps in the format the API returns
+        :param np.ndarray as timestamps:
+        :return list[str]:
+        """
+        return [timestamp + "Z" for timestamp in np.datetime_as_string(timestamps.astype("datetime64[s]")).tolist()]
+
+    @staticmethod
+    def from_bars(bars: list[dict[str, float | int | str]]) -> "BarFrame":
+        """
+        Builds a BarFrame from a page of bars in the format the API returns them, see request_past_prices
+        :param list[dict[str, float | int | str]] as bars:
+        :return BarFrame:
+        """
+        count: int = len(bars)
+        columns: dict[str, np.ndarray] = {
+            column: np.fromiter((bar[column] for bar in bars), dtype=dtype, count=count)
+            for column, dtype in BarFrame.COLUMN_TYPES.items() if column != "t"
+        }
+        return BarFrame(t=BarFrame.parse_timestamps([bar["t"] for bar in bars]), **columns)
+
+    @staticmethod
+    def concat(frames: list["BarFrame"]) -> "BarFrame":
+        """
+        Joins frames one after another into a new BarFrame, frames must already be in time order
+        :param list[BarFrame] as frames:
+        :return BarFrame:
+        """
+        if len(frames) == 0:
+            return BarFrame.empty()
+        if len(frames) == 1:
+            return frames[0]
+        return BarFrame(**{
+            column: np.concatenate([getattr(frame, column) for frame in frames]) for column in BarFrame.COLUMN_TYPES
+        })
+
+    def to_bars(self) -> list[dict[str, float | int | str]]:
+        """
+        Converts the BarFrame back to a list of bars in the format the API returns them
+        :return list[dict[str, float | int | str]]:
+        """
+        columns: dict[str, list[Any]] = {
+            column: getattr(self, column).tolist() for column in BarFrame.COLUMN_TYPES if column != "t"
+        }
+        columns["t"] = BarFrame.format_timestamps(self.t)
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes held by all the column arrays
+        :return int:
+        """
+        return sum(getattr(self, column).nbytes for column in BarFrame.COLUMN_TYPES)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def __getitem__(self, index: slice) -> "BarFrame":
+        if not isinstance(index, slice):
+            raise TypeError("A BarFrame can only be indexed with a slice, index the columns for single values")
+        return BarFrame(**{column: getattr(self, column)[index] for column in BarFrame.COLUMN_TYPES})
+
+    def __str__(self) -> str:
+        if len(self) == 0:
+            return "BarFrame with 0 bars"
+        first, last = BarFrame.format_timestamps(self.t[[0, -1]])
+        return f"BarFrame with {len(self)} bars from {first} to {last}"
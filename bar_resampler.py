@@ -0,0 +1,157 @@
+import datetime
+import zoneinfo
+import numpy as np
+import bar_frame as bf
+import utilities as u
+
+
+class BarResampler:
+    """
+    Static class that builds coarser bars out of finer ones the way the bars endpoint aggregates them so a symbol only
+    has to be downloaded at its finest timeframe:
+        "o": open of the first bar, "c": close of the last bar
+        "h", "l": highest high and lowest low
+        "v", "n": summed volume and number of trades
+        "vw": volume-weighted average of the bars' vw (the close if none of the bars had volume)
+        "t": start of the coarser bar
+    Intraday timeframes (minutes and hours) start at multiples of their length since midnight UTC like the API's, New
+    York is a whole number of hours off UTC so hours line up with the exchange's clock and a bar never spans two
+    sessions. Daily bars start at midnight America/New_York written in UTC ("2026-01-05T05:00:00Z" in winter and
+    "...T04:00:00Z" in summer) and by default only hold the regular session (09:30 to 16:00 New York time, days that
+    close early simply have no later bars) like the API's daily bars.
+    Every step is a NumPy operation over the whole BarFrame, groups are found where the bar start changes and each
+    column is reduced with ufunc.reduceat.
+    """
+    SOURCE_TIMEFRAME: str = "1Min"  # Timeframe kept in the BarCache that coarser ones are built from
+    MARKET_TIMEZONE: zoneinfo.ZoneInfo = zoneinfo.ZoneInfo("America/New_York")
+    SESSION_OPEN_SECONDS: int = 9 * 3600 + 30 * 60  # 09:30 New York time
+    SESSION_CLOSE_SECONDS: int = 16 * 3600  # 16:00 New York time
+    DAY_SECONDS: int = 86400
+
+    @staticmethod
+    def can_resample(source_timeframe: str, target_timeframe: str) -> bool:
+        """
+        Returns whether bars of target_timeframe can be built from bars of source_timeframe, the target must be a
+        whole number of source bars that evenly divides a day or exactly one day
+        :param str as source_timeframe:
+        :param str as target_timeframe:
+        :return bool:
+        """
+        source_seconds: int | None = u.timeframe_to_seconds(source_timeframe)
+        target_seconds: int | None = u.timeframe_to_seconds(target_timeframe)
+        if source_seconds is None or target_seconds is None or target_seconds <= source_seconds:
+            return False
+        if target_seconds == BarResampler.DAY_SECONDS:
+            return source_seconds < BarResampler.DAY_SECONDS
+        return target_seconds % source_seconds == 0 and BarResampler.DAY_SECONDS % target_seconds == 0
+
+    @staticmethod
+    def utc_offsets(timestamps: np.ndarray) -> np.ndarray:
+        """
+        Returns the seconds New York time is ahead of UTC (negative) at each epoch second timestamp. The offset is
+        looked up once per UTC day at noon, daylight saving time changes at 2am on Sundays which is hours away from
+        any trading so every bar that can exist gets the right offset
+        :param np.ndarray as timestamps:
+        :return np.ndarray: int64
+        """
+        if len(timestamps) == 0:
+            return np.empty(0, dtype=np.int64)
+        days: np.ndarray = timestamps // BarResampler.DAY_SECONDS
+        first_day: int = int(days.min())
+        day_offsets: np.ndarray = np.fromiter(
+            (
+                datetime.datetime.fromtimestamp(
+                    day * BarResampler.DAY_SECONDS + BarResampler.DAY_SECONDS // 2, BarResampler.MARKET_TIMEZONE
+                ).utcoffset().total_seconds()
+                for day in range(first_day, int(days.max()) + 1)
+            ),
+            dtype=np.int64
+        )
+        return day_offsets[days - first_day]
+
+    @staticmethod
+    def bar_starts(timestamps: np.ndarray, target_timeframe: str, regular_session_only: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the start of the target_timeframe bar each timestamp belongs to along with a mask of the timestamps
+        that are kept, for intraday timeframes every timestamp is kept
+        :param np.ndarray as timestamps: int64 epoch seconds
+        :param str as target_timeframe:
+        :param bool as regular_session_only: Only keep bars of the regular session in daily bars
+        :return tuple[np.ndarray, np.ndarray]: (int64 bar starts, bool mask)
+        """
+        target_seconds: int | None = u.timeframe_to_seconds(target_timeframe)
+        if target_seconds is None:
+            raise ValueError(f"Cannot resample to timeframe {target_timeframe}")
+
+        if target_seconds < BarResampler.DAY_SECONDS:
+            return timestamps - timestamps % target_seconds, np.ones(len(timestamps), dtype=bool)
+
+        offsets: np.ndarray = BarResampler.utc_offsets(timestamps)
+        local: np.ndarray = timestamps + offsets
+        local_seconds: np.ndarray = local % BarResampler.DAY_SECONDS
+        starts: np.ndarray = local - local_seconds - offsets
+        if not regular_session_only:
+            return starts, np.ones(len(timestamps), dtype=bool)
+        return starts, (local_seconds >= BarResampler.SESSION_OPEN_SECONDS) & (local_seconds < BarResampler.SESSION_CLOSE_SECONDS)
+
+    @staticmethod
+    def resample(
+            frame: bf.BarFrame,
+            target_timeframe: str,
+            source_timeframe: str = SOURCE_TIMEFRAME,
+            regular_session_only: bool = True
+    ) -> bf.BarFrame:
+        """
+        Returns the bars of frame aggregated into target_timeframe bars, frame must be sorted by "t"
+        :param BarFrame as frame: Bars of source_timeframe
+        :param str as target_timeframe:
+        :param str as source_timeframe:
+        :param bool as regular_session_only: Only use bars of the regular session for daily bars
+        :return BarFrame:
+        """
+        if not BarResampler.can_resample(source_timeframe, target_timeframe):
+            raise ValueError(f"Cannot resample {source_timeframe} bars to {target_timeframe}")
+
+        starts, kept = BarResampler.bar_starts(frame.t, target_timeframe, regular_session_only)
+        if not kept.all():
+            frame = bf.BarFrame(**{column: getattr(frame, column)[kept] for column in bf.BarFrame.COLUMN_TYPES})
+            starts = starts[kept]
+        if len(frame) == 0:
+            return bf.BarFrame.empty()
+
+        # Index of the first bar of every group, starts is sorted since frame is
+        firsts: np.ndarray = np.flatnonzero(np.concatenate(([True], starts[1:] != starts[:-1])))
+        lasts: np.ndarray = np.append(firsts[1:], len(frame)) - 1
+
+        volume: np.ndarray = np.add.reduceat(frame.v, firsts)
+        weighted: np.ndarray = np.add.reduceat(frame.vw * frame.v, firsts)
+        close: np.ndarray = frame.c[lasts]
+        return bf.BarFrame(
+            t=starts[firsts],
+            o=frame.o[firsts],
+            h=np.maximum.reduceat(frame.h, firsts),
+            l=np.minimum.reduceat(frame.l, firsts),
+            c=close,
+            v=volume,
+            vw=np.divide(weighted, volume, out=close.copy(), where=volume > 0),
+            n=np.add.reduceat(frame.n, firsts)
+        )
+
+    @staticmethod
+    def resample_bars(
+            bars: list[dict[str, float | int | str]],
+            target_timeframe: str,
+            source_timeframe: str = SOURCE_TIMEFRAME,
+            regular_session_only: bool = True
+    ) -> list[dict[str, float | int | str]]:
+        """
+        resample for bars in the format request_past_prices returns them
+        :param list[dict[str, float | int | str]] as bars:
+        :param str as target_timeframe:
+        :param str as source_timeframe:
+        :param bool as regular_session_only:
+        :return list[dict[str, float | int | str]]:
+        """
+        return BarResampler.resample(
+            bf.BarFrame.from_bars(bars), target_timeframe, source_timeframe, regular_session_only
+        ).to_bars()
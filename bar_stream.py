@@ -0,0 +1,326 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import numpy as np
+import websockets
+from typing import Any
+import globals as g
+import market_data as m
+import bar_frame as bf
+
+
+class BarRingBuffer:
+    """
+    Fixed size buffer of the most recent bars of one symbol stored as NumPy columns like a BarFrame, when full the
+    oldest bar is overwritten. There is one writer (the BarStream thread) and any number of readers that never take a
+    lock, the writer bumps _version to an odd number before writing and back to even after so a reader that saw the
+    version change while it was copying simply copies again.
+    """
+    def __init__(self, capacity: int):
+        """
+        :param int as capacity: Most bars kept
+        """
+        self.capacity: int = capacity
+        self._columns: dict[str, np.ndarray] = {
+            column: np.zeros(capacity, dtype=dtype) for column, dtype in bf.BarFrame.COLUMN_TYPES.items()
+        }
+        self._count: int = 0  # Bars ever written, the newest bar is at (_count - 1) % capacity
+        self._version: int = 0
+
+    def append(self, bar: dict[str, float | int | str]) -> bool:
+        """
+        Writes a bar in the format the API sends them, a bar with the same timestamp as the newest one replaces it
+        (the API sends corrected bars) and a bar older than the newest one is ignored, returns True if it was written
+        Only the single writer may call this
+        :param dict[str, float | int | str] as bar:
+        :return bool:
+        """
+        timestamp: int = int(bf.BarFrame.parse_timestamps([bar["t"]])[0])
+        index: int = self._count % self.capacity
+        replacing: bool = False
+        if self._count > 0:
+            newest: int = int(self._columns["t"][(self._count - 1) % self.capacity])
+            if timestamp < newest:
+                return False
+            if timestamp == newest:
+                index = (self._count - 1) % self.capacity
+                replacing = True
+
+        self._version += 1
+        self._columns["t"][index] = timestamp
+        for column in bf.BarFrame.COLUMN_TYPES:
+            if column != "t":
+                self._columns[column][index] = bar[column]
+        if not replacing:
+            self._count += 1
+        self._version += 1
+        return True
+
+    def latest(self, count: int | None = None) -> bf.BarFrame:
+        """
+        Returns a copy of the newest count bars oldest first as a BarFrame, None for every bar held
+        :param int or None as count:
+        :return BarFrame:
+        """
+        while True:
+            version: int = self._version
+            if version & 1:
+                time.sleep(0)  # Writer is part way through a bar, let it finish
+                continue
+
+            written: int = self._count
+            held: int = min(written, self.capacity) if count is None else min(count, written, self.capacity)
+            indexes: np.ndarray = np.arange(written - held, written) % self.capacity
+            frame: bf.BarFrame = bf.BarFrame(**{column: values[indexes] for column, values in self._columns.items()})
+
+            if self._version == version:
+                return frame
+
+    def last_timestamp(self) -> int | None:
+        """
+        Returns the epoch seconds of the newest bar or None if no bar has been written
+        :return int | None:
+        """
+        while True:
+            version: int = self._version
+            written: int = self._count
+            timestamp: int | None = None if written == 0 else int(self._columns["t"][(written - 1) % self.capacity])
+            if version & 1 == 0 and self._version == version:
+                return timestamp
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+
+class BarStream:
+    """
+    Subscribes to minute bars over the Alpaca market data WebSocket and writes each one into a per symbol
+    BarRingBuffer so the analysis code can read the newest bars without a rate limited REST request per poll.
+    Runs its own event loop on a background thread started with start(). If the connection drops it reconnects with
+    jittered backoff and backfills the minutes it missed for every symbol through MarketData.request_past_prices.
+    Documentation: https://docs.alpaca.markets/docs/real-time-stock-pricing-data
+    """
+    DEFAULT_URL: str = "wss://stream.data.alpaca.markets/v2/iex"
+    RECONNECT_BASE: float = 1.0  # Seconds before the first reconnect, doubles for every failed reconnect after
+    RECONNECT_CAP: float = 60.0
+
+    def __init__(self, symbols: list[str] | None = None, capacity: int = 1024, url: str = DEFAULT_URL):
+        """
+        :param list[str] or None as symbols: Symbols to subscribe to, None for every tradable symbol in MarketData.paper_symbol_tradable
+        :param int as capacity: Bars kept per symbol
+        :param str as url: WebSocket url, can be pointed at a local server such as BarReplayServer
+        """
+        if symbols is None:
+            symbols = [
+                symbol for symbol, tradable in (m.MarketData.paper_symbol_tradable or {}).items() if tradable
+            ]
+        self.symbols: list[str] = symbols
+        self.url: str = url
+        self.buffers: dict[str, BarRingBuffer] = {symbol: BarRingBuffer(capacity) for symbol in symbols}
+        self.connections: int = 0  # Times a connection was authenticated and subscribed
+        self.bars_received: int = 0
+        self.bars_backfilled: int = 0
+
+        self._stopping: bool = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._websocket: Any = None
+        self._thread: threading.Thread | None = None
+
+    def latest(self, symbol: str, count: int | None = None) -> bf.BarFrame | None:
+        """
+        Returns a copy of the newest count bars of the symbol without taking a lock, None if it is not subscribed
+        :param str as symbol:
+        :param int or None as count: None for every bar held
+        :return BarFrame | None:
+        """
+        buffer: BarRingBuffer | None = self.buffers.get(symbol)
+        return None if buffer is None else buffer.latest(count)
+
+    def start(self) -> None:
+        """
+        Starts streaming on a background daemon thread, does nothing if already started
+        :return:
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """
+        Closes the connection and waits up to timeout seconds for the background thread to finish
+        :param float or None as timeout:
+        :return:
+        """
+        self._stopping = True
+        if self._loop is not None and self._websocket is not None:
+            asyncio.run_coroutine_threadsafe(self._websocket.close(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    async def run(self) -> None:
+        """
+        Connects, authenticates, subscribes and writes bars until stop() is called, reconnecting whenever the
+        connection drops, can be awaited directly instead of using start()
+        :return:
+        """
+        self._loop = asyncio.get_running_loop()
+        failures: int = 0
+        while not self._stopping:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    self._websocket = websocket
+                    await self.__subscribe(websocket)
+                    if self.connections > 0:
+                        await self._loop.run_in_executor(None, self.backfill)
+                    self.connections += 1
+                    failures = 0
+
+                    async for message in websocket:
+                        self.__handle_message(message)
+            # WebSocketException covers closed connections and rejected handshakes (such as a 429 or 503), ValueError
+            # covers a message that is not valid JSON, either way the stream reconnects instead of ending
+            except (websockets.WebSocketException, OSError, RuntimeError, ValueError, asyncio.TimeoutError) as e:
+                if not self._stopping:
+                    print(f"Bar stream connection to {self.url} lost due to {e}")
+            finally:
+                self._websocket = None
+
+            if self._stopping:
+                break
+            await asyncio.sleep(
+                random.uniform(0.5, 1.0) * min(BarStream.RECONNECT_CAP, BarStream.RECONNECT_BASE * 2 ** failures)
+            )
+            failures += 1
+
+    async def __subscribe(self, websocket: Any) -> None:
+        """
+        Private helper that waits for the connected message, authenticates with the API keys in globals.py and
+        subscribes to bars for every symbol, raises RuntimeError if the server reports an error
+        :param websocket:
+        :return:
+        """
+        await BarStream.__expect(websocket, "connected")
+        await websocket.send(json.dumps({"action": "auth", "key": g.API_KEY, "secret": g.SECRET}))
+        await BarStream.__expect(websocket, "authenticated")
+        await websocket.send(json.dumps({"action": "subscribe", "bars": self.symbols}))
+
+    @staticmethod
+    async def __expect(websocket: Any, success_msg: str) -> None:
+        """
+        Private helper that reads one message and raises RuntimeError unless it is a success message with success_msg
+        :param websocket:
+        :param str as success_msg:
+        :return:
+        """
+        messages: list[dict[str, Any]] = json.loads(await asyncio.wait_for(websocket.recv(), timeout=10.0))
+        for message in messages:
+            if message.get("T") == "error":
+                raise RuntimeError(f"Bar stream error {message.get('code')}: {message.get('msg')}")
+            if message.get("T") == "success" and message.get("msg") == success_msg:
+                return
+        raise RuntimeError(f"Bar stream expected {success_msg} but got {messages}")
+
+    def __handle_message(self, message: str | bytes) -> None:
+        """
+        Private helper that writes every bar ("b") and updated bar ("u") in a message to its symbol's buffer
+        :param str or bytes as message:
+        :return:
+        """
+        for item in json.loads(message):
+            message_type: str | None = item.get("T")
+            if message_type in ("b", "u"):
+                buffer: BarRingBuffer | None = self.buffers.get(item.get("S"))
+                if buffer is not None and buffer.append(item):
+                    self.bars_received += 1
+            elif message_type == "error":
+                print(f"Bar stream error {item.get('code')}: {item.get('msg')}")
+
+    def backfill(self) -> None:
+        """
+        Requests the minute bars after each symbol's newest buffered bar through the REST API and writes them, symbols
+        with nothing buffered are skipped since there is no gap to fill, called after a reconnect
+        :return:
+        """
+        starts_to_symbols: dict[str, list[str]] = {}
+        for symbol, buffer in self.buffers.items():
+            timestamp: int | None = buffer.last_timestamp()
+            if timestamp is not None:
+                start: str = bf.BarFrame.format_timestamps(np.array([timestamp + 60], dtype=np.int64))[0]
+                starts_to_symbols.setdefault(start, []).append(symbol)
+
+        for start, symbols in starts_to_symbols.items():
+            for symbol, bars in m.MarketData.iter_completed_symbols(symbols, timeframe="1Min", start=start):
+                for bar in bars:
+                    if self.buffers[symbol].append(bar):
+                        self.bars_backfilled += 1
+
+
+class BarReplayServer:
+    """
+    Local stand-in for the Alpaca bar stream that replays recorded bars, used to run BarStream without the API:
+        server = BarReplayServer(recorded_bars)
+        url = await server.start()
+        stream = BarStream(symbols, url=url)
+    It answers the connect, auth and subscribe handshake like the API then sends every recorded bar of the subscribed
+    symbols in order, interval seconds apart, to each client. Setting drop_after closes the connection after that many
+    bars to test reconnecting.
+    """
+    def __init__(self, bars: list[dict[str, Any]], interval: float = 0.0, drop_after: int | None = None):
+        """
+        :param list[dict[str, Any]] as bars: Bars in the stream format, each has "S" for the symbol along with the usual keys
+        :param float as interval: Seconds between bars
+        :param int or None as drop_after: Bars sent before the first connection is closed, None never closes it
+        """
+        self.bars: list[dict[str, Any]] = bars
+        self.interval: float = interval
+        self.drop_after: int | None = drop_after
+        self.connections: int = 0
+        self._server: Any = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Starts serving and returns the ws:// url to connect to
+        :param str as host:
+        :param int as port: 0 picks a free port
+        :return str:
+        """
+        self._server = await websockets.serve(self.__handler, host, port)
+        bound_host, bound_port = self._server.sockets[0].getsockname()[:2]
+        return f"ws://{bound_host}:{bound_port}"
+
+    async def stop(self) -> None:
+        """
+        Stops serving and closes every connection
+        :return:
+        """
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __handler(self, websocket: Any, path: str | None = None) -> None:
+        """
+        Private helper that serves one client
+        """
+        self.connections += 1
+        first_connection: bool = self.connections == 1
+        await websocket.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        await websocket.recv()  # auth
+        await websocket.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+        subscribed: set[str] = set(json.loads(await websocket.recv()).get("bars", []))
+        await websocket.send(json.dumps([{"T": "subscription", "bars": sorted(subscribed)}]))
+
+        sent: int = 0
+        for bar in self.bars:
+            if bar["S"] not in subscribed and "*" not in subscribed:
+                continue
+            if first_connection and self.drop_after is not None and sent >= self.drop_after:
+                await websocket.close()
+                return
+            await websocket.send(json.dumps([{"T": "b", **bar}]))
+            sent += 1
+            if self.interval > 0.0:
+                await asyncio.sleep(self.interval)
+        await websocket.wait_closed()
@@ -4,6 +4,9 @@ import threading
 from typing import Any, Callable
 import time
 import copy
+import heapq
+import itertools
+import asyncio
 
 
 class ThreadSafety:
@@ -64,25 +67,205 @@ class ThreadSafety:
 
 class RateLimiter:
     """
-    A threadsafe object that is used as a rate limiter by using the wait() method to prevent API rate limiting issues
+    A threadsafe token bucket used as a rate limiter to prevent API rate limiting issues. The bucket holds up to
+    capacity tokens and refills at rate tokens per second, every call takes one token so up to capacity calls can go
+    out at once after a quiet period then calls are spaced 1 / rate seconds apart. Callers waiting for a token are
+    served by priority (lower number first) then in the order they started waiting, waiting never holds the lock so
+    try_acquire() and higher priority callers are never stuck behind a sleeping thread.
     """
-    def __init__(self, delay: float):
+    PRIORITY_ORDER: int = 0  # Order submits and anything else trading related
+    PRIORITY_MARKET_DATA: int = 1  # Current prices and other data someone is waiting on
+    PRIORITY_BACKFILL: int = 2  # Historical bar downloads
+
+    def __init__(self, rate: float, capacity: int = 1, max_rate: float | None = None, min_rate: float | None = None):
         """
-        Sets the delay, sets the _last_time to 0.0 for starting value and gives it a lock for thread safety
-        :param float as delay: How much time in seconds that is ensured is waited when wait() is called
+        Starts with a full bucket
+        :param float as rate: Tokens added per second until the API reports its quota through update_quota()
+        :param int as capacity: Most tokens the bucket holds which is the largest burst of calls allowed
+        :param float or None as max_rate: Fastest rate update_quota() can speed up to, None means rate
+        :param float or None as min_rate: Slowest rate update_quota() can slow down to, None means a tenth of rate
         """
-        self.delay: float = delay
-        self._last_time: float = 0.0
-        self._lock: threading.Lock = threading.Lock()
+        self.rate: float = rate
+        self.capacity: int = capacity
+        self.max_rate: float = rate if max_rate is None else max_rate
+        self.min_rate: float = rate / 10 if min_rate is None else min_rate
+
+        # Last quota the API reported, None until it reports one
+        self.quota_limit: int | None = None
+        self.quota_remaining: int | None = None
+        self.quota_reset: float | None = None  # Epoch seconds when quota_remaining goes back to quota_limit
+        self._tokens: float = float(capacity)
+        self._last_time: float = time.monotonic()
+        self._waiters: list[tuple[int, int]] = []  # Heap of (priority, ticket) for everyone waiting on a token
+        self._tickets: itertools.count = itertools.count()
+        self._condition: threading.Condition = threading.Condition()
+
+    def __refill(self) -> None:
+        """
+        Adds the tokens earned since the last refill, must be called while the lock is held
+        """
+        now: float = time.monotonic()
+        self._tokens = min(float(self.capacity), self._tokens + (now - self._last_time) * self.rate)
+        self._last_time = now
+
+    def __try_take(self, waiter: tuple[int, int]) -> float:
+        """
+        Takes a token for the waiter if it is first in line and one is available, must be called while the lock is
+        held, returns 0.0 if a token was taken else how long to wait before trying again, -1.0 means wait until
+        notified since someone else is ahead in line
+        """
+        self.__refill()
+        if self._waiters[0] != waiter:
+            return -1.0
+        if self._tokens >= 1.0:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1.0
+            self._condition.notify_all()  # The next waiter in line is now first
+            return 0.0
+        return (1.0 - self._tokens) / self.rate
+
+    def __remove_waiter(self, waiter: tuple[int, int]) -> None:
+        """
+        Removes a waiter that gave up, must be called while the lock is held
+        """
+        self._waiters.remove(waiter)
+        heapq.heapify(self._waiters)
+        self._condition.notify_all()
+
+    def try_acquire(self, priority: int = PRIORITY_MARKET_DATA) -> bool:
+        """
+        Takes a token without waiting, returns False if none is available or a caller with the same or higher
+        priority is already waiting for one
+        :param int as priority:
+        :return bool:
+        """
+        with self._condition:
+            if len(self._waiters) > 0 and self._waiters[0][0] <= priority:
+                return False
+            self.__refill()
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def acquire(self, priority: int = PRIORITY_MARKET_DATA, timeout: float | None = None) -> bool:
+        """
+        Waits until a token is available and takes it, returns False if timeout seconds passed first
+        :param int as priority: Lower numbers are served first, see the PRIORITY_ constants
+        :param float or None as timeout: Most seconds to wait, None waits as long as needed
+        :return bool:
+        """
+        deadline: float | None = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            waiter: tuple[int, int] = (priority, next(self._tickets))
+            heapq.heappush(self._waiters, waiter)
+            while True:
+                wait_time: float = self.__try_take(waiter)
+                if wait_time == 0.0:
+                    return True
+
+                if deadline is not None:
+                    remaining: float = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        self.__remove_waiter(waiter)
+                        return False
+                    wait_time = remaining if wait_time < 0.0 else min(wait_time, remaining)
+
+                self._condition.wait(None if wait_time < 0.0 else wait_time)
+
+    async def acquire_async(self, priority: int = PRIORITY_MARKET_DATA, timeout: float | None = None) -> bool:
+        """
+        Same as acquire() except it awaits instead of blocking the thread so the event loop keeps running, shares the
+        same bucket and line as acquire() so threads and coroutines are limited together
+        :param int as priority: Lower numbers are served first, see the PRIORITY_ constants
+        :param float or None as timeout: Most seconds to wait, None waits as long as needed
+        :return bool:
+        """
+        deadline: float | None = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            waiter: tuple[int, int] = (priority, next(self._tickets))
+            heapq.heappush(self._waiters, waiter)
+
+        try:
+            while True:
+                with self._condition:
+                    wait_time: float = self.__try_take(waiter)
+                if wait_time == 0.0:
+                    return True
+
+                # Coroutines cannot be notified by the condition so they check again at least every token interval
+                wait_time = 1.0 / self.rate if wait_time < 0.0 else wait_time
+                if deadline is not None:
+                    remaining: float = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        with self._condition:
+                            self.__remove_waiter(waiter)
+                        return False
+                    wait_time = min(wait_time, remaining)
+                await asyncio.sleep(wait_time)
+        except asyncio.CancelledError:
+            with self._condition:
+                if waiter in self._waiters:
+                    self.__remove_waiter(waiter)
+            raise
+
+    def update_quota(self, limit: int | None, remaining: int | None, reset: float | None) -> None:
+        """
+        Adapts to the quota the API reported in a response. The bucket never holds more tokens than requests remain
+        and the rate is set so the remaining requests are spread evenly until the quota resets, between min_rate and
+        max_rate, so calls slow down when the quota runs low and speed up when plenty is left.
+        :param int or None as limit: Requests allowed per quota window
+        :param int or None as remaining: Requests left in the current window
+        :param float or None as reset: Epoch seconds when the window resets
+        :return:
+        """
+        with self._condition:
+            self.quota_limit = limit if limit is not None else self.quota_limit
+            self.quota_remaining = remaining
+            self.quota_reset = reset
+            if remaining is None:
+                return
+
+            self.__refill()
+            self._tokens = min(self._tokens, float(remaining))
+            if reset is not None:
+                seconds_to_reset: float = max(1.0, reset - time.time())
+                self.rate = max(self.min_rate, min(self.max_rate, remaining / seconds_to_reset))
+            self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops every caller from getting a token for the given seconds, used when the API says the rate limit was hit
+        :param float as seconds:
+        :return:
+        """
+        with self._condition:
+            self.__refill()
+            # A negative bucket has to refill past zero before anyone gets a token
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+            self._condition.notify_all()
+
+    def quota_state(self) -> dict[str, float | int | None]:
+        """
+        Returns the current rate, tokens in the bucket, callers waiting and the last quota the API reported
+        :return dict[str, float | int | None]:
+        """
+        with self._condition:
+            self.__refill()
+            return {
+                "rate": self.rate,
+                "tokens": self._tokens,
+                "waiting": len(self._waiters),
+                "limit": self.quota_limit,
+                "remaining": self.quota_remaining,
+                "reset": self.quota_reset,
+            }
 
     def wait(self) -> None:
         """
-        Waits the set amount of time, if called multiple times in multiple threads it will wait the set amount of time
-        for each thread it is called on
+        Waits until a token is available and takes it, same as acquire() with the default priority and no timeout
         """
-        with self._lock:
-            time.sleep(max(0.0, self.delay - (time.monotonic() - self._last_time)))
-            self._last_time = time.monotonic()
+        self.acquire()
 
 
 # Message to clear the terminal
@@ -92,8 +275,10 @@ cls_msg: str = "cls" if os.name == "nt" else "clear"
 API_KEY: str = ""
 SECRET: str = ""
 
-# Rate Limiter
-alpaca_rate_limit: RateLimiter = RateLimiter(0.35)
+# Rate Limiter shared by every Alpaca call, https://alpaca.markets/support/usage-limit-api-calls
+# 200 requests per minute, any 60 seconds allow at most capacity + 60 * rate = 20 + 180 requests until the API reports
+# its quota, after that the rate follows the remaining quota up to max_rate
+alpaca_rate_limit: RateLimiter = RateLimiter(rate=3.0, capacity=20, max_rate=10.0)
 
 # Connects to a paper trading endpoint
 trading_client: TradingClient | None = None
@@ -0,0 +1,73 @@
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from typing import Any
+import globals as g
+
+
+class HttpTransport:
+    """
+    Shared HTTP transport for the Alpaca REST API. One pooled requests.Session is reused for every call so
+    connections are kept alive instead of doing a new TCP and TLS handshake per page, responses are gzip encoded and
+    every request has a timeout so a hung socket cannot hang the calling thread forever. The base urls can be changed
+    so everything that uses the transport can run against a local server.
+    """
+    DEFAULT_DATA_URL: str = "https://data.alpaca.markets"
+    DEFAULT_PAPER_URL: str = "https://paper-api.alpaca.markets"
+
+    def __init__(
+            self,
+            data_url: str = DEFAULT_DATA_URL,
+            paper_url: str = DEFAULT_PAPER_URL,
+            connect_timeout: float = 5.0,
+            read_timeout: float = 30.0,
+            pool_size: int = 10
+    ):
+        """
+        :param str as data_url: Base url of the market data API
+        :param str as paper_url: Base url of the paper trading API
+        :param float as connect_timeout: Seconds to wait for a connection to be made
+        :param float as read_timeout: Seconds to wait between bytes of a response
+        :param int as pool_size: Most connections kept alive per host, should be at least the number of threads
+        sending requests at once
+        """
+        self.data_url: str = data_url.rstrip("/")
+        self.paper_url: str = paper_url.rstrip("/")
+        self.timeout: tuple[float, float] = (connect_timeout, read_timeout)
+
+        self.session: requests.Session = requests.Session()
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "accept": "application/json",
+            "Accept-Encoding": "gzip, deflate"
+        })
+
+    @staticmethod
+    def auth_headers() -> dict[str, str]:
+        """
+        Returns the API key headers, read each call since the keys can be entered or reloaded after startup
+        :return dict[str, str]:
+        """
+        return {
+            "APCA-API-KEY-ID": g.API_KEY,
+            "APCA-API-SECRET-KEY": g.SECRET
+        }
+
+    def get(self, url: str, params: dict[str, Any] | None = None) -> Response:
+        """
+        Sends a GET request over the pooled session, raises the same exceptions requests.get does including
+        requests.Timeout when a timeout is hit
+        :param str as url: Full url, build it from data_url or paper_url
+        :param dict[str, Any] or None as params:
+        :return Response:
+        """
+        return self.session.get(url=url, params=params, headers=HttpTransport.auth_headers(), timeout=self.timeout)
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection, the transport can still be used afterward and will reconnect
+        :return:
+        """
+        self.session.close()
@@ -92,13 +92,19 @@ root.children = {
             "a": lambda: o.Options.view_account(),
             "e": lambda: o.Options.save_everything(),
             "r": lambda: o.Options.reload_local_info(),
+            "b": lambda: o.Options.display_bar_cache_stats(),
+            "m": lambda: o.Options.display_analysis_cache_stats(),
+            "l": lambda: o.Options.display_rate_limit_quota(),
         },
         display="[s] Display paper symbols\n"
                 "[d] Get paper symbol data\n"
                 "[k] Enter API keys\n"
                 "[a] View account\n"
                 "[e] Save everything\n"
-                "[r] Reload information\n",
+                "[r] Reload information\n"
+                "[b] Display bar cache stats\n"
+                "[m] Display analysis cache stats\n"
+                "[l] Display rate limit quota\n",
         parent=root,
         children=None
     ),
@@ -2,17 +2,27 @@ import globals as g
 import requests
 from requests import Response
 import datetime
-from typing import Any
-import utilities as u
 import time
+import random
+from typing import Any, Iterator, Mapping
+import utilities as u
+import bar_cache as bc
+import bar_frame as bf
+import bar_resampler as br
+import request_planner as rp
+import http_transport as ht
 
 
 class MarketData:
-    REQUEST_HEADERS: dict[str, str] = {
-        "APCA-API-KEY-ID": g.API_KEY,
-        "APCA-API-SECRET-KEY": g.SECRET,
-        "accept": "application/json"
-    }
+    # Every request goes through this pooled transport, replace it with one built with other base urls to run against
+    # a local server
+    transport: ht.HttpTransport = ht.HttpTransport()
+
+    # Retrying, 429 is the rate limit being hit and 5xx are server errors that are usually temporary
+    RETRY_STATUS_CODES: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+    MAX_RETRIES: int = 5
+    BACKOFF_BASE: float = 0.5  # Seconds before the first retry, doubles for every retry after
+    BACKOFF_CAP: float = 30.0  # Most seconds between retries
 
     # Storing paper data
     paper_data: list[dict[str, Any]] | None = None  # List of all assets, dict for each asset with each info having a string name and could be any type of data
@@ -20,19 +30,141 @@ class MarketData:
 
 
     @staticmethod
-    def request_past_prices(symbol: str, timeframe: str = '1Min', days_ago: int = 1, data_points: int | None = 10000) -> dict[str, list[dict[str, float | int | str]]] | None:
+    def update_quota_from_headers(headers: Mapping[str, str]) -> None:
+        """
+        Passes the X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset headers of a response to the shared
+        rate limiter, responses without them are ignored
+        :param Mapping[str, str] as headers: Response headers
+        :return:
+        """
+        remaining: int | None = u.try_int(headers.get("X-RateLimit-Remaining"))
+        if remaining is None:
+            return
+        g.alpaca_rate_limit.update_quota(
+            limit=u.try_int(headers.get("X-RateLimit-Limit")),
+            remaining=remaining,
+            reset=u.try_int(headers.get("X-RateLimit-Reset"))
+        )
+
+    @staticmethod
+    def retry_delay(status_code: int | None, headers: Mapping[str, str] | None, attempt: int) -> float:
+        """
+        Returns how many seconds to wait before retrying, a 429 waits until the Retry-After or X-RateLimit-Reset
+        header says the quota is back, anything else uses jittered exponential backoff so threads that failed
+        together do not retry together
+        :param int or None as status_code: None if the request raised before a response came back
+        :param Mapping[str, str] or None as headers: Response headers, None if there was no response
+        :param int as attempt: 0 for the first retry
+        :return float:
+        """
+        if status_code == 429 and headers is not None:
+            retry_after: int | None = u.try_int(headers.get("Retry-After"))
+            if retry_after is not None:
+                return float(retry_after)
+            reset: int | None = u.try_int(headers.get("X-RateLimit-Reset"))
+            if reset is not None:
+                return max(0.0, reset - time.time()) + random.uniform(0.0, MarketData.BACKOFF_BASE)
+        return random.uniform(0.5, 1.0) * min(MarketData.BACKOFF_CAP, MarketData.BACKOFF_BASE * 2 ** attempt)
+
+    @staticmethod
+    def __send_request(url: str, params: dict[str, str | int] | None, priority: int) -> Response | None:
+        """
+        Private helper that sends a GET request through the shared rate limiter, reads the quota headers and retries
+        429 and 5xx responses or connection errors up to MAX_RETRIES times. A 429 pauses the rate limiter for everyone
+        since every thread shares the same quota. Returns the last response, or None if no response ever came back
+        :param str as url:
+        :param dict[str, str | int] or None as params:
+        :param int as priority: See the PRIORITY_ constants in RateLimiter
+        :return Response | None:
+        """
+        response: Response | None = None
+        for attempt in range(MarketData.MAX_RETRIES + 1):
+            g.alpaca_rate_limit.acquire(priority=priority)
+            try:
+                response = MarketData.transport.get(url=url, params=params)
+            except requests.RequestException as e:
+                print(f"Request to {url} failed due to {e}")
+                response = None
+            else:
+                MarketData.update_quota_from_headers(response.headers)
+                if response.status_code not in MarketData.RETRY_STATUS_CODES:
+                    return response
+
+            if attempt == MarketData.MAX_RETRIES:
+                break
+
+            delay: float = MarketData.retry_delay(
+                None if response is None else response.status_code,
+                None if response is None else response.headers,
+                attempt
+            )
+            if response is not None and response.status_code == 429:
+                g.alpaca_rate_limit.pause(delay)  # The next acquire waits out the pause
+            else:
+                time.sleep(delay)
+
+        return response
+
+    @staticmethod
+    def __request_json(url: str, params: dict[str, str | int] | None, priority: int) -> Any:
+        """
+        Private helper that sends a GET request with __send_request and returns the decoded json, a non 200 response
+        is turned into {"message": ...} the same way the API reports errors, returns None if there was no usable response
+        :param str as url:
+        :param dict[str, str | int] or None as params:
+        :param int as priority: See the PRIORITY_ constants in RateLimiter
+        :return Any:
+        """
+        response: Response | None = MarketData.__send_request(url, params, priority)
+        if response is None:
+            return None
+
+        try:
+            response_json: Any = response.json()
+        except ValueError:
+            print(f"Response from {url} with status code {response.status_code} is not json")
+            return None
+
+        if response.status_code != 200 and not (isinstance(response_json, dict) and "message" in response_json):
+            return {"message": f"Status code {response.status_code}"}
+        return response_json
+
+    @staticmethod
+    def days_ago_to_start(days_ago: int) -> str:
+        """
+        Returns the YYYY-MM-DD date that is days_ago days before today, used as the start of a bar request
+        :param int as days_ago:
+        :return str:
+        """
+        return str((datetime.datetime.now() - datetime.timedelta(days=days_ago)).date())
+
+    @staticmethod
+    def request_past_prices(
+            symbol: str,
+            timeframe: str = '1Min',
+            days_ago: int = 1,
+            data_points: int | None = 10000,
+            start: str | None = None,
+            end: str | None = None,
+            as_frames: bool = False
+    ) -> dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame] | None:
         """
         Returns a dictionary that contains keys as stock symbols the user requested with a list of data, this may take
-        multiple requests to complete.
+        multiple requests to complete. If as_frames is True each symbol maps to a BarFrame instead, every page is
+        converted to columns as soon as it arrives so the per bar dicts are never all held at once.
         :param str as symbol: The stock symbol to get past prices for --> Multiple symbols can be passed separated by commas
         :param str as timeframe: The price of the stock will be split up into sections of the timeframe (default is '1Min', so each price point is 1 minute apart)
         :param int as days_ago: The number of days in the past to start gathering data from (default is 1, meaning yesterday)
         :param int as data_points: The maximum number of data points you ask for
-        :return dict[str, list[dict[str, float | int | str]]]:
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp to start from, overrides days_ago when given
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp to stop at (inclusive), None means up to now
+        :param bool as as_frames: Return a BarFrame per symbol instead of a list of dicts
+        :return dict[str, list[dict[str, float | int | str]]] | dict[str, BarFrame]:
         Documentation: https://docs.alpaca.markets/reference/stockbars
         """
 
-        start_date: datetime.datetime = datetime.datetime.now() - datetime.timedelta(days=days_ago)
+        if start is None:
+            start = MarketData.days_ago_to_start(days_ago)
         """
         For response_json the outer dict has two keys "bars" and "next_page_token", in the "bars" dict it contains
         the stock symbols for the keys which the user has requested with the value being a list of data which starts at
@@ -48,22 +180,6 @@ class MarketData:
         }
         """
 
-        params: dict[str, str | int] = {
-            "symbols": symbol,
-            "timeframe": timeframe,
-            "start": str(start_date.date()),  # YYYY-MM-DD
-        }
-
-        if data_points is not None:
-            params["limit"] = data_points
-
-        last_time: float = time.monotonic()
-        response_json: dict[str, None | str | dict[str, list[dict[str, float | int | str]]]] = requests.get(
-            url="https://data.alpaca.markets/v2/stocks/bars",
-            params=params,
-            headers=MarketData.REQUEST_HEADERS
-        ).json()
-
         """
         stock_info is a dict of all symbols asked for in the symbol parameter as the key then as value is a list of that
         symbol info separated by the time specified in the timeframe parameter, the data looks like
@@ -78,54 +194,314 @@ class MarketData:
 
         Documentation: https://docs.alpaca.markets/docs/real-time-stock-pricing-data
         """
-        stock_info: dict[str, list[dict[str, float | int | str]]] | None = None
-        next_page: str | None = None
-
-        if "message" in response_json:
-            pass  # Log the error
-        elif "bars" in response_json and "next_page_token" in response_json:
-            stock_info = response_json["bars"]
-            next_page = response_json["next_page_token"]
-        else:
-            pass  # Log unknown error
+        stock_info: dict[str, list[dict[str, float | int | str]]] | dict[str, list[bf.BarFrame]] = {}
 
         data_points_collected: int = 0
-        if stock_info is not None:
-            if data_points is not None:
-                data_points_collected = sum(len(symbol_list) for symbol_list in stock_info.values())
-            while (data_points is None or data_points_collected < data_points) and next_page:
-                time.sleep(max(0.0, 0.35 - (time.monotonic() - last_time)))
-                last_time = time.monotonic()
-                response_json = requests.get(
-                    url="https://data.alpaca.markets/v2/stocks/bars",
-                    params={
-                        "symbols": symbol,
-                        "timeframe": timeframe,
-                        "page_token": next_page
-                    },
-                    headers=MarketData.REQUEST_HEADERS
-                ).json()
-
-                if "message" in response_json:
-                    pass  # Log the error
-                elif "bars" in response_json and "next_page_token" in response_json:
-                    for key, symbol_list in response_json["bars"].items():
-                        if key in stock_info:
-                            stock_info[key].extend(symbol_list)
-                        else:
-                            stock_info[key] = symbol_list
-                        data_points_collected += len(symbol_list)
-                else:
-                    pass  # Log unknown error
-                next_page = response_json.get("next_page_token")
-
+        try:
+            for page_bars in MarketData.iter_past_price_pages(
+                symbol=symbol,
+                timeframe=timeframe,
+                start=start,
+                end=end,
+                # The limit is per page so it can never be more than a full page, without data_points pages are kept full
+                page_limit=rp.RequestPlanner.PAGE_LIMIT if data_points is None else min(data_points, rp.RequestPlanner.PAGE_LIMIT)
+            ):
+                data_points_collected += MarketData.merge_bars_page(stock_info, page_bars, as_frames)
+                if data_points is not None and data_points_collected >= data_points:
+                    break
+        except RuntimeError as e:
+            # A page that failed even after retrying means the bars are incomplete so none are returned, otherwise
+            # the missing pages would look like the symbol had no bars in that range
+            print(e)
+            return None
 
         if data_points is not None and data_points_collected < data_points:
             pass  # log that not all data points wanted were received
 
-
+        if as_frames:
+            return {key: bf.BarFrame.concat(frames) for key, frames in stock_info.items()}
         return stock_info
 
+    @staticmethod
+    def iter_past_price_pages(
+            symbol: str,
+            timeframe: str = '1Min',
+            start: str | None = None,
+            end: str | None = None,
+            page_limit: int | None = None
+    ) -> Iterator[dict[str, list[dict[str, float | int | str]]]]:
+        """
+        Generator over the pages of a historical bars request, yields each page's "bars" dict (symbol to its bars in
+        that page) as soon as it arrives so it can be used before the rest are downloaded, the next page is only
+        requested when the next one is asked for. Raises RuntimeError if a page fails even after retrying so a partial
+        range is never mistaken for a complete one.
+        :param str as symbol: One or multiple symbols by comma separated list
+        :param str as timeframe: Time inbetween each datapoint
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, None means one day ago
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp (inclusive), None means up to now
+        :param int or None as page_limit: Most bars per page, at most RequestPlanner.PAGE_LIMIT, None for
+        RequestPlanner.PAGE_LIMIT
+        :return Iterator[dict[str, list[dict[str, float | int | str]]]]:
+        """
+        params: dict[str, str | int] = {
+            "symbols": symbol,
+            "timeframe": timeframe,
+            "start": MarketData.days_ago_to_start(1) if start is None else start,  # YYYY-MM-DD or RFC-3339
+            "limit": rp.RequestPlanner.PAGE_LIMIT if page_limit is None else page_limit
+        }
+
+        if end is not None:
+            params["end"] = end
+
+        next_page: str | None = None
+        while True:
+            response_json: dict[str, None | str | dict[str, list[dict[str, float | int | str]]]] | None = MarketData.__request_json(
+                url=f"{MarketData.transport.data_url}/v2/stocks/bars",
+                params=params if next_page is None else {**params, "page_token": next_page},
+                priority=g.RateLimiter.PRIORITY_BACKFILL
+            )
+
+            if response_json is None or "bars" not in response_json or "next_page_token" not in response_json:
+                raise RuntimeError(
+                    f"Bars request for {symbol} failed"
+                    + (" part way through paging" if next_page is not None else "")
+                    + (f": {response_json['message']}" if response_json is not None and "message" in response_json else "")
+                )
+
+            yield response_json["bars"] or {}  # bars is null when there is no data in the range
+            next_page = response_json["next_page_token"]
+            if not next_page:
+                return
+
+    @staticmethod
+    def iter_completed_symbols(
+            symbols: list[str],
+            timeframe: str = '1Min',
+            start: str | None = None,
+            end: str | None = None,
+            as_frames: bool = False
+    ) -> Iterator[tuple[str, list[dict[str, float | int | str]] | bf.BarFrame]]:
+        """
+        Generator that yields (symbol, bars) for each symbol as soon as all of its bars between start and end have
+        arrived, symbols are packed into requests with RequestPlanner the same way as request_packed_past_prices.
+        The API lists each symbol's bars together so once a page moves on to another symbol the earlier ones are
+        complete, only the bars of symbols still being paged are held in memory.
+        Symbols without bars are yielded with an empty list (or empty BarFrame), symbols whose request failed are not
+        yielded at all.
+        :param list[str] as symbols:
+        :param str as timeframe: Time inbetween each datapoint
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, None means one day ago
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp, None means up to now
+        :param bool as as_frames: Yield a BarFrame per symbol instead of a list of dicts, the BarCache keeps bars as
+        a BarFrame so these are views of its columns and must not be written to
+        :return Iterator[tuple[str, list[dict[str, float | int | str]] | BarFrame]]:
+        """
+        if start is None:
+            start = MarketData.days_ago_to_start(1)
+
+        expected_count: int = rp.RequestPlanner.expected_bar_count(timeframe, start, end)
+        for batch in rp.RequestPlanner.plan_batches({symbol: expected_count for symbol in symbols}):
+            pending: dict[str, list[dict[str, float | int | str]]] | dict[str, list[bf.BarFrame]] = {}
+            not_yielded: set[str] = set(batch)
+
+            try:
+                for page_bars in MarketData.iter_past_price_pages(",".join(batch), timeframe, start, end):
+                    if len(page_bars) == 0:
+                        continue
+                    MarketData.merge_bars_page(pending, page_bars, as_frames)
+
+                    still_paging: str = next(reversed(page_bars))  # Only the last symbol of a page can continue
+                    for completed in [pending_symbol for pending_symbol in pending if pending_symbol != still_paging]:
+                        not_yielded.discard(completed)
+                        yield completed, MarketData.__finish_symbol_bars(pending.pop(completed), as_frames)
+            except RuntimeError as e:
+                print(f"{e}, {len(not_yielded)} symbols starting with {min(not_yielded)} are skipped")
+                continue
+
+            for batch_symbol in batch:
+                if batch_symbol in not_yielded:
+                    yield batch_symbol, MarketData.__finish_symbol_bars(pending.pop(batch_symbol, []), as_frames)
+
+    @staticmethod
+    def __finish_symbol_bars(
+            symbol_pages: list[dict[str, float | int | str]] | list[bf.BarFrame],
+            as_frames: bool
+    ) -> list[dict[str, float | int | str]] | bf.BarFrame:
+        """
+        Private helper for iter_completed_symbols that joins a symbol's BarFrame pages when as_frames is True, lists of
+        bars are already joined by merge_bars_page
+        :param list as symbol_pages:
+        :param bool as as_frames:
+        :return list[dict[str, float | int | str]] | BarFrame:
+        """
+        return bf.BarFrame.concat(symbol_pages) if as_frames else symbol_pages
+
+    @staticmethod
+    def merge_bars_page(
+            stock_info: dict[str, list[dict[str, float | int | str]]] | dict[str, list[bf.BarFrame]],
+            page_bars: dict[str, list[dict[str, float | int | str]]] | None,
+            as_frames: bool
+    ) -> int:
+        """
+        Adds the "bars" of one page to stock_info, when as_frames is True
+        each symbol's bars are converted to a BarFrame and added to that symbol's list of frames instead of extending
+        its list of bars, returns how many bars the page had
+        :param dict as stock_info: Bars gathered so far by symbol, modified in place
+        :param dict[str, list[dict[str, float | int | str]]] or None as page_bars: bars is null when there is no data
+        :param bool as as_frames:
+        :return int:
+        """
+        page_data_points: int = 0
+        for key, symbol_list in (page_bars or {}).items():
+            page_data_points += len(symbol_list)
+            stock_info.setdefault(key, []).extend(
+                [bf.BarFrame.from_bars(symbol_list)] if as_frames else symbol_list
+            )
+        return page_data_points
+
+    @staticmethod
+    def request_packed_past_prices(
+            symbols: list[str],
+            timeframe: str = '1Min',
+            start: str | None = None,
+            end: str | None = None,
+            as_frames: bool = False
+    ) -> dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame]:
+        """
+        Gets every bar between start and end for many symbols by packing them into as few requests as possible with
+        RequestPlanner, each request is paged until it is complete and its pages are split back out by symbol.
+        Symbols without bars map to an empty list (or empty BarFrame), symbols whose request failed are left out.
+        :param list[str] as symbols:
+        :param str as timeframe: Time inbetween each datapoint
+        :param str or None as start: YYYY-MM-DD or RFC-3339 timestamp, None means one day ago
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp, None means up to now
+        :param bool as as_frames: Return a BarFrame per symbol instead of a list of dicts
+        :return dict[str, list[dict[str, float | int | str]]] | dict[str, BarFrame]:
+        """
+        return dict(MarketData.iter_completed_symbols(symbols, timeframe, start, end, as_frames))
+
+    @staticmethod
+    def __request_symbol_bars(symbol: str, timeframe: str, start: str, end: str | None) -> list[dict[str, float | int | str]] | None:
+        """
+        Private helper for request_cached_past_prices that gets every bar of a single symbol between start and end,
+        returns None if the request failed so the BarCache does not record a range it never received
+        :param str as symbol:
+        :param str as timeframe:
+        :param str as start:
+        :param str or None as end:
+        :return list[dict[str, float | int | str]] | None:
+        """
+        stock_info: dict[str, list[dict[str, float | int | str]]] | None = MarketData.request_past_prices(
+            symbol=symbol,
+            timeframe=timeframe,
+            data_points=None,
+            start=start,
+            end=end
+        )
+        if stock_info is None:
+            return None
+        return stock_info.get(symbol, [])
+
+    @staticmethod
+    def request_cached_past_prices(
+            symbol: str,
+            timeframe: str = '1Min',
+            days_ago: int = 1,
+            as_frames: bool = False
+    ) -> dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame] | None:
+        """
+        Same as request_past_prices without a data_points limit except bars are served from the BarCache, only the
+        missing head (older than anything cached) or tail (newer than the last cached bar) of the requested range is
+        downloaded then merged into the cache which is saved to the computer so it survives restarts.
+        Symbols that could not be served at all are left out of the returned dict, None is returned if none could be
+        :param str as symbol: One or multiple symbols by comma separated list
+        :param str as timeframe: Time inbetween each datapoint
+        :param int as days_ago: The number of days in the past to start gathering data from
+        :param bool as as_frames: Return a BarFrame per symbol instead of a list of dicts
+        :return dict[str, list[dict[str, float | int | str]]] | dict[str, BarFrame] | None:
+        """
+        stock_info: dict[str, list[dict[str, float | int | str]]] | dict[str, bf.BarFrame] = dict(
+            MarketData.iter_cached_past_prices(symbol.split(","), timeframe, days_ago, as_frames)
+        )
+        return stock_info if len(stock_info) > 0 else None
+
+    @staticmethod
+    def iter_cached_past_prices(
+            symbols: list[str],
+            timeframe: str = '1Min',
+            days_ago: int = 1,
+            as_frames: bool = False
+    ) -> Iterator[tuple[str, list[dict[str, float | int | str]] | bf.BarFrame]]:
+        """
+        Generator version of request_cached_past_prices that yields (symbol, bars) as soon as each symbol is ready.
+        Symbols the BarCache can serve without the network come first, then symbols missing the same range are
+        downloaded together with iter_completed_symbols and each is merged into the BarCache and yielded as soon as
+        its last page arrives. Symbols that could not be served are not yielded.
+        When timeframe can be built from BarResampler.SOURCE_TIMEFRAME bars, symbols whose cached source bars already
+        reach back to the start are served by resampling those instead, only their tail is downloaded at the source
+        timeframe and no request is made for timeframe itself.
+        :param list[str] as symbols:
+        :param str as timeframe: Time inbetween each datapoint
+        :param int as days_ago: The number of days in the past to start gathering data from
+        :param bool as as_frames: Yield a BarFrame per symbol instead of a list of dicts, the BarCache keeps bars as
+        a BarFrame so these are views of its columns and must not be written to
+        :return Iterator[tuple[str, list[dict[str, float | int | str]] | BarFrame]]:
+        """
+        start: str = MarketData.days_ago_to_start(days_ago)
+
+        if br.BarResampler.can_resample(br.BarResampler.SOURCE_TIMEFRAME, timeframe):
+            resampled_symbols: list[str] = []
+            requested_symbols: list[str] = []
+            for single_symbol in symbols:
+                source_entry: dict[str, Any] | None = bc.BarCache.get_entry(single_symbol, br.BarResampler.SOURCE_TIMEFRAME)
+                if source_entry is not None and source_entry["start"] <= start:
+                    resampled_symbols.append(single_symbol)
+                else:
+                    requested_symbols.append(single_symbol)
+
+            for source_symbol, source_bars in MarketData.iter_cached_past_prices(
+                resampled_symbols, br.BarResampler.SOURCE_TIMEFRAME, days_ago, as_frames=True
+            ):
+                frame: bf.BarFrame = br.BarResampler.resample(source_bars, timeframe)
+                yield source_symbol, frame if as_frames else frame.to_bars()
+            symbols = requested_symbols
+
+        # Symbols missing exactly one range are grouped by it, the rest need nothing or are fetched on their own
+        ranges_to_symbols: dict[tuple[str, str | None], list[str]] = {}
+        single_symbols: list[str] = []
+        for single_symbol in symbols:
+            needed_ranges: list[tuple[str, str | None]] = bc.BarCache.needed_ranges(single_symbol, timeframe, start)
+            if len(needed_ranges) == 1:
+                ranges_to_symbols.setdefault(needed_ranges[0], []).append(single_symbol)
+            else:
+                single_symbols.append(single_symbol)
+
+        for single_symbol in single_symbols:
+            bars: bf.BarFrame | None = bc.BarCache.get_range(
+                symbol=single_symbol,
+                timeframe=timeframe,
+                start=start,
+                fetch=lambda fetch_start, fetch_end, s=single_symbol: MarketData.__request_symbol_bars(
+                    s, timeframe, fetch_start, fetch_end
+                )
+            )
+            if bars is not None:
+                yield single_symbol, bars if as_frames else bars.to_bars()
+
+        for (range_start, range_end), range_symbols in ranges_to_symbols.items():
+            for range_symbol, range_bars in MarketData.iter_completed_symbols(range_symbols, timeframe, range_start, range_end):
+                bars = bc.BarCache.get_range(
+                    symbol=range_symbol,
+                    timeframe=timeframe,
+                    start=start,
+                    fetch=lambda fetch_start, fetch_end, s=range_symbol, b=range_bars: (
+                        b if (fetch_start, fetch_end) == (range_start, range_end)
+                        else MarketData.__request_symbol_bars(s, timeframe, fetch_start, fetch_end)
+                    )
+                )
+                if bars is not None:
+                    yield range_symbol, bars if as_frames else bars.to_bars()
+
     @staticmethod
     def request_current_prices(symbol: str) -> dict[str, dict[str, float | int | str]] | None:
         """
@@ -134,20 +510,22 @@ class MarketData:
         :param str as symbol: one or multiple symbols by comma separated list
         :return dict[str, dict[str, float | int | str]] | None:
         """
-        response_json: dict[str, dict[str, dict[str, float | int | str]]] = requests.get(
-            url="https://data.alpaca.markets/v2/stocks/bars/latest",
+        response_json: dict[str, dict[str, dict[str, float | int | str]]] | None = MarketData.__request_json(
+            url=f"{MarketData.transport.data_url}/v2/stocks/bars/latest",
             params={
                 "symbols": symbol,
             },
-            headers=MarketData.REQUEST_HEADERS
-        ).json()
+            priority=g.RateLimiter.PRIORITY_MARKET_DATA
+        )
 
-        if "message" in response_json:
-            pass  # Log error
+        if response_json is None:
+            pass  # Already printed why by __request_json
+        elif "message" in response_json:
+            print(f"Latest bars request for {symbol} failed: {response_json['message']}")
         elif "bars" in response_json:
             return response_json["bars"]
         else:
-            pass  # Log unknown error
+            print(f"Latest bars request for {symbol} returned an unknown response")
 
         return None
 
@@ -208,11 +586,16 @@ class MarketData:
         if u.no_trading_client():
             return
 
-        response: Response = requests.get(
-            url="https://paper-api.alpaca.markets/v2/assets",
-            headers=MarketData.REQUEST_HEADERS
+        response: Response | None = MarketData.__send_request(
+            url=f"{MarketData.transport.paper_url}/v2/assets",
+            params=None,
+            priority=g.RateLimiter.PRIORITY_MARKET_DATA
         )
 
+        if response is None:
+            print("No response from the assets request no paper symbol data has been gathered.")
+            return
+
         if response.status_code != 200:
             print(f"Status code is not 200 is is {response.status_code} no paper symbol data has been gathered.")
             return
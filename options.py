@@ -1,9 +1,12 @@
 import order as o
 import order_queue as q
+import queue_dispatcher as qd
 import storage_manager as sm
 import security_manager as s
 import utilities as u
 import market_data as m
+import bar_cache as bc
+import result_cache as rc
 import globals as g
 from alpaca.trading.client import TradingClient
 
@@ -54,31 +57,23 @@ class Options:
         Removes an order based on user input
         :return:
         """
-        if len(o.OrderUtility.all_orders) == 0:
+        if len(o.OrderUtility.orders) == 0:
             print("There are no orders to be removed...")
             return
 
         if u.yes_or_no(msg="View orders") == "y":
             o.OrderUtility.display_orders()
 
-        symbol: str = input("Enter symbol: ")
         unique_id: int | None = None
 
         while unique_id is None:
             unique_id = u.try_int(input("Enter unique id: "))
 
-        if symbol not in o.OrderUtility.all_orders:
-            print("This symbol is not in all_orders")
+        if unique_id not in o.OrderUtility.orders:
+            print(f"Unique ID {unique_id} does not exist")
             return
 
-        if unique_id not in o.OrderUtility.all_orders[symbol]:
-            print(f"Unique ID does not exist for the symbol {symbol}")
-            return
-
-        o.OrderUtility.remove_order(
-            symbol=symbol,
-            unique_id=unique_id
-        )
+        o.OrderUtility.remove_order(unique_id=unique_id)
 
     @staticmethod
     def create_queue() -> None:
@@ -86,9 +81,27 @@ class Options:
         Creates a queue or OrderRecord instances based on user input, starts out as empty
         :return:
         """
+        name_of_queue: str = input("Enter name of queue: ")
+        overwrite: bool = u.yes_or_no("Overwrite queue if already exists?") == "y"
+
+        priority: int | None = u.try_int(input(
+            f"Enter priority, lower is sent first ({qd.QueueDispatcher.PRIORITY_URGENT} urgent, "
+            f"{qd.QueueDispatcher.PRIORITY_NORMAL} normal, {qd.QueueDispatcher.PRIORITY_BULK} bulk) or nothing "
+            f"for normal: "
+        ))
+        deadline: float | None = None
+        time_of_day: str = input("Enter the New York time it must be sent by as HH:MM (16:00 is market close) or nothing for no deadline: ")
+        if time_of_day != "":
+            try:
+                deadline = q.QueueUtility.deadline_at(time_of_day)
+            except ValueError:
+                print(f"{time_of_day} is not a HH:MM time, the queue has no deadline")
+
         q.QueueUtility.create_queue(
-            name_of_queue=input("Enter name of queue: "),
-            overwrite=(u.yes_or_no("Overwrite queue if already exists?") == "y")
+            name_of_queue=name_of_queue,
+            overwrite=overwrite,
+            priority=qd.QueueDispatcher.PRIORITY_NORMAL if priority is None else priority,
+            deadline=deadline
         )
 
     @staticmethod
@@ -116,11 +129,6 @@ class Options:
             print(f"The queue {queue} does not exist")
             return
 
-        symbol = input("Enter stock symbol you want to trade: ")
-        if symbol not in o.OrderUtility.all_orders:
-            print(f"You have no orders for {symbol} stock")
-            return
-
         order_id: int | None = u.try_int(input("Enter order id: "))
         if order_id is None:
             print(
@@ -128,13 +136,12 @@ class Options:
                 "failed implying what was entered was not an int"
             )
             return
-        elif order_id not in o.OrderUtility.all_orders[symbol]:
-            print(f"There are no order ids of {order_id} associated with this symbol")
+        elif order_id not in o.OrderUtility.orders:
+            print(f"There are no orders with the id {order_id}")
             return
 
         q.QueueUtility.add_to_queue(
             queue_name=queue,
-            symbol=symbol,
             order_id=order_id
         )
 
@@ -153,7 +160,10 @@ class Options:
         if confirm != "y":
             return
 
-        q.QueueUtility.send_queue(queue_name=queue)
+        q.QueueUtility.send_queue(
+            queue_name=queue,
+            net=(u.yes_or_no("Net orders of the same symbol into one before sending?") == "y")
+        )
 
     @staticmethod
     def remove_queue() -> None:
@@ -184,6 +194,31 @@ class Options:
         """
         m.MarketData.display_paper_symbols()
 
+    @staticmethod
+    def display_bar_cache_stats() -> None:
+        """
+        Displays how many historical bar requests were served from the bar cache
+        :return:
+        """
+        bc.BarCache.display_stats()
+
+    @staticmethod
+    def display_analysis_cache_stats() -> None:
+        """
+        Displays how many symbol analyses were served from the analysis result cache
+        :return:
+        """
+        rc.ResultCache.display_stats()
+
+    @staticmethod
+    def display_rate_limit_quota() -> None:
+        """
+        Displays the shared rate limiter's current rate and the last quota the API reported
+        :return:
+        """
+        for name, value in g.alpaca_rate_limit.quota_state().items():
+            print(f"{name}: {value}")
+
     @staticmethod
     def view_account() -> None:
         """
@@ -243,13 +278,14 @@ class Options:
     @staticmethod
     def is_queue_sending() -> None:
         """
-        Displays to the user if there is an active queue
+        Displays to the user if there is an active queue along with the progress of every queue sent
         :return:
         """
-        if q.QueueUtility.sending_queue:
+        if q.QueueUtility.is_sending():
             print("Queue is currently being sent")
         else:
             print("No queue is being sent")
+        q.QueueUtility.dispatcher.display_progress()
 
     @staticmethod
     def reload_local_info() -> None:
@@ -2,56 +2,113 @@ from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 from uuid import uuid4
 from collections import deque
+from typing import Any, Sequence
+import itertools
+import numpy as np
+import order_store as ost
 
 
 class OrderRecord:
     """
-    A wrapper around MarketOrderRequest to give each a unique id generated by uuid4()
+    A market order with a unique id, only plain fields are kept and the MarketOrderRequest sent to Alpaca is built the
+    first time market_order is used (usually when the order is submitted) since its validation costs far more than
+    the order itself and most orders a strategy makes are netted or thrown away before they are sent. __slots__ keeps
+    each order small, orders saved before this still load through __setstate__.
+    Ids are 128 bit ints like uuid4().int, a random uuid4 is drawn once per run and every order counts up from it so
+    ids stay unique across runs without calling uuid4() for every order.
     Raises ValueError is symbol is None or quantity is None or quantity is negative
     """
+    __slots__ = ("id", "symbol", "qty", "side", "time_in_force", "exception", "_market_order")
+
+    _ids: itertools.count = itertools.count(int(uuid4()) & ~((1 << 32) - 1))  # Low 32 bits count up from a random id
+
     def __init__(
         self,
         symbol: str = None,
-        qty: int = None,
+        qty: int | float = None,
         side: str = OrderSide.BUY,
-        time_in_force: str = TimeInForce.DAY
+        time_in_force: str = TimeInForce.DAY,
+        validate: bool = True
     ):
-
+        """
+        :param str as symbol:
+        :param int or float as qty:
+        :param str as side: OrderSide or "buy" / "sell"
+        :param str as time_in_force: TimeInForce or its value such as "day"
+        :param bool as validate: Check symbol and qty, only skipped when they were already checked in bulk
+        """
         # Assuming this is during automation this should stop the code as it will only happen if something really goes wrong
-        if symbol is None:
-            raise ValueError("The symbol when creating an OrderRecord must not be None, give a proper symbol value!")
-        elif qty is None:
-            raise ValueError("The qty when creating an OrderRecord must not be None, give a proper quantity!")
-        elif qty <= 0:
-            raise ValueError("The qty when creating an OrderRecord is <= 0!")
-
-        self.id: int = int(uuid4())
-        self.exception: Exception | None = None
+        if validate:
+            if symbol is None:
+                raise ValueError("The symbol when creating an OrderRecord must not be None, give a proper symbol value!")
+            elif qty is None:
+                raise ValueError("The qty when creating an OrderRecord must not be None, give a proper quantity!")
+            elif qty <= 0:
+                raise ValueError("The qty when creating an OrderRecord is <= 0!")
 
-        self.market_order = MarketOrderRequest(
-            symbol=symbol,
-            qty=qty,
-            side=side,
-            time_in_force=time_in_force
+        self.id: int = next(OrderRecord._ids)
+        self.symbol: str = symbol
+        self.qty: int | float = qty
+        # Converting an enum to itself still costs an Enum lookup so it is skipped
+        self.side: OrderSide = side if isinstance(side, OrderSide) else OrderSide(side)
+        self.time_in_force: TimeInForce = (
+            time_in_force if isinstance(time_in_force, TimeInForce) else TimeInForce(time_in_force)
         )
+        self.exception: Exception | None = None
+        self._market_order: MarketOrderRequest | None = None
+
+    @property
+    def market_order(self) -> MarketOrderRequest:
+        """
+        The MarketOrderRequest for this order, built and validated the first time it is used
+        :return MarketOrderRequest:
+        """
+        if self._market_order is None:
+            self._market_order = MarketOrderRequest(
+                symbol=self.symbol,
+                qty=self.qty,
+                side=self.side,
+                time_in_force=self.time_in_force
+            )
+        return self._market_order
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The MarketOrderRequest is left out, it is built again when needed
+        return {slot: getattr(self, slot) for slot in OrderRecord.__slots__ if slot != "_market_order"}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        if "market_order" in state:
+            # Saved before __slots__, the fields only existed on the MarketOrderRequest
+            market_order: MarketOrderRequest = state["market_order"]
+            state = {
+                "id": state["id"],
+                "symbol": market_order.symbol,
+                "qty": int(market_order.qty) if float(market_order.qty).is_integer() else market_order.qty,
+                "side": OrderSide(market_order.side),
+                "time_in_force": TimeInForce(market_order.time_in_force),
+                "exception": state.get("exception")
+            }
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._market_order = None
 
     def __str__(self):
         return (
-            f"Symbol:     {self.market_order.symbol}\n"
-            f"Quantity:   {self.market_order.qty}\n"
-            f"Action:     {self.market_order.side}\n"
-            f"Trade Time: {self.market_order.time_in_force}\n"
-            f"Failed:     {self.failed}\n"
+            f"Symbol:     {self.symbol}\n"
+            f"Quantity:   {self.qty}\n"
+            f"Action:     {self.side}\n"
+            f"Trade Time: {self.time_in_force}\n"
+            f"Failed:     {self.exception is not None}\n"
             f"Unique ID:  {self.id}\n"
         )
 
 
 class OrderUtility:
-    all_orders: dict[str, dict[int, "OrderRecord"]] = {}
+    orders: ost.OrderStore = ost.OrderStore()  # Every order by id with indexes by symbol, side, status and queue
     failed_orders: dict[str, deque["OrderRecord"]] = {}  # str key is queue name, then a deque of OrderRecords that failed
 
     @staticmethod
-    def create_order(symbol: str, qty: int, side: str | None = None, overwrite: bool = False) -> str:
+    def create_order(symbol: str, qty: int, side: str | None = None, overwrite: bool = False) -> int:
         """
         Creates an OrderRecord based of given parameters, if order exists and overwrite is set to True it will be
         overwritten, qty is the quantity of shares for a stock, side is buy or sell a stock
@@ -59,7 +116,7 @@ class OrderUtility:
         :param int as qty:
         :param str or None as side:
         :param bool as overwrite:
-        :return str as id: 
+        :return int as id:
         """
         if side == "buy":
             side = OrderSide.BUY
@@ -68,41 +125,113 @@ class OrderUtility:
 
         new_order = OrderRecord(symbol, qty, side)
         name = new_order.id
-        if symbol in OrderUtility.all_orders:
-            if name in OrderUtility.all_orders[symbol]:
-                if overwrite:
-                    print(f"Order stored, overwritten the previous {name} at {symbol}")
-                    OrderUtility.all_orders[symbol][name] = new_order
-                else:
-                    print("Order storing cancelled")
+        if not OrderUtility.orders.add(new_order):
+            if overwrite:
+                print(f"Order stored, overwritten the previous {name} at {symbol}")
+                OrderUtility.orders.remove(name)
+                OrderUtility.orders.add(new_order)
             else:
-                OrderUtility.all_orders[symbol][name] = new_order
-        else:
-            OrderUtility.all_orders[symbol] = {name: new_order}
-        
+                print("Order storing cancelled")
+
         return name
 
+    @staticmethod
+    def create_orders_bulk(
+            symbols: Sequence[str],
+            qtys: Sequence[int | float] | np.ndarray,
+            sides: Sequence[str] | str = OrderSide.BUY,
+            time_in_force: str = TimeInForce.DAY,
+            store: bool = True
+    ) -> list[OrderRecord]:
+        """
+        Creates an OrderRecord for every symbol and qty at the same index, the whole batch is checked at once with
+        NumPy instead of order by order and no MarketOrderRequest is built until an order is sent. Raises ValueError
+        naming the first bad order if any symbol is empty, any qty is not a positive number or any side is not buy or
+        sell, no orders are created in that case. If store is True every order is added to OrderUtility.orders under
+        one lock acquisition
+        :param Sequence[str] as symbols:
+        :param Sequence[int | float] or np.ndarray as qtys:
+        :param Sequence[str] or str as sides: One side for every order or an OrderSide / "buy" / "sell" for all of them
+        :param str as time_in_force: TimeInForce or its value such as "day"
+        :param bool as store:
+        :return list[OrderRecord]:
+        """
+        count: int = len(symbols)
+        quantities: np.ndarray = np.asarray(qtys)
+        if quantities.shape != (count,):
+            raise ValueError(f"Got {count} symbols and {quantities.size} quantities when creating orders in bulk!")
+
+        if isinstance(sides, str):
+            side_values: np.ndarray = np.full(count, OrderSide(sides).value)
+        else:
+            side_values = np.array([OrderSide(side).value if isinstance(side, OrderSide) else side for side in sides])
+            if side_values.shape != (count,):
+                raise ValueError(f"Got {count} symbols and {side_values.size} sides when creating orders in bulk!")
+
+        bad: np.ndarray = np.array([not symbol for symbol in symbols], dtype=bool)
+        if quantities.dtype.kind not in "iuf":
+            raise ValueError("The qtys when creating orders in bulk must be numbers!")
+        bad |= ~np.isfinite(quantities) | (quantities <= 0)
+        bad |= ~np.isin(side_values, (OrderSide.BUY.value, OrderSide.SELL.value))
+        if bad.any():
+            index: int = int(np.argmax(bad))
+            raise ValueError(
+                f"Order {index} ({symbols[index]!r}, qty {quantities[index]}, side {side_values[index]!r}) is not valid "
+                f"so no orders were created, symbols must not be empty, qtys must be > 0 and sides buy or sell!"
+            )
+
+        side_of: dict[str, OrderSide] = {OrderSide.BUY.value: OrderSide.BUY, OrderSide.SELL.value: OrderSide.SELL}
+        time_in_force = TimeInForce(time_in_force)
+        orders: list[OrderRecord] = [
+            OrderRecord(symbol, qty, side_of[side], time_in_force, validate=False)
+            for symbol, qty, side in zip(symbols, quantities.tolist(), side_values.tolist())
+        ]
+        if store:
+            OrderUtility.orders.add_many(orders)
+        return orders
+
+    @staticmethod
+    def set_orders(saved_orders: ost.OrderStore | dict[str, dict[int, "OrderRecord"]]) -> None:
+        """
+        Replaces every order with saved_orders, orders saved before the OrderStore existed are a dict of symbol to
+        a dict of id to OrderRecord and are added to a new OrderStore
+        :param OrderStore or dict[str, dict[int, OrderRecord]] as saved_orders:
+        :return:
+        """
+        if isinstance(saved_orders, ost.OrderStore):
+            OrderUtility.orders = saved_orders
+            return
+
+        orders: ost.OrderStore = ost.OrderStore()
+        for symbol_orders in saved_orders.values():
+            for order in symbol_orders.values():
+                orders.add(order)
+        OrderUtility.orders = orders
+
     @staticmethod
     def display_orders() -> None:
         """
         Displays all orders and there ID
         :return:
         """
-        for symbol, orders in OrderUtility.all_orders.items():
+        for symbol in OrderUtility.orders.symbols():
             print(f"Stock Symbol: {symbol}")
-            for name, order in orders.items():
-                print(f"\tOrder ID: {name}\n\t\t{order.market_order}")
+            for order in OrderUtility.orders.by_symbol(symbol):
+                print(
+                    f"\tOrder ID: {order.id} ({OrderUtility.orders.status_of(order.id)}"
+                    f"{'' if OrderUtility.orders.queue_of(order.id) is None else f' in {OrderUtility.orders.queue_of(order.id)}'})"
+                    f"\n\t\tsymbol='{order.symbol}' qty={order.qty} side={order.side} time_in_force={order.time_in_force}"
+                )
 
     @staticmethod
-    def remove_order(symbol: str, unique_id: int) -> None:
+    def remove_order(unique_id: int) -> None:
         """
-        Removed an order based off its symbol and unique id
-        :param str as symbol:
+        Removed an order based off its unique id
         :param int as unique_id:
         :return:
         """
-        OrderUtility.all_orders[symbol].pop(unique_id)
+        order: OrderRecord | None = OrderUtility.orders.remove(unique_id)
+        if order is None:
+            print(f"There is no order with the id {unique_id}")
+            return
         print("Removed the order!")
-        if len(OrderUtility.all_orders[symbol]) == 0:
-            OrderUtility.all_orders.pop(symbol)
-            print(f"Removed {symbol} from all_orders as no orders with that symbol remained")
@@ -1,12 +1,10 @@
-import time
-from datetime import datetime
-import pytz
+import datetime
+import zoneinfo
+from alpaca.trading.enums import OrderSide
 from order import OrderRecord
 import order as o
-import threading
 from collections import deque
-import os
-import globals as g
+import queue_dispatcher as qd
 
 
 class QueueUtility:
@@ -14,26 +12,67 @@ class QueueUtility:
     The static class that holds all helper functions and data related to queues
     """
     all_queues: dict[str, deque["OrderRecord"]] = {}
-    sending_queue: bool = False  # True if a queue is currently being sent, False if not
-    last_order_time: int = time.monotonic()  # Time when the last order was sent
+    # Queue name to (priority, deadline as time.time() or None), queues without one are sent at normal priority
+    schedules: dict[str, tuple[int, float | None]] = {}
+    dispatcher: qd.QueueDispatcher = qd.QueueDispatcher()  # Sends every queue, any number can be sending at once
 
     @staticmethod
-    def create_queue(name_of_queue: str, overwrite: bool = False) -> None:
+    def create_queue(
+            name_of_queue: str,
+            overwrite: bool = False,
+            priority: int = qd.QueueDispatcher.PRIORITY_NORMAL,
+            deadline: float | None = None
+    ) -> None:
         """
         Creates a queue based off the parameters, makes the name of the queue name_of_queue and if it exists and
         overwrite is set to True it will be overwritten with an empty queue
         :param str as name_of_queue:
         :param bool as overwrite:
+        :param int as priority: Lower is sent first when several queues are sending, see QueueDispatcher
+        :param float or None as deadline: time.time() the queue should be submitted by, None for no deadline
         :return:
         """
         if name_of_queue in QueueUtility.all_queues:
             if overwrite:
                 print(f"Overwritten {name_of_queue} with empty deque")
                 QueueUtility.all_queues[name_of_queue] = deque()
+                QueueUtility.schedules[name_of_queue] = (priority, deadline)
             else:
                 print("Queue overwriting cancelled")
         else:
             QueueUtility.all_queues[name_of_queue] = deque()
+            QueueUtility.schedules[name_of_queue] = (priority, deadline)
+
+    @staticmethod
+    def set_schedule(queue_name: str, priority: int, deadline: float | None = None) -> None:
+        """
+        Changes the priority and deadline the queue is sent with
+        :param str as queue_name:
+        :param int as priority:
+        :param float or None as deadline: time.time() the queue should be submitted by, None for no deadline
+        :return:
+        """
+        if queue_name not in QueueUtility.all_queues:
+            print(f"The queue {queue_name} does not exist")
+            return
+        QueueUtility.schedules[queue_name] = (priority, deadline)
+
+    @staticmethod
+    def deadline_at(time_of_day: str, market_timezone: str = "America/New_York") -> float:
+        """
+        Returns the time.time() of the next HH:MM in the market's time zone, for example "16:00" for the next market
+        close, raises ValueError if time_of_day is not HH:MM
+        :param str as time_of_day:
+        :param str as market_timezone:
+        :return float:
+        """
+        now: datetime.datetime = datetime.datetime.now(zoneinfo.ZoneInfo(market_timezone))
+        deadline: datetime.datetime = datetime.datetime.combine(
+            now.date(), datetime.time.fromisoformat(time_of_day), now.tzinfo
+        )
+        if deadline <= now:
+            deadline = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), deadline.time(), now.tzinfo)
+        return deadline.timestamp()
 
     @staticmethod
     def display_queue_names() -> None:
@@ -45,97 +84,97 @@ class QueueUtility:
             print(key)
 
     @staticmethod
-    def add_to_queue(queue_name: str, symbol: str, order_id: int) -> None:
+    def add_to_queue(queue_name: str, order_id: int) -> None:
         """
-        Adds an OrderRecord to queue based off of user input
+        Adds an OrderRecord to queue based off of user input, the OrderStore records the queue as its owner
         :param str as queue_name:
-        :param str as symbol:
         :param int as order_id:
         :return:
         """
-        QueueUtility.all_queues[queue_name].append(o.OrderUtility.all_orders[symbol][order_id])
+        QueueUtility.all_queues[queue_name].append(o.OrderUtility.orders.get(order_id))
+        o.OrderUtility.orders.update(order_id, status=o.ost.OrderStore.STATUS_QUEUED, queue=queue_name)
         print("Successfully added to queue!")
 
     @staticmethod
-    def send_queue(queue_name: str) -> None:
+    def net_orders(queue: deque["OrderRecord"]) -> tuple[deque["OrderRecord"], dict[int, int | None]]:
+        """
+        Nets the orders of a queue so every (symbol, time in force) is sent as at most one order with the same effect,
+        buys add and sells subtract shares, a symbol whose buys and sells cancel out is not sent at all. Orders are
+        kept in the order each (symbol, time in force) first appears, an order that is alone in its group is kept as
+        is and a group of several is replaced by a new OrderRecord that is not added to OrderUtility.orders.
+        Returns the netted queue along with the id of every original order mapped to the id of the order that
+        replaced it (its own id if it was kept, None if it cancelled out)
+        :param deque[OrderRecord] as queue:
+        :return tuple[deque[OrderRecord], dict[int, int | None]]:
+        """
+        groups: dict[tuple[str, str], list[OrderRecord]] = {}
+        for order in queue:
+            groups.setdefault((order.symbol, order.time_in_force), []).append(order)
+
+        netted: deque[OrderRecord] = deque()
+        replaced_by: dict[int, int | None] = {}
+        for (symbol, time_in_force), orders in groups.items():
+            if len(orders) == 1:
+                netted.append(orders[0])
+                replaced_by[orders[0].id] = orders[0].id
+                continue
+
+            shares: float = sum(
+                order.qty if order.side == OrderSide.BUY else -order.qty
+                for order in orders
+            )
+            replacement: OrderRecord | None = None
+            if abs(shares) > 1e-9:
+                replacement = OrderRecord(
+                    symbol=symbol,
+                    qty=int(abs(shares)) if float(shares).is_integer() else abs(shares),
+                    side=OrderSide.BUY if shares > 0 else OrderSide.SELL,
+                    time_in_force=time_in_force
+                )
+                netted.append(replacement)
+            for order in orders:
+                replaced_by[order.id] = None if replacement is None else replacement.id
+
+        return netted, replaced_by
+
+    @staticmethod
+    def send_queue(queue_name: str, net: bool = False) -> None:
         """
-        Sends a queue based off the queue_name and attempts to send everything in the queue
+        Sends a queue based off the queue_name and attempts to send everything in the queue, several queues can be
+        sent at once and share the dispatcher's workers
         Failed orders will be added to OrderUtility.failed_orders
         :param str as queue_name:
+        :param bool as net: Net the orders with net_orders first so fewer are sent, which original order each sent
+        one replaced is written to the queue's log
         :return:
         """
         if queue_name not in QueueUtility.all_queues:
             print(f"The queue {queue_name} does not exist")
             return
 
-        if QueueUtility.sending_queue:
-            print("Already sending a queue")
+        if QueueUtility.dispatcher.is_sending(queue_name):
+            print(f"Already sending a queue named {queue_name}")
             return
 
-        threading.Thread(
-            target=QueueUtility.__queue_sender,
-            args=(queue_name, QueueUtility.all_queues.pop(queue_name))
-        ).start()
+        priority, deadline = QueueUtility.schedules.pop(queue_name, (qd.QueueDispatcher.PRIORITY_NORMAL, None))
+        queue: deque[OrderRecord] = QueueUtility.all_queues.pop(queue_name)
+        replaced_by: dict[int, int | None] | None = None
+        if net:
+            original_count: int = len(queue)
+            queue, replaced_by = QueueUtility.net_orders(queue)
+            print(f"Netted {original_count} orders of {queue_name} into {len(queue)}")
+            if len(queue) == 0:
+                print(f"Every order of {queue_name} cancelled out, nothing is sent")
+        QueueUtility.dispatcher.send(queue_name, queue, priority, deadline, replaced_by)
 
     @staticmethod
-    def __queue_sender(queue_name: str, queue: deque[OrderRecord]) -> None:
-        """
-        Parameters are the name of the queue as queue_name and the actual queue as a deque[OrderRecord]
-        Returns nothing
-        This method is started in a thread called in send_queue()
-        Marks the sending_queue in utilities.py as True when it starts then marks it as False when finished
-        Logs everything in a log file that is named with the queue name and timestamp under the queue_logs directory
-        Logs timestamps in milliseconds since its start, the information received after order is sent
-        Tells the user if the order passed or failed
-        If order fails it gets added to the failed_orders in utilities.py
-        Has a 350 millisecond delay 0.35 seconds
-        The start and end of the log file are clearly marked with Start of log file and
-        |End| of log file respectively
-        """
-        #  Rate limit information: https://alpaca.markets/support/usage-limit-api-calls
-        #  200 requests per minute -> 1.01 request per .30 seconds, delay will be .35 seconds to be safe
-        QueueUtility.sending_queue = True
-        start_time: float = time.monotonic()
-
-        try:
-            os.mkdir(path="queue_logs")
-        except FileExistsError:
-            pass
-        except FileNotFoundError:
-            print(f"Problem creating the log directory the queue {queue_name} __queue_sender returning.")
-            return
-
-        with open(f"queue_logs/{queue_name} at {datetime.now(pytz.timezone('EST')).date()}", "w") as log_file:
-            print("_____ _____ _____ _____ Start of log file _____ _____ _____ _____\n", file=log_file)
-            seperator: str = ("\n##### ##### ##### ##### ##### ##### ##### #####\n"
-                              "\n##### ##### ##### ##### ##### ##### ##### #####")
-
-            while len(queue) > 0:
-                current_order: OrderRecord = queue.popleft()
-                try:
-                    print(
-                        str(g.trading_client.submit_order(
-                            current_order.market_order
-                        )) + f"\nTimestamp: {time.time() - start_time} milliseconds from start time" +
-                        seperator,
-                        file=log_file
-                    )
-                except Exception as e:  # I could not find the documentation for what exceptions this throws
-                    print(f"Failed to send {current_order.id} due to {e}{seperator}", file=log_file)
-
-                    current_order.exception = e
-
-                    if queue_name not in o.OrderUtility.failed_orders:
-                        o.OrderUtility.failed_orders[queue_name] = deque()
-                    else:
-                        o.OrderUtility.failed_orders[queue_name].append(current_order)
-
-                current_time_dif: float = time.monotonic() - QueueUtility.last_order_time
-                if current_time_dif < .35:
-                    time.sleep(0.35 - current_time_dif)
-                QueueUtility.last_order_time = time.monotonic()
-            print("\n_____ _____ _____ _____ |End| of log file _____ _____ _____ _____", file=log_file)
-        QueueUtility.sending_queue = False
+    def is_sending(queue_name: str | None = None) -> bool:
+        """
+        Returns whether the queue is being sent, if queue_name is None whether any queue is
+        :param str or None as queue_name:
+        :return bool:
+        """
+        return QueueUtility.dispatcher.is_sending(queue_name)
 
     @staticmethod
     def remove_queue(queue_name: str) -> None:
@@ -145,6 +184,10 @@ class QueueUtility:
         :return:
         """
         if queue_name in QueueUtility.all_queues:
-            print(f"Removed {queue_name} when it had {len(QueueUtility.all_queues.pop(queue_name))} orders!")
+            QueueUtility.schedules.pop(queue_name, None)
+            queue: deque[OrderRecord] = QueueUtility.all_queues.pop(queue_name)
+            for order in queue:
+                o.OrderUtility.orders.update(order.id, status=o.ost.OrderStore.STATUS_CREATED, clear_queue=True)
+            print(f"Removed {queue_name} when it had {len(queue)} orders!")
         else:
             print(f"{queue_name} is not a valid queue!")
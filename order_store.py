@@ -0,0 +1,272 @@
+import threading
+from typing import TYPE_CHECKING, Any, Iterator
+from alpaca.trading.enums import OrderSide
+
+if TYPE_CHECKING:
+    import order as o
+
+
+class OrderStore:
+    """
+    Every OrderRecord by its id along with secondary indexes by symbol, side, status and the queue that owns it, so
+    any order or group of orders is found with dict lookups instead of scanning every symbol. Each index maps its
+    value to a dict used as an ordered set of order ids so orders come back in the order they joined it.
+    Statuses are one of the STATUS_ values, the owning queue is None when the order is in no queue. Every change goes
+    through one lock and updates every index before it is released so the indexes always agree, the store can be used
+    from the queue dispatcher's worker threads. The lock is left out when pickling and a new one is made when loaded.
+    """
+    STATUS_CREATED: str = "created"
+    STATUS_QUEUED: str = "queued"
+    STATUS_SENT: str = "sent"
+    STATUS_FAILED: str = "failed"
+    STATUS_NETTED: str = "netted"  # Cancelled out or sent as part of another order by QueueUtility.net_orders
+
+    def __init__(self):
+        self._orders: dict[int, o.OrderRecord] = {}
+        self._statuses: dict[int, str] = {}
+        self._queues: dict[int, str | None] = {}
+        self._by_symbol: dict[str, dict[int, None]] = {}
+        self._by_side: dict[OrderSide, dict[int, None]] = {}
+        self._by_status: dict[str, dict[int, None]] = {}
+        self._by_queue: dict[str | None, dict[int, None]] = {}
+        self._lock: threading.RLock = threading.RLock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state: dict[str, Any] = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    def __iter__(self) -> Iterator["o.OrderRecord"]:
+        with self._lock:
+            return iter(list(self._orders.values()))
+
+    @staticmethod
+    def __index_add(index: dict[Any, dict[int, None]], key: Any, order_id: int) -> None:
+        """
+        Private helper that adds the id under the key of the index
+        :param dict as index:
+        :param Any as key:
+        :param int as order_id:
+        :return:
+        """
+        index.setdefault(key, {})[order_id] = None
+
+    @staticmethod
+    def __index_remove(index: dict[Any, dict[int, None]], key: Any, order_id: int) -> None:
+        """
+        Private helper that removes the id from under the key of the index, keys left with no ids are removed
+        :param dict as index:
+        :param Any as key:
+        :param int as order_id:
+        :return:
+        """
+        ids: dict[int, None] | None = index.get(key)
+        if ids is None:
+            return
+        ids.pop(order_id, None)
+        if len(ids) == 0:
+            del index[key]
+
+    def add(self, order: "o.OrderRecord", status: str = STATUS_CREATED, queue: str | None = None) -> bool:
+        """
+        Adds the order, returns False without changing anything if an order with the same id is already stored
+        :param OrderRecord as order:
+        :param str as status:
+        :param str or None as queue: Queue that owns the order
+        :return bool:
+        """
+        with self._lock:
+            if order.id in self._orders:
+                return False
+            self._orders[order.id] = order
+            self._statuses[order.id] = status
+            self._queues[order.id] = queue
+            OrderStore.__index_add(self._by_symbol, order.symbol, order.id)
+            OrderStore.__index_add(self._by_side, order.side, order.id)
+            OrderStore.__index_add(self._by_status, status, order.id)
+            OrderStore.__index_add(self._by_queue, queue, order.id)
+            return True
+
+    def add_many(self, orders: list["o.OrderRecord"], status: str = STATUS_CREATED, queue: str | None = None) -> int:
+        """
+        add for many orders while holding the lock once, returns how many were added, orders whose id is already
+        stored are skipped
+        :param list[OrderRecord] as orders:
+        :param str as status:
+        :param str or None as queue: Queue that owns the orders
+        :return int:
+        """
+        added: int = 0
+        with self._lock:
+            status_ids: dict[int, None] = self._by_status.setdefault(status, {})
+            queue_ids: dict[int, None] = self._by_queue.setdefault(queue, {})
+            for order in orders:
+                if order.id in self._orders:
+                    continue
+                self._orders[order.id] = order
+                self._statuses[order.id] = status
+                self._queues[order.id] = queue
+                self._by_symbol.setdefault(order.symbol, {})[order.id] = None
+                self._by_side.setdefault(order.side, {})[order.id] = None
+                status_ids[order.id] = None
+                queue_ids[order.id] = None
+                added += 1
+            # Keys left with no ids are removed like __index_remove does
+            if len(status_ids) == 0:
+                del self._by_status[status]
+            if len(queue_ids) == 0:
+                del self._by_queue[queue]
+        return added
+
+    def remove(self, order_id: int) -> "o.OrderRecord | None":
+        """
+        Removes the order and returns it, None if there is no order with the id
+        :param int as order_id:
+        :return OrderRecord | None:
+        """
+        with self._lock:
+            order: o.OrderRecord | None = self._orders.pop(order_id, None)
+            if order is None:
+                return None
+            OrderStore.__index_remove(self._by_symbol, order.symbol, order_id)
+            OrderStore.__index_remove(self._by_side, order.side, order_id)
+            OrderStore.__index_remove(self._by_status, self._statuses.pop(order_id), order_id)
+            OrderStore.__index_remove(self._by_queue, self._queues.pop(order_id), order_id)
+            return order
+
+    def update(self, order_id: int, status: str | None = None, queue: str | None = None, clear_queue: bool = False) -> bool:
+        """
+        Changes the status and/or owning queue of the order, returns False if there is no order with the id
+        :param int as order_id:
+        :param str or None as status: New status, None to leave it
+        :param str or None as queue: New owning queue, None to leave it
+        :param bool as clear_queue: Take the order out of its queue, queue is ignored
+        :return bool:
+        """
+        with self._lock:
+            if order_id not in self._orders:
+                return False
+            if status is not None and status != self._statuses[order_id]:
+                OrderStore.__index_remove(self._by_status, self._statuses[order_id], order_id)
+                OrderStore.__index_add(self._by_status, status, order_id)
+                self._statuses[order_id] = status
+            new_queue: str | None = None if clear_queue else queue if queue is not None else self._queues[order_id]
+            if new_queue != self._queues[order_id]:
+                OrderStore.__index_remove(self._by_queue, self._queues[order_id], order_id)
+                OrderStore.__index_add(self._by_queue, new_queue, order_id)
+                self._queues[order_id] = new_queue
+            return True
+
+    def get(self, order_id: int) -> "o.OrderRecord | None":
+        """
+        Returns the order with the id, None if there is none
+        :param int as order_id:
+        :return OrderRecord | None:
+        """
+        return self._orders.get(order_id)
+
+    def status_of(self, order_id: int) -> str | None:
+        """
+        Returns the status of the order, None if there is no order with the id
+        :param int as order_id:
+        :return str | None:
+        """
+        return self._statuses.get(order_id)
+
+    def queue_of(self, order_id: int) -> str | None:
+        """
+        Returns the queue that owns the order, None if it is in no queue or there is no order with the id
+        :param int as order_id:
+        :return str | None:
+        """
+        return self._queues.get(order_id)
+
+    def symbols(self) -> list[str]:
+        """
+        Returns every symbol with at least one order
+        :return list[str]:
+        """
+        with self._lock:
+            return list(self._by_symbol)
+
+    def __lookup(self, index: dict[Any, dict[int, None]], key: Any) -> list["o.OrderRecord"]:
+        """
+        Private helper that returns the orders under the key of the index in the order they were added
+        :param dict as index:
+        :param Any as key:
+        :return list[OrderRecord]:
+        """
+        with self._lock:
+            return [self._orders[order_id] for order_id in index.get(key, ())]
+
+    def by_symbol(self, symbol: str) -> list["o.OrderRecord"]:
+        """
+        :param str as symbol:
+        :return list[OrderRecord]:
+        """
+        return self.__lookup(self._by_symbol, symbol)
+
+    def by_side(self, side: OrderSide | str) -> list["o.OrderRecord"]:
+        """
+        :param OrderSide or str as side: OrderSide or "buy" / "sell"
+        :return list[OrderRecord]:
+        """
+        return self.__lookup(self._by_side, OrderSide(side))
+
+    def by_status(self, status: str) -> list["o.OrderRecord"]:
+        """
+        :param str as status:
+        :return list[OrderRecord]:
+        """
+        return self.__lookup(self._by_status, status)
+
+    def by_queue(self, queue: str | None) -> list["o.OrderRecord"]:
+        """
+        :param str or None as queue: None for the orders in no queue
+        :return list[OrderRecord]:
+        """
+        return self.__lookup(self._by_queue, queue)
+
+    def find(
+            self,
+            symbol: str | None = None,
+            side: OrderSide | str | None = None,
+            status: str | None = None,
+            queue: str | None = None
+    ) -> list["o.OrderRecord"]:
+        """
+        Returns the orders matching every filter that is not None, only the smallest matching index is walked and
+        the others are checked with set lookups
+        :param str or None as symbol:
+        :param OrderSide or str or None as side:
+        :param str or None as status:
+        :param str or None as queue:
+        :return list[OrderRecord]:
+        """
+        with self._lock:
+            matches: list[dict[int, None]] = [
+                index.get(key, {}) for index, key in (
+                    (self._by_symbol, symbol),
+                    (self._by_side, None if side is None else OrderSide(side)),
+                    (self._by_status, status),
+                    (self._by_queue, queue)
+                ) if key is not None
+            ]
+            if len(matches) == 0:
+                return list(self._orders.values())
+
+            matches.sort(key=len)
+            return [
+                self._orders[order_id] for order_id in matches[0]
+                if all(order_id in ids for ids in matches[1:])
+            ]
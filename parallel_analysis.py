@@ -0,0 +1,118 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import algorithm_trading as at
+import bar_frame as bf
+import scoring_engine as se
+
+
+class ParallelAnalysis:
+    """
+    Static class that scores symbols across a pool of processes so scoring is not limited to the one core the GIL
+    allows. Every symbol's prices are copied once into a single multiprocessing.shared_memory block laid out end to
+    end, workers map that block and score views of it with DataAnalysis.score_symbol_multi_scale so no bars are
+    pickled into them, only the symbols, offsets and resulting SymbolStats cross between processes.
+    """
+    CHUNKS_PER_WORKER: int = 4  # More chunks than workers so one slow chunk does not leave the other workers idle
+
+    @staticmethod
+    def plan_chunks(lengths: np.ndarray, chunk_count: int) -> list[tuple[int, int]]:
+        """
+        Splits the symbols into at most chunk_count contiguous [start, end) ranges of symbol indexes holding about the
+        same number of bars each, scoring time grows with the number of bars rather than the number of symbols
+        :param np.ndarray as lengths: Number of bars of each symbol
+        :param int as chunk_count:
+        :return list[tuple[int, int]]:
+        """
+        cumulative_lengths: np.ndarray = np.cumsum(lengths)
+        targets: np.ndarray = cumulative_lengths[-1] * np.arange(1, chunk_count) / chunk_count
+        boundaries: list[int] = [0, *np.searchsorted(cumulative_lengths, targets, side="right").tolist(), len(lengths)]
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    @staticmethod
+    def score_shared_chunk(
+            shared_memory_name: str,
+            price_count: int,
+            symbols: list[str],
+            offsets: list[int],
+            window_percents: list[float]
+    ) -> list[list["at.SymbolStat"]]:
+        """
+        Runs in a worker process, maps the shared prices and scores one chunk of symbols
+        :param str as shared_memory_name: Name of the block made by score_universe
+        :param int as price_count: Number of float64 prices in the block
+        :param list[str] as symbols: Symbols of the chunk
+        :param list[int] as offsets: Where each symbol's prices start in the block followed by where the last one ends
+        :param list[float] as window_percents:
+        :return list[list[SymbolStat]]: One list per symbol with a SymbolStat per window_percent
+        """
+        block: shared_memory.SharedMemory = shared_memory.SharedMemory(name=shared_memory_name)
+        try:
+            prices: np.ndarray = np.ndarray((price_count,), dtype=np.float64, buffer=block.buf)
+            symbol_stats: list[list[at.SymbolStat]] = [
+                at.DataAnalysis.score_symbol_multi_scale(symbol, prices[start:end], window_percents)
+                for symbol, start, end in zip(symbols, offsets, offsets[1:])
+            ]
+            del prices  # The block cannot be closed while a view of it exists
+        finally:
+            block.close()
+        return symbol_stats
+
+    @staticmethod
+    def score_universe(
+            stock_info: dict[str, list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray],
+            window_percents: list[float],
+            max_workers: int | None = None
+    ) -> list[list["at.SymbolStat"]]:
+        """
+        Scores every symbol with every window_percent across max_workers processes, symbols without bars are skipped
+        :param dict as stock_info: Symbol to its bars (list of dicts or BarFrame) or directly to its prices
+        :param list[float] as window_percents:
+        :param int or None as max_workers: Processes to score with, None for every core
+        :return list[list[SymbolStat]]: One list per window_percent in the same order, each with a SymbolStat per symbol
+        """
+        symbols: list[str] = []
+        prices: list[np.ndarray] = []
+        for symbol, symbol_data in stock_info.items():
+            if len(symbol_data) > 0:
+                symbols.append(symbol)
+                prices.append(se.ScoringEngine.prices_of(symbol_data))
+
+        scored: list[list[at.SymbolStat]] = [[] for _ in window_percents]
+        if len(symbols) == 0:
+            return scored
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        lengths: np.ndarray = np.fromiter((len(row) for row in prices), dtype=np.int64, count=len(prices))
+        offsets: list[int] = [0, *np.cumsum(lengths).tolist()]
+
+        block: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=offsets[-1] * 8)
+        try:
+            shared_prices: np.ndarray = np.ndarray((offsets[-1],), dtype=np.float64, buffer=block.buf)
+            for row_prices, start, end in zip(prices, offsets, offsets[1:]):
+                shared_prices[start:end] = row_prices
+            del shared_prices
+
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        ParallelAnalysis.score_shared_chunk,
+                        block.name,
+                        offsets[-1],
+                        symbols[start:end],
+                        offsets[start:end + 1],
+                        window_percents
+                    )
+                    for start, end in ParallelAnalysis.plan_chunks(lengths, max_workers * ParallelAnalysis.CHUNKS_PER_WORKER)
+                ]
+                for future in futures:
+                    for symbol_stats in future.result():
+                        for index, symbol_stat in enumerate(symbol_stats):
+                            scored[index].append(symbol_stat)
+        finally:
+            block.close()
+            block.unlink()
+
+        return scored
@@ -0,0 +1,284 @@
+import csv
+import itertools
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any
+import market_data as m
+import bar_frame as bf
+import scoring_engine as se
+import backtester as bt
+
+
+class ParameterSweep:
+    """
+    Scores every combination of a grid of analyze_requested_historical_bars parameters across a process pool:
+        rows = ParameterSweep().run({"days_ago": [365, 730, 1825], "timeframe": ["1Day"], "window_percent": [0.01, 0.05]})
+        ParameterSweep.display(rows)
+    Bars are loaded once per timeframe for the largest days_ago, a smaller days_ago scores the bars inside its range of
+    the same data (days_ago is counted back from the newest bar so results do not depend on when the sweep runs).
+    Each timeframe's bars are lined up with Backtester.align and placed in one multiprocessing.shared_memory block
+    that every worker maps, so a grid point costs one vectorized scoring pass, and a backtest when asked for, instead
+    of a download. Each result row holds:
+        "days_ago", "timeframe", "window_percent": the grid point
+        "symbols_scored": symbols with at least one bar in the range
+        "ranking_stability": Spearman correlation between the strengths and the strengths scored the same way
+        stability_offset bars earlier, 1.0 means the ranking did not change
+        "top_k_overlap": fraction of the top_k symbols that were also top_k stability_offset bars earlier
+        "top_symbols": the top_k symbols strongest first separated by spaces
+        "total_return", "max_drawdown": from a Backtester with a fixed lookback that trades from the start of the range,
+        the lookback bars before it are its history. When there are not that many bars before the range, like for the
+        largest days_ago, it trades from lookback bars into the range. None when the range is too short for the
+        lookback and one rebalance or backtest is False
+        "seconds": time the grid point took
+    """
+    COLUMNS: tuple[str, ...] = (
+        "days_ago", "timeframe", "window_percent", "symbols_scored", "ranking_stability", "top_k_overlap",
+        "total_return", "max_drawdown", "seconds", "top_symbols"
+    )
+    RESULTS_PATH: str = ".save_info/sweep_results.csv"
+
+    def __init__(
+            self,
+            top_k: int = 10,
+            stability_offset: int = 5,
+            backtest: bool = True,
+            rebalance_every: int = 21,
+            lookback: int = 252
+    ):
+        """
+        :param int as top_k: Symbols compared for top_k_overlap and held by the backtest
+        :param int as stability_offset: Bars earlier the ranking is compared against for ranking_stability
+        :param bool as backtest: Whether to backtest each grid point
+        :param int as rebalance_every: Bars between the backtest's rebalances
+        :param int as lookback: Bars the backtest scores each symbol on
+        """
+        self.top_k: int = top_k
+        self.stability_offset: int = stability_offset
+        self.backtest: bool = backtest
+        self.rebalance_every: int = rebalance_every
+        self.lookback: int = lookback
+
+    @staticmethod
+    def expand(grid: dict[str, list[Any]]) -> list[dict[str, Any]]:
+        """
+        Returns every combination of the grid's values, parameters left out use analyze_requested_historical_bars's
+        defaults
+        :param dict[str, list[Any]] as grid: "days_ago", "timeframe" and/or "window_percent" to the values to try
+        :return list[dict[str, Any]]:
+        """
+        full_grid: dict[str, list[Any]] = {
+            "days_ago": [1825], "timeframe": ["1Day"], "window_percent": [0.01], **grid
+        }
+        return [dict(zip(full_grid, values)) for values in itertools.product(*full_grid.values())]
+
+    @staticmethod
+    def load(timeframe: str, days_ago: int) -> dict[str, bf.BarFrame]:
+        """
+        Returns the bars of every tradable symbol in MarketData.paper_symbol_tradable through the BarCache so bars
+        that are already cached are not downloaded
+        :param str as timeframe:
+        :param int as days_ago:
+        :return dict[str, BarFrame]:
+        """
+        symbols: list[str] = [
+            symbol for symbol, tradable in (m.MarketData.paper_symbol_tradable or {}).items() if tradable
+        ]
+        return dict(m.MarketData.iter_cached_past_prices(symbols, timeframe, days_ago, as_frames=True))
+
+    @staticmethod
+    def __packed(prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Private helper that moves each row's non NaN prices to the front, zero padded, the layout ScoringEngine takes
+        :param np.ndarray as prices: (symbols x bars) with NaN where a symbol has no bar
+        :return tuple[np.ndarray, np.ndarray]: The packed matrix and the length of each row
+        """
+        priced: np.ndarray = ~np.isnan(prices)
+        order: np.ndarray = np.argsort(~priced, axis=1, kind="stable")
+        return np.take_along_axis(np.where(priced, prices, 0.0), order, axis=1), priced.sum(axis=1)
+
+    @staticmethod
+    def __strengths(prices: np.ndarray, window_percent: float) -> np.ndarray:
+        """
+        Private helper that returns each symbol's strength, NaN for symbols without a bar
+        :param np.ndarray as prices: (symbols x bars) with NaN where a symbol has no bar
+        :param float as window_percent:
+        :return np.ndarray:
+        """
+        matrix, lengths = ParameterSweep.__packed(prices)
+        strengths: np.ndarray = np.full(len(lengths), np.nan, dtype=np.float64)
+        scored: np.ndarray = lengths > 0
+        if scored.any():
+            strengths[scored] = se.ScoringEngine.score_matrix(matrix[scored], lengths[scored], window_percent)[2]
+        return strengths
+
+    @staticmethod
+    def evaluate_point(
+            shared_memory_name: str,
+            shape: tuple[int, int, int],
+            symbols: list[str],
+            timestamps: np.ndarray,
+            point: dict[str, Any],
+            settings: dict[str, Any]
+    ) -> dict[str, Any]:
+        """
+        Runs in a worker process, maps a timeframe's shared bars and returns the result row of one grid point
+        :param str as shared_memory_name: Block made by run holding "o", "c" and "vw" stacked as (3 x symbols x bars)
+        :param tuple[int, int, int] as shape:
+        :param list[str] as symbols:
+        :param np.ndarray as timestamps:
+        :param dict[str, Any] as point: From expand
+        :param dict[str, Any] as settings: top_k, stability_offset, backtest, rebalance_every and lookback
+        :return dict[str, Any]:
+        """
+        started_at: float = time.perf_counter()
+        block: shared_memory.SharedMemory = shared_memory.SharedMemory(name=shared_memory_name)
+        try:
+            stacked: np.ndarray = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+            opens, closes, prices = stacked
+            row: dict[str, Any] = {
+                **point, "symbols_scored": 0, "ranking_stability": None, "top_k_overlap": None,
+                "total_return": None, "max_drawdown": None, "top_symbols": ""
+            }
+            start: int = np.searchsorted(timestamps, timestamps[-1] - point["days_ago"] * 86400, side="left") \
+                if len(timestamps) > 0 else 0
+            top_k: int = settings["top_k"]
+
+            if start < len(timestamps):
+                strengths: np.ndarray = ParameterSweep.__strengths(prices[:, start:], point["window_percent"])
+                scored: np.ndarray = ~np.isnan(strengths)
+                order: np.ndarray = np.flatnonzero(scored)[np.argsort(-strengths[scored], kind="stable")]
+                row["symbols_scored"] = int(scored.sum())
+                row["top_symbols"] = " ".join(symbols[index] for index in order[:top_k])
+
+                end: int = len(timestamps) - settings["stability_offset"]
+                earlier_start: int = max(0, start - settings["stability_offset"])
+                if end > earlier_start:
+                    earlier: np.ndarray = ParameterSweep.__strengths(prices[:, earlier_start:end], point["window_percent"])
+                    both: np.ndarray = scored & ~np.isnan(earlier)
+                    if both.sum() > 1:
+                        ranks: np.ndarray = np.argsort(np.argsort(strengths[both]))
+                        earlier_ranks: np.ndarray = np.argsort(np.argsort(earlier[both]))
+                        row["ranking_stability"] = float(np.corrcoef(ranks, earlier_ranks)[0, 1])
+                    earlier_scored: np.ndarray = ~np.isnan(earlier)
+                    earlier_order: np.ndarray = np.flatnonzero(earlier_scored)[np.argsort(-earlier[earlier_scored], kind="stable")]
+                    if len(order) > 0:
+                        shared: int = len(set(order[:top_k].tolist()) & set(earlier_order[:top_k].tolist()))
+                        row["top_k_overlap"] = shared / min(top_k, len(order))
+
+                lookback: int = settings["lookback"]
+                history_start: int = max(0, start - lookback)
+                if settings["backtest"] and lookback + settings["rebalance_every"] < len(timestamps) - history_start:
+                    result: bt.BacktestResult = bt.Backtester(
+                        top_k=top_k,
+                        lookback=lookback,
+                        rebalance_every=settings["rebalance_every"],
+                        window_percent=point["window_percent"]
+                    ).run_aligned(symbols, timestamps[history_start:], {
+                        "o": opens[:, history_start:], "c": closes[:, history_start:], "vw": prices[:, history_start:]
+                    })
+                    row["total_return"] = result.total_return()
+                    row["max_drawdown"] = result.max_drawdown()
+
+            del stacked, opens, closes, prices  # The block cannot be closed while a view of it exists
+        finally:
+            block.close()
+
+        row["seconds"] = time.perf_counter() - started_at
+        return row
+
+    def run(
+            self,
+            grid: dict[str, list[Any]],
+            stock_info_by_timeframe: dict[str, dict[str, bf.BarFrame | list[dict[str, float | int | str]]]] | None = None,
+            max_workers: int | None = None,
+            results_path: str | None = RESULTS_PATH
+    ) -> list[dict[str, Any]]:
+        """
+        Evaluates every grid point and returns the result rows in grid order, see the class docstring for the columns
+        :param dict[str, list[Any]] as grid: See expand
+        :param dict or None as stock_info_by_timeframe: Timeframe to the bars to sweep over, such as
+        Backtester.synthetic_bars, None loads each timeframe with load
+        :param int or None as max_workers: Processes to evaluate with, None for every core
+        :param str or None as results_path: CSV file the rows are written to, None to not write them
+        :return list[dict[str, Any]]:
+        """
+        points: list[dict[str, Any]] = ParameterSweep.expand(grid)
+        settings: dict[str, Any] = {
+            "top_k": self.top_k,
+            "stability_offset": self.stability_offset,
+            "backtest": self.backtest,
+            "rebalance_every": self.rebalance_every,
+            "lookback": self.lookback
+        }
+
+        blocks: list[shared_memory.SharedMemory] = []
+        try:
+            shared: dict[str, tuple[str, tuple[int, int, int], list[str], np.ndarray]] = {}
+            for timeframe in dict.fromkeys(point["timeframe"] for point in points):
+                stock_info: dict[str, Any] = stock_info_by_timeframe[timeframe] if stock_info_by_timeframe is not None \
+                    else ParameterSweep.load(timeframe, max(point["days_ago"] for point in points))
+                symbols, timestamps, columns = bt.Backtester.align(stock_info)
+                shape: tuple[int, int, int] = (3, len(symbols), len(timestamps))
+
+                block: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=max(1, 8 * int(np.prod(shape))))
+                blocks.append(block)
+                stacked: np.ndarray = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+                for index, column in enumerate(("o", "c", "vw")):
+                    stacked[index] = columns[column]
+                del stacked
+                shared[timeframe] = (block.name, shape, symbols, timestamps)
+
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(ParameterSweep.evaluate_point, *shared[point["timeframe"]], point, settings)
+                    for point in points
+                ]
+                rows: list[dict[str, Any]] = [future.result() for future in futures]
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        if results_path is not None:
+            ParameterSweep.write(rows, results_path)
+        return rows
+
+    @staticmethod
+    def write(rows: list[dict[str, Any]], path: str) -> bool:
+        """
+        Writes the rows to a CSV file, returns False if writing failed
+        :param list[dict[str, Any]] as rows:
+        :param str as path:
+        :return bool:
+        """
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", newline="") as file:
+                writer: csv.DictWriter = csv.DictWriter(file, fieldnames=ParameterSweep.COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+        except OSError:
+            print(f"Failed to write sweep results to {path}")
+            return False
+        return True
+
+    @staticmethod
+    def display(rows: list[dict[str, Any]]) -> None:
+        """
+        Prints the rows as a table without the top symbols
+        :param list[dict[str, Any]] as rows:
+        :return:
+        """
+        columns: tuple[str, ...] = ParameterSweep.COLUMNS[:-1]
+        cells: list[list[str]] = [list(columns)] + [
+            ["-" if row[column] is None else f"{row[column]:.4f}" if isinstance(row[column], float) else str(row[column])
+             for column in columns]
+            for row in rows
+        ]
+        widths: list[int] = [max(len(line[index]) for line in cells) for index in range(len(columns))]
+        for line in cells:
+            print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
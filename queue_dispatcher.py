@@ -0,0 +1,418 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, TextIO
+import pytz
+import globals as g
+import order as o
+
+
+class QueueProgress:
+    """
+    How far along sending one queue is, kept by QueueDispatcher for every queue it was given
+    """
+    SEPERATOR: str = ("\n##### ##### ##### ##### ##### ##### ##### #####\n"
+                      "\n##### ##### ##### ##### ##### ##### ##### #####")
+
+    def __init__(
+            self,
+            name: str,
+            orders: deque["o.OrderRecord"],
+            log_file: TextIO | None,
+            priority: int,
+            deadline: float | None,
+            replaced_by: dict[int, int | None] | None = None
+    ):
+        """
+        :param str as name:
+        :param deque[OrderRecord] as orders: Orders left to send, taken from the left
+        :param TextIO or None as log_file: Log the results are written to, None to not log
+        :param int as priority: Lower is sent first
+        :param float or None as deadline: time.time() every order should be submitted by, None for no deadline
+        :param dict[int, int | None] or None as replaced_by: Original order id to the id of the order sent in its
+        place if the queue was netted, see QueueUtility.net_orders
+        """
+        self.name: str = name
+        self.replaced_by: dict[int, int | None] = {} if replaced_by is None else replaced_by
+        self.replaced: dict[int, list[int]] = {}  # Id of each order sent to the ids of the originals it stands for
+        for original_id, replacement_id in self.replaced_by.items():
+            if replacement_id is not None and replacement_id != original_id:
+                self.replaced.setdefault(replacement_id, []).append(original_id)
+        self.priority: int = priority
+        self.deadline: float | None = deadline
+        self.at_risk: bool = False  # Set once the queue is not expected to finish before its deadline
+        self.pending: deque[o.OrderRecord] = orders
+        self.total: int = len(orders)
+        self.sent: int = 0
+        self.failed: int = 0
+        self.in_flight: int = 0
+        self.started_at: float = time.monotonic()
+        self.finished_at: float | None = None
+        self.log_file: TextIO | None = log_file
+
+    @property
+    def done(self) -> bool:
+        """
+        True once every order was sent or failed
+        :return bool:
+        """
+        return len(self.pending) == 0 and self.in_flight == 0
+
+    def elapsed(self) -> float:
+        """
+        Seconds since the queue started sending up to when it finished or now
+        :return float:
+        """
+        return (time.monotonic() if self.finished_at is None else self.finished_at) - self.started_at
+
+    def log(self, message: str) -> None:
+        """
+        Writes the message to the log file if there is one, must be called while the dispatcher's lock is held so
+        workers do not write over each other
+        :param str as message:
+        :return:
+        """
+        if self.log_file is not None:
+            print(message, file=self.log_file)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.sent + self.failed}/{self.total} done ({self.sent} sent, {self.failed} failed, "
+            f"{self.in_flight} in flight) after {self.elapsed():.2f} seconds, priority {self.priority}"
+            f"{'' if self.deadline is None else f', deadline in {self.deadline - time.time():.0f} seconds'}"
+            f"{', at risk of missing its deadline' if self.at_risk else ''}"
+            f"{'' if self.finished_at is None else ', finished'}"
+        )
+
+
+class QueueDispatcher:
+    """
+    Sends queues of orders with a bounded pool of worker threads so sending is limited by the shared
+    alpaca_rate_limit instead of waiting on one order at a time. Any number of queues can be sending at once, each
+    with a priority (lower is sent first) and an optional deadline. With the POLICY_PRIORITY policy the queue with the
+    lowest priority goes next and the earliest deadline breaks ties, with POLICY_DEADLINE the earliest deadline goes
+    next (queues without one go last) and priority breaks ties. Queues that tie take turns in round robin so a big
+    queue does not hold back a small one that started after it.
+    At most max_in_flight orders are submitted and waiting on the API at once. A worker waits for a free slot and a
+    token from alpaca_rate_limit (at order priority) before it picks which order to send, so when tokens are scarce
+    an urgent queue given after a bulk one is sent with the very next token instead of after orders already picked.
+    A slot is only reserved while more orders are left than slots already reserved for them, so near the end of the
+    queues no worker takes a token for an order that another worker is about to send.
+    Every time an order is picked the orders left are spread over the expected send rate in schedule order, a queue
+    that is not expected to be done before its deadline is flagged as at risk and a warning is printed once.
+    Workers are started when a queue is given and leave once nothing is left to send. Each queue is logged to
+    queue_logs like before and orders that fail are added to OrderUtility.failed_orders under the queue's name.
+    """
+    LOG_DIRECTORY: str = "queue_logs"
+    PRIORITY_URGENT: int = 0  # Exits and anything else that has to go out first
+    PRIORITY_NORMAL: int = 1
+    PRIORITY_BULK: int = 2  # Rebalances and other large baskets
+    POLICY_PRIORITY: str = "priority"
+    POLICY_DEADLINE: str = "deadline"
+
+    def __init__(
+            self,
+            max_workers: int = 8,
+            max_in_flight: int = 8,
+            submit: Callable[["o.OrderRecord"], Any] | None = None,
+            log: bool = True,
+            policy: str = POLICY_PRIORITY
+    ):
+        """
+        :param int as max_workers: Most worker threads sending at once
+        :param int as max_in_flight: Most orders submitted and not answered yet, can be lowered while sending
+        :param Callable or None as submit: Sends one order and returns the API's response, None for
+        trading_client.submit_order
+        :param bool as log: Write a log file per queue under LOG_DIRECTORY
+        :param str as policy: POLICY_PRIORITY or POLICY_DEADLINE
+        """
+        if policy not in (QueueDispatcher.POLICY_PRIORITY, QueueDispatcher.POLICY_DEADLINE):
+            raise ValueError(f"Unknown queue scheduling policy {policy}")
+        self.max_workers: int = max_workers
+        self.max_in_flight: int = max_in_flight
+        self.submit: Callable[[o.OrderRecord], Any] = (
+            (lambda order: g.trading_client.submit_order(order.market_order)) if submit is None else submit
+        )
+        self.log: bool = log
+        self.policy: str = policy
+        self.submit_seconds: float | None = None  # Moving average of how long a submit takes
+
+        self.progress: dict[str, QueueProgress] = {}  # Every queue given to the dispatcher by name, latest run only
+        self._active: list[tuple[float, float, int, QueueProgress]] = []  # Heap of queues with orders left to take
+        self._turns: itertools.count = itertools.count()  # Round robin between queues with the same schedule
+        self._in_flight: int = 0
+        self._reserved: int = 0  # Slots reserved by workers waiting on a token that have not taken their order yet
+        self._workers: int = 0
+        self._condition: threading.Condition = threading.Condition()
+
+    def is_sending(self, queue_name: str | None = None) -> bool:
+        """
+        Returns whether the queue is still being sent, if queue_name is None whether any queue is
+        :param str or None as queue_name:
+        :return bool:
+        """
+        with self._condition:
+            if queue_name is None:
+                return any(not progress.done for progress in self.progress.values())
+            return queue_name in self.progress and not self.progress[queue_name].done
+
+    def send(
+            self,
+            queue_name: str,
+            orders: deque["o.OrderRecord"],
+            priority: int = PRIORITY_NORMAL,
+            deadline: float | None = None,
+            replaced_by: dict[int, int | None] | None = None
+    ) -> bool:
+        """
+        Starts sending the orders in the background and returns right away, returns False without sending if a
+        queue with the same name is still being sent
+        :param str as queue_name:
+        :param deque[OrderRecord] as orders:
+        :param int as priority: Lower is sent first
+        :param float or None as deadline: time.time() every order should be submitted by, None for no deadline
+        :param dict[int, int | None] or None as replaced_by: Original order id to the id of the order sent in its
+        place if the orders were netted, logged so results and failures can be traced back to the originals
+        :return bool:
+        """
+        with self._condition:
+            if queue_name in self.progress and not self.progress[queue_name].done:
+                return False
+
+            # Only opened once the name is known to be free, opening truncates the log of a queue with the same name.
+            # A queue netted down to nothing still gets a log so which originals cancelled out is kept
+            log_file: TextIO | None = (
+                self.__open_log(queue_name) if self.log and (len(orders) > 0 or bool(replaced_by)) else None
+            )
+            progress: QueueProgress = QueueProgress(queue_name, orders, log_file, priority, deadline, replaced_by)
+            self.progress[queue_name] = progress
+            progress.log("_____ _____ _____ _____ Start of log file _____ _____ _____ _____\n")
+            for original_id, replacement_id in progress.replaced_by.items():
+                if replacement_id is None:
+                    o.OrderUtility.orders.update(original_id, status=o.ost.OrderStore.STATUS_NETTED)
+                    progress.log(f"Order {original_id} cancelled out when netting and is not sent")
+                elif replacement_id != original_id:
+                    progress.log(f"Order {original_id} is sent as part of order {replacement_id}")
+            if progress.done:
+                progress.finished_at = progress.started_at
+                QueueDispatcher.__close_log(progress)
+                return True
+            self.__schedule(progress)
+            self.__check_deadlines()
+
+            for _ in range(min(self.max_workers - self._workers, progress.total)):
+                self._workers += 1
+                threading.Thread(target=self.__worker, daemon=True).start()
+            self._condition.notify_all()
+        return True
+
+    def wait(self, queue_name: str | None = None, timeout: float | None = None) -> bool:
+        """
+        Blocks until the queue (or every queue if queue_name is None) is done sending, returns False on timeout
+        :param str or None as queue_name:
+        :param float or None as timeout: Seconds, None to wait for as long as it takes
+        :return bool:
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self.is_sending(queue_name), timeout)
+
+    def display_progress(self) -> None:
+        """
+        Prints the progress of every queue given to the dispatcher
+        :return:
+        """
+        with self._condition:
+            if len(self.progress) == 0:
+                print("No queue has been sent")
+            for progress in self.progress.values():
+                print(progress)
+
+    def __open_log(self, queue_name: str) -> TextIO | None:
+        """
+        Private helper that opens the log file of the queue, returns None if it could not be made
+        :param str as queue_name:
+        :return TextIO | None:
+        """
+        try:
+            os.makedirs(QueueDispatcher.LOG_DIRECTORY, exist_ok=True)
+            return open(
+                f"{QueueDispatcher.LOG_DIRECTORY}/{queue_name} at {datetime.now(pytz.timezone('EST')).date()}", "w"
+            )
+        except OSError:
+            print(f"Problem creating the log file of the queue {queue_name}, it is sent without a log")
+            return None
+
+    def __schedule(self, progress: QueueProgress) -> None:
+        """
+        Private helper that puts the queue in line for its next turn behind every queue with the same schedule, must
+        be called while the lock is held
+        :param QueueProgress as progress:
+        :return:
+        """
+        deadline: float = float("inf") if progress.deadline is None else progress.deadline
+        if self.policy == QueueDispatcher.POLICY_DEADLINE:
+            heapq.heappush(self._active, (deadline, progress.priority, next(self._turns), progress))
+        else:
+            heapq.heappush(self._active, (progress.priority, deadline, next(self._turns), progress))
+
+    def __check_deadlines(self) -> None:
+        """
+        Private helper that flags the queues not expected to be done before their deadline, must be called while the
+        lock is held. Orders are expected to go out at the rate limit, or slower if max_in_flight submits at a time
+        cannot keep up with it, in the order they are scheduled
+        :return:
+        """
+        send_rate: float = g.alpaca_rate_limit.rate
+        if self.submit_seconds is not None and self.submit_seconds > 0:
+            send_rate = min(send_rate, self.max_in_flight / self.submit_seconds)
+
+        now: float = time.time()
+        orders_ahead: int = 0
+        for *_, progress in sorted(self._active, key=lambda scheduled: scheduled[:3]):
+            orders_ahead += len(progress.pending)
+            if progress.deadline is None or progress.at_risk or now + orders_ahead / send_rate <= progress.deadline:
+                continue
+            progress.at_risk = True
+            warning: str = (
+                f"Queue {progress.name} is at risk of missing its deadline, {len(progress.pending)} orders are left "
+                f"and about {orders_ahead / send_rate:.1f} seconds of sending are needed with "
+                f"{max(0.0, progress.deadline - now):.1f} seconds left"
+            )
+            print(warning)
+            progress.log(warning + QueueProgress.SEPERATOR)
+
+    def __reserve(self) -> bool:
+        """
+        Private helper that waits for an in flight slot and takes it, must be called while the lock is held, returns
+        False when there is nothing left to send. A slot is only taken while there is an order left for it that no
+        other reserved slot will take
+        :return bool:
+        """
+        while True:
+            if len(self._active) == 0:
+                return False
+            if self._in_flight < self.max_in_flight and self.__pending() > self._reserved:
+                self._in_flight += 1
+                self._reserved += 1
+                return True
+            self._condition.wait()
+
+    def __pending(self) -> int:
+        """
+        Private helper that returns how many orders are left to take, must be called while the lock is held
+        :return int:
+        """
+        return sum(len(progress.pending) for *_, progress in self._active)
+
+    def __take(self) -> tuple[QueueProgress, "o.OrderRecord"] | None:
+        """
+        Private helper that takes the next order of the queue first in line for a reserved slot, must be called while
+        the lock is held, returns None and gives the slot back when there is nothing left to send
+        :return tuple[QueueProgress, OrderRecord] | None:
+        """
+        self._reserved -= 1
+        if len(self._active) == 0:
+            self._in_flight -= 1
+            self._condition.notify_all()
+            return None
+
+        progress: QueueProgress = heapq.heappop(self._active)[-1]
+        order: o.OrderRecord = progress.pending.popleft()
+        if len(progress.pending) > 0:
+            self.__schedule(progress)  # Behind every other queue with the same schedule so each gets a turn
+        elif len(self._active) == 0:
+            self._condition.notify_all()  # Workers waiting for an order can leave
+        progress.in_flight += 1
+        self.__check_deadlines()
+        return progress, order
+
+    def __finish(
+            self,
+            progress: QueueProgress,
+            order: "o.OrderRecord",
+            response: Any,
+            error: Exception | None,
+            seconds: float
+    ) -> None:
+        """
+        Private helper that records the result of one order, must be called while the lock is held
+        :param QueueProgress as progress:
+        :param OrderRecord as order:
+        :param Any as response:
+        :param Exception or None as error:
+        :param float as seconds: How long the submit took
+        :return:
+        """
+        progress.in_flight -= 1
+        self._in_flight -= 1
+        self.submit_seconds = seconds if self.submit_seconds is None else 0.9 * self.submit_seconds + 0.1 * seconds
+        # The originals a netted order stands for share its result
+        for order_id in [order.id] + progress.replaced.get(order.id, []):
+            o.OrderUtility.orders.update(
+                order_id, status=o.ost.OrderStore.STATUS_SENT if error is None else o.ost.OrderStore.STATUS_FAILED
+            )
+        milliseconds: float = progress.elapsed() * 1000
+        if error is None:
+            progress.sent += 1
+            progress.log(f"{response}\nTimestamp: {milliseconds:.0f} milliseconds from start time{QueueProgress.SEPERATOR}")
+        else:
+            progress.failed += 1
+            order.exception = error
+            o.OrderUtility.failed_orders.setdefault(progress.name, deque()).append(order)
+            replaced: str = ""
+            if order.id in progress.replaced:
+                replaced = f" which replaced orders {', '.join(str(original_id) for original_id in progress.replaced[order.id])}"
+            progress.log(f"Failed to send {order.id}{replaced} due to {error}{QueueProgress.SEPERATOR}")
+
+        if progress.done:
+            progress.finished_at = time.monotonic()
+            QueueDispatcher.__close_log(progress)
+        self._condition.notify_all()
+
+    @staticmethod
+    def __close_log(progress: QueueProgress) -> None:
+        """
+        Private helper that ends the queue's log file and closes it, must be called while the lock is held
+        :param QueueProgress as progress:
+        :return:
+        """
+        progress.log("\n_____ _____ _____ _____ |End| of log file _____ _____ _____ _____")
+        if progress.log_file is not None:
+            progress.log_file.close()
+            progress.log_file = None
+
+    def __worker(self) -> None:
+        """
+        Private helper run by each worker thread, sends orders until none are left
+        :return:
+        """
+        #  Rate limit information: https://alpaca.markets/support/usage-limit-api-calls
+        while True:
+            with self._condition:
+                if not self.__reserve():
+                    self._workers -= 1
+                    return
+
+            # The order is only picked once a token is held so it is the most urgent one at the moment it can be sent
+            g.alpaca_rate_limit.acquire(priority=g.RateLimiter.PRIORITY_ORDER)
+            with self._condition:
+                taken: tuple[QueueProgress, o.OrderRecord] | None = self.__take()
+                if taken is None:
+                    self._workers -= 1
+                    return
+            progress, order = taken
+
+            response: Any = None
+            error: Exception | None = None
+            submit_started_at: float = time.monotonic()
+            try:
+                response = self.submit(order)
+            except Exception as e:  # I could not find the documentation for what exceptions this throws
+                error = e
+
+            with self._condition:
+                self.__finish(progress, order, response, error, time.monotonic() - submit_started_at)
@@ -0,0 +1,77 @@
+import datetime
+import heapq
+import math
+import utilities as u
+
+
+class RequestPlanner:
+    """
+    Static class that plans how symbols are packed into historical bar requests. The bars endpoint accepts a comma
+    separated list of symbols and fills each page with up to limit bars across all of them, so asking for many symbols
+    that each have a few bars in one request costs a single page instead of one rate limited request per symbol.
+    Symbols are packed by how many bars they are expected to have so each request is close to one full page.
+    """
+    PAGE_LIMIT: int = 10000  # Most bars the API returns in one page
+    MAX_SYMBOLS_PER_REQUEST: int = 100  # Keeps the symbols query string well under URL length limits
+    SESSION_SECONDS: int = 23400  # Regular trading session is 6.5 hours
+    TRADING_DAYS_PER_YEAR: int = 252
+
+    @staticmethod
+    def expected_bar_count(timeframe: str, start: str, end: str | None = None) -> int:
+        """
+        Estimates how many bars a single symbol has between start and end (or now if end is None) assuming it traded
+        every regular session, used to pack symbols into requests, returns PAGE_LIMIT if the timeframe is not
+        understood so the symbol gets a request of its own
+        :param str as timeframe:
+        :param str as start: YYYY-MM-DD or RFC-3339 timestamp
+        :param str or None as end: YYYY-MM-DD or RFC-3339 timestamp
+        :return int:
+        """
+        timeframe_seconds: int | None = u.timeframe_to_seconds(timeframe)
+        if timeframe_seconds is None:
+            return RequestPlanner.PAGE_LIMIT
+
+        start_date: datetime.date = datetime.date.fromisoformat(start[:10])
+        end_date: datetime.date = datetime.date.today() if end is None else datetime.date.fromisoformat(end[:10])
+        trading_days: float = max(1, (end_date - start_date).days + 1) * RequestPlanner.TRADING_DAYS_PER_YEAR / 365
+
+        if timeframe_seconds < 86400:
+            return math.ceil(trading_days * math.ceil(RequestPlanner.SESSION_SECONDS / timeframe_seconds))
+        # A week of calendar days only has five trading days, a daily bar covers one trading day
+        return math.ceil(trading_days / max(1.0, timeframe_seconds / 86400 * 5 / 7))
+
+    @staticmethod
+    def plan_batches(
+            expected_counts: dict[str, int],
+            limit: int = PAGE_LIMIT,
+            max_symbols: int = MAX_SYMBOLS_PER_REQUEST
+    ) -> list[list[str]]:
+        """
+        Packs symbols into batches that are each sent as one request, largest symbols are placed first into the batch
+        with the most room left (worst fit decreasing) so batches end up close to limit bars each. Symbols expected to
+        fill a page or more get a batch of their own since they need several pages anyway.
+        :param dict[str, int] as expected_counts: Symbol as the key and the number of bars it is expected to have
+        :param int as limit: Bars per page
+        :param int as max_symbols: Most symbols one batch can hold
+        :return list[list[str]]: Each inner list is the symbols of one request
+        """
+        batches: list[list[str]] = []
+        open_batches: list[tuple[int, int]] = []  # (-room left, index into batches) so the roomiest batch pops first
+
+        for symbol in sorted(expected_counts, key=expected_counts.get, reverse=True):
+            count: int = max(1, expected_counts[symbol])
+            if count >= limit:
+                batches.append([symbol])
+                continue
+
+            if len(open_batches) > 0 and -open_batches[0][0] >= count:
+                negative_room, index = heapq.heappop(open_batches)
+            else:
+                negative_room, index = -limit, len(batches)
+                batches.append([])
+
+            batches[index].append(symbol)
+            if len(batches[index]) < max_symbols and negative_room + count < 0:
+                heapq.heappush(open_batches, (negative_room + count, index))
+
+        return batches
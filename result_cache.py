@@ -0,0 +1,159 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any
+import algorithm_trading as at
+import bar_frame as bf
+
+
+class ResultCache:
+    """
+    Static class that remembers the SymbolStat analysis gave for a symbol's bars so analyzing the same bars with the
+    same parameters again costs a dict lookup instead of scoring them. Keys look like
+        (symbol, timeframe, timestamp of the last bar, its close, its vw, number of bars, window_percent)
+    so a new bar, a different range or different parameters all miss. The newest bar's close and vw are in the key
+    since BarCache downloads that bar again while it is still forming and replaces it under the same timestamp.
+    Values are the (stability_strength, time_strength, strength) of the SymbolStat.
+    Entries are kept in least recently used order, past MAX_ENTRIES the least recently used are dropped. The cache is
+    loaded from CACHE_PATH the first time it is used and saved there with save(), results are derived from public
+    market data so they are not encrypted.
+    """
+    CACHE_PATH: str = ".save_info/analysis_cache.pkl"
+    MAX_ENTRIES: int = 50000
+
+    entries: OrderedDict[tuple[Any, ...], tuple[float, float, float]] | None = None  # None until loaded
+    hits: int = 0
+    misses: int = 0
+    _changed: bool = False  # Whether there is anything save() has not written yet
+    _lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def key(
+            symbol: str,
+            timeframe: str,
+            symbol_data: list[dict[str, float | int | str]] | bf.BarFrame,
+            window_percent: float
+    ) -> tuple[str, str, str, float, float, int, float]:
+        """
+        Returns the key the symbol's analysis with window_percent is cached under, symbol_data must contain at least
+        one bar
+        :param str as symbol:
+        :param str as timeframe:
+        :param list[dict[str, float | int | str]] or BarFrame as symbol_data:
+        :param float as window_percent:
+        :return tuple[str, str, str, float, float, int, float]:
+        """
+        if isinstance(symbol_data, bf.BarFrame):
+            # Formatted the way the API sends "t" so lists and BarFrames of the same bars share entries
+            last_timestamp: str = bf.BarFrame.format_timestamps(symbol_data.t[-1:])[0]
+            close: float = float(symbol_data.c[-1])
+            volume_weighted: float = float(symbol_data.vw[-1])
+        else:
+            last_timestamp = symbol_data[-1]["t"]
+            close = float(symbol_data[-1]["c"])
+            volume_weighted = float(symbol_data[-1]["vw"])
+        return symbol, timeframe, last_timestamp, close, volume_weighted, len(symbol_data), window_percent
+
+    @staticmethod
+    def __load() -> None:
+        """
+        Private helper that loads the saved entries the first time the cache is used, must be called while the lock
+        is held
+        :return:
+        """
+        if ResultCache.entries is not None:
+            return
+        try:
+            with open(ResultCache.CACHE_PATH, "rb") as file:
+                ResultCache.entries = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            ResultCache.entries = OrderedDict()
+
+    @staticmethod
+    def get(key: tuple[Any, ...]) -> "at.SymbolStat | None":
+        """
+        Returns a new SymbolStat holding the cached result for the key, None if nothing is cached for it
+        :param tuple as key: From ResultCache.key
+        :return SymbolStat | None:
+        """
+        with ResultCache._lock:
+            ResultCache.__load()
+            result: tuple[float, float, float] | None = ResultCache.entries.get(key)
+            if result is None:
+                ResultCache.misses += 1
+                return None
+            ResultCache.entries.move_to_end(key)
+            ResultCache.hits += 1
+
+        symbol_stat: at.SymbolStat = at.SymbolStat(key[0], key[-1])
+        symbol_stat.stability_strength, symbol_stat.time_strength, symbol_stat.strength = result
+        return symbol_stat
+
+    @staticmethod
+    def put(key: tuple[Any, ...], symbol_stat: "at.SymbolStat") -> None:
+        """
+        Caches the SymbolStat's result under the key, dropping the least recently used entries past MAX_ENTRIES
+        :param tuple as key: From ResultCache.key
+        :param SymbolStat as symbol_stat:
+        :return:
+        """
+        with ResultCache._lock:
+            ResultCache.__load()
+            ResultCache.entries[key] = (symbol_stat.stability_strength, symbol_stat.time_strength, symbol_stat.strength)
+            ResultCache.entries.move_to_end(key)
+            while len(ResultCache.entries) > ResultCache.MAX_ENTRIES:
+                ResultCache.entries.popitem(last=False)
+            ResultCache._changed = True
+
+    @staticmethod
+    def save() -> bool:
+        """
+        Saves the entries to CACHE_PATH if anything changed since the last save, returns False if saving failed
+        :return bool:
+        """
+        with ResultCache._lock:
+            if not ResultCache._changed:
+                return True
+            try:
+                os.makedirs(os.path.dirname(ResultCache.CACHE_PATH), exist_ok=True)
+                with open(ResultCache.CACHE_PATH + ".tmp", "wb") as file:
+                    pickle.dump(ResultCache.entries, file)
+                os.replace(ResultCache.CACHE_PATH + ".tmp", ResultCache.CACHE_PATH)  # Keeps the old file if writing fails
+            except OSError:
+                print(f"Failed to save analysis cache to {ResultCache.CACHE_PATH}")
+                return False
+            ResultCache._changed = False
+            return True
+
+    @staticmethod
+    def clear(remove_file: bool = False) -> None:
+        """
+        Forgets every cached result and resets the counters, if remove_file is True the saved results are deleted
+        from the computer as well
+        :param bool as remove_file:
+        :return:
+        """
+        with ResultCache._lock:
+            ResultCache.entries = OrderedDict()
+            ResultCache.hits = ResultCache.misses = 0
+            ResultCache._changed = False
+
+        if remove_file:
+            try:
+                os.remove(ResultCache.CACHE_PATH)
+            except OSError:
+                pass
+
+    @staticmethod
+    def display_stats() -> None:
+        """
+        Prints how many lookups were hits and misses along with how many results are cached
+        :return:
+        """
+        with ResultCache._lock:
+            print(
+                f"Analysis cache hits:    {ResultCache.hits}\n"
+                f"Analysis cache misses:  {ResultCache.misses}\n"
+                f"Results cached:         {0 if ResultCache.entries is None else len(ResultCache.entries)}"
+            )
@@ -0,0 +1,166 @@
+import numpy as np
+import algorithm_trading as at
+import bar_frame as bf
+
+
+class ScoringEngine:
+    """
+    Static class that scores every symbol at once with NumPy, giving the same stability_strength, time_strength and
+    strength as DataAnalysis.score_symbol (check analyze_requested_historical_bars for how they are calculated).
+    Prices are laid out as a (symbols x bars) matrix where each row starts at column 0 and is padded with zeros past
+    its own length so symbols with different amounts of bars can be scored together. Every time_strength window of
+    every symbol is solved at once from cumulative sums of y and x * y along each row instead of one regression per
+    window.
+    """
+
+    @staticmethod
+    def prices_of(symbol_data: list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray) -> np.ndarray:
+        """
+        Returns the "vw" (volume weighted average price) of each bar as a float64 array, an array is assumed to
+        already be the prices and is returned as is
+        :param list[dict[str, float | int | str]] or BarFrame or np.ndarray as symbol_data:
+        :return np.ndarray:
+        """
+        if isinstance(symbol_data, np.ndarray):
+            return symbol_data
+        if isinstance(symbol_data, bf.BarFrame):
+            return symbol_data.vw
+        return np.fromiter((symbol_info["vw"] for symbol_info in symbol_data), dtype=np.float64, count=len(symbol_data))
+
+    @staticmethod
+    def price_matrix(prices: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Stacks each symbol's prices into a zero padded (symbols x longest) matrix
+        :param list[np.ndarray] as prices: One array of prices per symbol
+        :return tuple[np.ndarray, np.ndarray]: The matrix and the length of each row as int64
+        """
+        lengths: np.ndarray = np.fromiter((len(row) for row in prices), dtype=np.int64, count=len(prices))
+        matrix: np.ndarray = np.zeros((len(prices), int(lengths.max(initial=0))), dtype=np.float64)
+        for row, row_prices in enumerate(prices):
+            matrix[row, :len(row_prices)] = row_prices
+        return matrix, lengths
+
+    @staticmethod
+    def __regression(
+            sum_of_y: np.ndarray,
+            sum_of_xy: np.ndarray,
+            n: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Private helper that solves least squares lines for x = 0, 1, ..., n - 1 given the sums of y and x * y, a
+        single point gets a flat line like DataAnalysis does
+        :param np.ndarray as sum_of_y:
+        :param np.ndarray as sum_of_xy:
+        :param np.ndarray as n: Number of points of each line as float64
+        :return tuple[np.ndarray, np.ndarray]: slope, y-intercept
+        """
+        sum_of_x: np.ndarray = n * (n - 1.0) / 2.0
+        sum_of_xx: np.ndarray = (n - 1.0) * n * (2.0 * n - 1.0) / 6.0
+        denominator: np.ndarray = n * sum_of_xx - sum_of_x * sum_of_x
+        flat: np.ndarray = denominator == 0.0
+        slope: np.ndarray = np.where(
+            flat, 0.0, (n * sum_of_xy - sum_of_x * sum_of_y) / np.where(flat, 1.0, denominator)
+        )
+        return slope, (sum_of_y - slope * sum_of_x) / n
+
+    @staticmethod
+    def score_matrix(
+            matrix: np.ndarray,
+            lengths: np.ndarray,
+            window_percent: float = 0.01
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Scores every row of a price matrix built by price_matrix, every length must be at least 1
+        :param np.ndarray as matrix: (symbols x bars) prices, zero past each row's length
+        :param np.ndarray as lengths: Number of prices in each row
+        :param float as window_percent: Approximate percent of the data that will represent each window that will be analyzed for time_strength
+        :return tuple[np.ndarray, np.ndarray, np.ndarray]: stability_strength, time_strength and strength of each row
+        """
+        symbol_count, bar_count = matrix.shape
+        n: np.ndarray = lengths.astype(np.float64)
+        x: np.ndarray = np.arange(bar_count, dtype=np.float64)
+        in_row: np.ndarray = x[None, :] < n[:, None]
+
+        # Zero padding adds nothing to either sum so whole rows can be summed
+        slope, y_intercept = ScoringEngine.__regression(matrix.sum(axis=1), matrix @ x, n)
+
+        expected_values: np.ndarray = slope[:, None] * x[None, :] + y_intercept[:, None]
+        counted: np.ndarray = in_row & (expected_values != 0.0)
+        off_by: np.ndarray = np.abs(matrix - expected_values) / np.abs(np.where(counted, expected_values, 1.0))
+        stability_strength: np.ndarray = -np.where(counted, off_by, 0.0).sum(axis=1) / n
+
+        cumulative_y: np.ndarray = np.zeros((symbol_count, bar_count + 1), dtype=np.float64)
+        cumulative_xy: np.ndarray = np.zeros((symbol_count, bar_count + 1), dtype=np.float64)
+        np.cumsum(matrix, axis=1, out=cumulative_y[:, 1:])
+        np.cumsum(matrix * x[None, :], axis=1, out=cumulative_xy[:, 1:])
+        time_strength: np.ndarray = ScoringEngine.time_strength_of(cumulative_y, cumulative_xy, lengths, window_percent)
+
+        return stability_strength, time_strength, time_strength - stability_strength
+
+    @staticmethod
+    def time_strength_of(
+            cumulative_y: np.ndarray,
+            cumulative_xy: np.ndarray,
+            lengths: np.ndarray,
+            window_percent: float = 0.01
+    ) -> np.ndarray:
+        """
+        Calculates time_strength of every row from the cumulative sums of its y and x * y, solving every window of
+        every row at once
+        :param np.ndarray as cumulative_y: (symbols x bars + 1) with column 0 all zeros
+        :param np.ndarray as cumulative_xy: (symbols x bars + 1) with column 0 all zeros
+        :param np.ndarray as lengths: Number of prices in each row as int64, each at least 1
+        :param float as window_percent: Approximate percent of the data that will represent each window that will be analyzed for time_strength
+        :return np.ndarray: time_strength of each row
+        """
+        # Windows are laid out flat, window k of a row ends k window sizes before the row's end, the oldest is shorter
+        window_sizes: np.ndarray = np.maximum(1, (lengths * window_percent).astype(np.int64))
+        window_counts: np.ndarray = -(-lengths // window_sizes)
+        rows: np.ndarray = np.repeat(np.arange(len(lengths)), window_counts)
+        window_numbers: np.ndarray = np.arange(len(rows)) - np.repeat(np.cumsum(window_counts) - window_counts, window_counts)
+        end_indexes: np.ndarray = lengths[rows] - window_numbers * window_sizes[rows]
+        start_indexes: np.ndarray = np.maximum(0, end_indexes - window_sizes[rows])
+
+        window_y: np.ndarray = cumulative_y[rows, end_indexes] - cumulative_y[rows, start_indexes]
+        # x restarts at 0 in every window so the window's start is taken back out of x * y
+        window_xy: np.ndarray = cumulative_xy[rows, end_indexes] - cumulative_xy[rows, start_indexes] - start_indexes * window_y
+        window_n: np.ndarray = (end_indexes - start_indexes).astype(np.float64)
+        window_slope, window_intercept = ScoringEngine.__regression(window_y, window_xy, window_n)
+
+        multipliers: np.ndarray = np.maximum(1, 16 >> np.minimum(window_numbers, 5))
+        window_strength: np.ndarray = multipliers * ((window_slope * (window_n - 1.0) + window_intercept) / window_intercept - 1)
+        return np.bincount(rows, weights=window_strength, minlength=len(lengths)) / window_counts
+
+    @staticmethod
+    def score_universe(
+            stock_info: dict[str, list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray],
+            window_percent: float = 0.01
+    ) -> list["at.SymbolStat"]:
+        """
+        Scores every symbol at once and returns a SymbolStat for each, symbols without bars are skipped
+        :param dict as stock_info: Symbol to its bars (list of dicts or BarFrame) or directly to its prices
+        :param float as window_percent: Approximate percent of the data that will represent each window that will be analyzed for time_strength
+        :return list[SymbolStat]:
+        """
+        symbols: list[str] = []
+        prices: list[np.ndarray] = []
+        for symbol, symbol_data in stock_info.items():
+            if len(symbol_data) > 0:
+                symbols.append(symbol)
+                prices.append(ScoringEngine.prices_of(symbol_data))
+
+        if len(symbols) == 0:
+            return []
+
+        stability_strength, time_strength, strength = ScoringEngine.score_matrix(
+            *ScoringEngine.price_matrix(prices), window_percent
+        )
+
+        symbol_stats: list[at.SymbolStat] = []
+        for index, symbol in enumerate(symbols):
+            symbol_stat: at.SymbolStat = at.SymbolStat(symbol)
+            symbol_stat.stability_strength = float(stability_strength[index])
+            symbol_stat.time_strength = float(time_strength[index])
+            symbol_stat.strength = float(strength[index])
+            symbol_stats.append(symbol_stat)
+        return symbol_stats
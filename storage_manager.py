@@ -104,7 +104,7 @@ class FileManager:
     that is supposed to be stored in that part of the dict that will be saved to the computer.
     """
     FILE_PATH_TO_KEYS: dict[str, tuple[str]] = {
-        ".save_info/orders_queues.pkl": ("queues", "orders", "failed"),
+        ".save_info/orders_queues.pkl": ("queues", "orders", "failed", "schedules"),
         ".save_info/api_keys.pkl": ("API_KEY", "SECRET"),
         ".save_info/paper_info.pkl": ("paper_data", "paper_symbols"),
         ".save_info/security_info.pkl": (
@@ -113,7 +113,8 @@ class FileManager:
     }
     KEY_TO_SETTER: dict[str, Callable[[Any], None]] = {
         "queues": lambda new_val: setattr(q.QueueUtility, "all_queues", new_val),
-        "orders": lambda new_val: setattr(o.OrderUtility, "all_orders", new_val),
+        "schedules": lambda new_val: setattr(q.QueueUtility, "schedules", new_val),
+        "orders": lambda new_val: o.OrderUtility.set_orders(new_val),
         "failed": lambda new_val: setattr(o.OrderUtility, "failed_orders", new_val),
         "API_KEY": lambda new_val: setattr(g, "API_KEY", new_val),
         "SECRET": lambda new_val: setattr(g, "SECRET", new_val),
@@ -129,7 +130,8 @@ class FileManager:
     }
     KEY_TO_GETTER: dict[str, Callable[[], Any]] = {
         "queues": lambda: getattr(q.QueueUtility, "all_queues"),
-        "orders": lambda: getattr(o.OrderUtility, "all_orders"),
+        "schedules": lambda: getattr(q.QueueUtility, "schedules"),
+        "orders": lambda: getattr(o.OrderUtility, "orders"),
         "failed": lambda: getattr(o.OrderUtility, "failed_orders"),
         "API_KEY": lambda: getattr(g, "API_KEY"),
         "SECRET": lambda: getattr(g, "SECRET"),
@@ -201,7 +203,8 @@ class FileManager:
 
                 for key in FileManager.FILE_PATH_TO_KEYS[FileManager.decrypt_path(file_path)]:
                     key: str
-                    FileManager.KEY_TO_SETTER[key](saved_info[key])
+                    if key in saved_info:  # Files saved before a key was added do not have it
+                        FileManager.KEY_TO_SETTER[key](saved_info[key])
             return True
         except OSError:
             return False
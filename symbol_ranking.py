@@ -0,0 +1,193 @@
+import heapq
+import threading
+from typing import Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:  # algorithm_trading imports this module to make DataAnalysis.tradable_symbol_ranking
+    import algorithm_trading as at
+
+
+class SymbolRanking:
+    """
+    Max heap of SymbolStat ordered by strength and indexed by symbol so each symbol is held once and can be added,
+    replaced, re-ranked after its SymbolStat changed or removed in O(log n) without rebuilding the heap:
+        ranking = SymbolRanking()
+        ranking.update(symbol_stat)        # adds it or replaces the symbol's old SymbolStat
+        symbol_stat.update(bar)
+        ranking.reposition(symbol_stat.symbol)
+        best = ranking.top(10)
+    _heap is a binary heap where the parent of index i is (i - 1) // 2 and _positions maps each symbol to its index in
+    _heap. Every method takes _lock so a BarStream thread can re-rank while another thread reads the top symbols.
+    """
+    def __init__(self):
+        self._heap: list[at.SymbolStat] = []
+        self._positions: dict[str, int] = {}
+        self._lock: threading.RLock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._positions
+
+    def __iter__(self) -> Iterator["at.SymbolStat"]:
+        """
+        Iterates over a copy of every SymbolStat in heap order, not sorted, use top for sorted
+        """
+        with self._lock:
+            return iter(list(self._heap))
+
+    def get(self, symbol: str) -> "at.SymbolStat | None":
+        """
+        Returns the symbol's SymbolStat or None if it is not ranked
+        :param str as symbol:
+        :return SymbolStat | None:
+        """
+        with self._lock:
+            position: int | None = self._positions.get(symbol)
+            return None if position is None else self._heap[position]
+
+    def update(self, symbol_stat: "at.SymbolStat") -> None:
+        """
+        Adds the SymbolStat or replaces the one already ranked for its symbol in O(log n)
+        :param SymbolStat as symbol_stat:
+        :return:
+        """
+        with self._lock:
+            position: int | None = self._positions.get(symbol_stat.symbol)
+            if position is None:
+                self._heap.append(symbol_stat)
+                position = len(self._heap) - 1
+                self._positions[symbol_stat.symbol] = position
+            else:
+                self._heap[position] = symbol_stat
+            self.__restore(position)
+
+    def extend(self, symbol_stats: list["at.SymbolStat"]) -> None:
+        """
+        Adds or replaces many SymbolStats, rebuilds the heap in O(n) when that is cheaper than updating each one
+        :param list[SymbolStat] as symbol_stats:
+        :return:
+        """
+        with self._lock:
+            if len(symbol_stats) < len(self._heap):
+                for symbol_stat in symbol_stats:
+                    self.update(symbol_stat)
+                return
+
+            by_symbol: dict[str, at.SymbolStat] = {symbol_stat.symbol: symbol_stat for symbol_stat in self._heap}
+            by_symbol.update((symbol_stat.symbol, symbol_stat) for symbol_stat in symbol_stats)
+            # heapq is a min heap so the comparisons are reversed by heapifying on negative strength
+            keyed: list[tuple[float, int, at.SymbolStat]] = [
+                (-symbol_stat.strength, index, symbol_stat) for index, symbol_stat in enumerate(by_symbol.values())
+            ]
+            heapq.heapify(keyed)
+            self._heap = [symbol_stat for _, _, symbol_stat in keyed]
+            self._positions = {symbol_stat.symbol: index for index, symbol_stat in enumerate(self._heap)}
+
+    def reposition(self, symbol: str) -> bool:
+        """
+        Moves the symbol's SymbolStat to where its current strength belongs in O(log n), call after changing it in
+        place such as with SymbolStat.update, returns False if the symbol is not ranked
+        :param str as symbol:
+        :return bool:
+        """
+        with self._lock:
+            position: int | None = self._positions.get(symbol)
+            if position is None:
+                return False
+            self.__restore(position)
+            return True
+
+    def remove(self, symbol: str) -> "at.SymbolStat | None":
+        """
+        Removes the symbol in O(log n) and returns its SymbolStat, None if it is not ranked
+        :param str as symbol:
+        :return SymbolStat | None:
+        """
+        with self._lock:
+            position: int | None = self._positions.pop(symbol, None)
+            if position is None:
+                return None
+            removed: at.SymbolStat = self._heap[position]
+            last: at.SymbolStat = self._heap.pop()
+            if position < len(self._heap):
+                self._heap[position] = last
+                self._positions[last.symbol] = position
+                self.__restore(position)
+            return removed
+
+    def peek(self) -> "at.SymbolStat | None":
+        """
+        Returns the strongest SymbolStat without removing it, None if nothing is ranked
+        :return SymbolStat | None:
+        """
+        with self._lock:
+            return self._heap[0] if len(self._heap) > 0 else None
+
+    def pop(self) -> "at.SymbolStat | None":
+        """
+        Removes and returns the strongest SymbolStat in O(log n), None if nothing is ranked
+        :return SymbolStat | None:
+        """
+        with self._lock:
+            return self.remove(self._heap[0].symbol) if len(self._heap) > 0 else None
+
+    def top(self, count: int) -> list["at.SymbolStat"]:
+        """
+        Returns the count strongest SymbolStats strongest first in O(count log count) without changing the heap, only
+        the children of indexes already taken can be next so at most count + 1 candidates are ever compared
+        :param int as count:
+        :return list[SymbolStat]:
+        """
+        with self._lock:
+            best: list[at.SymbolStat] = []
+            candidates: list[tuple[float, int]] = [(-self._heap[0].strength, 0)] if len(self._heap) > 0 else []
+            while len(candidates) > 0 and len(best) < count:
+                _, index = heapq.heappop(candidates)
+                best.append(self._heap[index])
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(candidates, (-self._heap[child].strength, child))
+            return best
+
+    def clear(self) -> None:
+        """
+        Removes every SymbolStat
+        :return:
+        """
+        with self._lock:
+            self._heap = []
+            self._positions = {}
+
+    def __restore(self, position: int) -> None:
+        """
+        Private helper that moves the SymbolStat at position up or down until the heap is ordered again, must be
+        called while the lock is held
+        :param int as position:
+        :return:
+        """
+        heap: list[at.SymbolStat] = self._heap
+        symbol_stat: at.SymbolStat = heap[position]
+
+        while position > 0:
+            parent: int = (position - 1) >> 1
+            if heap[parent].strength >= symbol_stat.strength:
+                break
+            heap[position] = heap[parent]
+            self._positions[heap[position].symbol] = position
+            position = parent
+
+        while True:
+            child: int = 2 * position + 1
+            if child >= len(heap):
+                break
+            if child + 1 < len(heap) and heap[child + 1].strength > heap[child].strength:
+                child += 1
+            if heap[child].strength <= symbol_stat.strength:
+                break
+            heap[position] = heap[child]
+            self._positions[heap[position].symbol] = position
+            position = child
+
+        heap[position] = symbol_stat
+        self._positions[symbol_stat.symbol] = position
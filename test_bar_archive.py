@@ -0,0 +1,67 @@
+import builtins
+import numpy as np
+import pytest
+import bar_archive as ba
+import bar_frame as bf
+
+
+def make_bars(timestamps: list[int]) -> bf.BarFrame:
+    """
+    Bars whose columns are all derived from "t" so misaligned rows are easy to spot
+    :param list[int] as timestamps:
+    :return BarFrame:
+    """
+    t: np.ndarray = np.array(timestamps, dtype=np.int64)
+    return bf.BarFrame(t=t, o=t + 0.1, h=t + 0.2, l=t + 0.3, c=t + 0.4, v=t, vw=t + 0.5, n=t)
+
+
+def fail_writing(monkeypatch: pytest.MonkeyPatch, file_name: str) -> None:
+    """
+    Makes opening the column file for writing raise OSError like a full disk would
+    :param pytest.MonkeyPatch as monkeypatch:
+    :param str as file_name:
+    :return:
+    """
+    def failing_open(path: str, mode: str = "r", *args, **kwargs):
+        if str(path).endswith(file_name) and mode != "rb":
+            raise OSError("No space left on device")
+        return builtins.open(path, mode, *args, **kwargs)
+    monkeypatch.setattr(ba, "open", failing_open, raising=False)
+
+
+def assert_aligned(frame: bf.BarFrame, timestamps: list[int]) -> None:
+    assert frame.t.tolist() == timestamps
+    for column in ("v", "n"):
+        assert getattr(frame, column).tolist() == timestamps
+    np.testing.assert_array_equal(frame.vw, frame.t + 0.5)
+
+
+def test_failed_append_does_not_misalign_columns(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    archive: ba.BarArchive = ba.BarArchive(str(tmp_path))
+    archive.append("A", "1Min", make_bars([1800, 1860]))
+
+    fail_writing(monkeypatch, "/v.bin")
+    with pytest.raises(OSError):
+        archive.append("A", "1Min", make_bars([1900, 1960]))
+    monkeypatch.undo()
+
+    assert archive.append("A", "1Min", make_bars([1900, 1960, 2020])) == 3
+    assert_aligned(archive.read("A", "1Min"), [1800, 1860, 1900, 1960, 2020])
+    assert_aligned(ba.BarArchive(str(tmp_path)).read("A", "1Min"), [1800, 1860, 1900, 1960, 2020])
+
+
+def test_failed_prepend_leaves_archive_unchanged(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    archive: ba.BarArchive = ba.BarArchive(str(tmp_path))
+    archive.append("A", "1Min", make_bars([1800, 1860]))
+
+    fail_writing(monkeypatch, "/vw.bin.tmp")
+    with pytest.raises(OSError):
+        archive.append("A", "1Min", make_bars([1680, 1740]))
+    monkeypatch.undo()
+
+    assert sorted(path.name for path in (tmp_path / "1Min" / "A").iterdir()) == sorted(
+        f"{column}.bin" for column in ba.BarArchive.DISK_TYPES
+    )
+    assert_aligned(archive.read("A", "1Min"), [1800, 1860])
+    assert archive.append("A", "1Min", make_bars([1680, 1740, 1800, 1860, 1920])) == 3
+    assert_aligned(ba.BarArchive(str(tmp_path)).read("A", "1Min"), [1680, 1740, 1800, 1860, 1920])
@@ -0,0 +1,113 @@
+import asyncio
+import http
+import json
+from typing import Any
+import numpy as np
+import pytest
+import websockets
+import bar_frame as bf
+import bar_stream as bs
+import market_data as m
+
+
+def recorded_bars(symbol: str, count: int, first: int = 1767623400) -> list[dict[str, Any]]:
+    """
+    Minute bars in the stream format
+    :param str as symbol:
+    :param int as count:
+    :param int as first: Epoch seconds of the first bar
+    :return list[dict[str, Any]]:
+    """
+    return [
+        {"S": symbol, "t": timestamp, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 100, "vw": 1.25, "n": 3}
+        for timestamp in bf.BarFrame.format_timestamps(np.arange(count) * 60 + first)
+    ]
+
+
+async def wait_until(condition, timeout: float = 10.0) -> None:
+    """
+    Polls the condition until it holds, fails the test after timeout seconds
+    :param Callable as condition:
+    :param float as timeout:
+    :return:
+    """
+    async def poll() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.fixture
+def fast_reconnect(monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """
+    Reconnects right away and records the symbols backfill asks the REST API for instead of sending the requests
+    :return list[list[str]]:
+    """
+    backfilled: list[list[str]] = []
+
+    def iter_completed_symbols(symbols: list[str], timeframe: str = "1Min", start: str | None = None, end: str | None = None):
+        backfilled.append(symbols)
+        return iter(())
+
+    monkeypatch.setattr(bs.BarStream, "RECONNECT_BASE", 0.01)
+    monkeypatch.setattr(m.MarketData, "iter_completed_symbols", staticmethod(iter_completed_symbols))
+    return backfilled
+
+
+def test_reconnects_and_backfills_after_a_drop(fast_reconnect: list[list[str]]) -> None:
+    async def scenario() -> None:
+        server: bs.BarReplayServer = bs.BarReplayServer(recorded_bars("AAPL", 10), drop_after=4)
+        stream: bs.BarStream = bs.BarStream(["AAPL"], url=await server.start())
+        task: asyncio.Task = asyncio.create_task(stream.run())
+        try:
+            await wait_until(lambda: stream.connections == 2 and len(stream.buffers["AAPL"]) == 10)
+        finally:
+            stream.stop(timeout=0)
+            await asyncio.wait_for(task, 5.0)
+            await server.stop()
+
+        assert server.connections == 2
+        assert fast_reconnect == [["AAPL"]]
+        frame: bf.BarFrame = stream.latest("AAPL")
+        assert frame.t.tolist() == (np.arange(10) * 60 + 1767623400).tolist()
+
+    asyncio.run(scenario())
+
+
+def test_reconnects_after_rejected_handshake_and_malformed_frame(fast_reconnect: list[list[str]]) -> None:
+    attempts: list[int] = [0]
+
+    async def process_request(path: str, request_headers: Any) -> Any:
+        attempts[0] += 1
+        if attempts[0] == 1:
+            return http.HTTPStatus.SERVICE_UNAVAILABLE, [], b""
+        return None
+
+    async def handler(websocket: Any, path: str | None = None) -> None:
+        await websocket.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        await websocket.recv()
+        await websocket.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+        await websocket.recv()
+        if attempts[0] == 2:
+            await websocket.send("not json")
+        else:
+            await websocket.send(json.dumps([{"T": "b", **bar} for bar in recorded_bars("AAPL", 3)]))
+        await websocket.wait_closed()
+
+    async def scenario() -> None:
+        server: Any = await websockets.serve(handler, "127.0.0.1", 0, process_request=process_request)
+        host, port = server.sockets[0].getsockname()[:2]
+        stream: bs.BarStream = bs.BarStream(["AAPL"], url=f"ws://{host}:{port}")
+        task: asyncio.Task = asyncio.create_task(stream.run())
+        try:
+            await wait_until(lambda: len(stream.buffers["AAPL"]) == 3)
+        finally:
+            stream.stop(timeout=0)
+            await asyncio.wait_for(task, 5.0)
+            server.close()
+            await server.wait_closed()
+
+        assert attempts[0] == 3
+        assert stream.connections == 2
+
+    asyncio.run(scenario())
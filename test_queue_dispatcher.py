@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+from collections import deque
+import pytest
+import globals as g
+import queue_dispatcher as qd
+
+
+class FakeOrder:
+    """
+    Stands in for an OrderRecord, the dispatcher only reads its id and sets exception
+    """
+    def __init__(self, order_id: int):
+        self.id: int = order_id
+        self.exception: Exception | None = None
+
+
+def test_rejected_duplicate_send_keeps_running_log(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(g, "alpaca_rate_limit", g.RateLimiter(capacity=1000, rate=100000.0))
+    monkeypatch.setattr(qd.QueueDispatcher, "LOG_DIRECTORY", str(tmp_path))
+    release: threading.Event = threading.Event()
+    submitted: list[int] = []
+
+    def submit(order: FakeOrder) -> str:
+        submitted.append(order.id)
+        if len(submitted) > 400:
+            release.wait()  # Keep the queue sending once its log is well past the write buffer
+        return f"sent {order.id}"
+
+    dispatcher: qd.QueueDispatcher = qd.QueueDispatcher(max_in_flight=2, submit=submit)
+    assert dispatcher.send("duplicate", deque(FakeOrder(order_id) for order_id in range(500)))
+    deadline: float = time.monotonic() + 10.0
+    while len(submitted) <= 400 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not dispatcher.send("duplicate", deque(FakeOrder(order_id) for order_id in range(5)))
+    release.set()
+    assert dispatcher.wait(timeout=10.0)
+
+    log_names: list[str] = os.listdir(tmp_path)
+    assert len(log_names) == 1
+    with open(tmp_path / log_names[0]) as file:
+        text: str = file.read()
+    assert "\0" not in text
+    assert text.count("sent ") == 500
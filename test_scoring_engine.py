@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+import algorithm_trading as at
+import bar_frame as bf
+import scoring_engine as se
+
+INPUT_KINDS: list[str] = ["ndarray", "bars", "frame"]
+
+
+def baseline_regression(symbol_data: list[dict[str, float | int | str]]) -> tuple[float, float]:
+    """
+    Copy of the original DataAnalysis.__calculate_linear_regression_by_least_squares loop, a one point regression
+    is a flat line through the point like ScoringEngine treats it instead of dividing by zero
+    :param list[dict[str, float | int | str]] as symbol_data:
+    :return tuple[float, float]: slope, y-intercept
+    """
+    n: float = 0.0
+    sum_of_xy: float = 0.0
+    sum_of_x: float = 0.0
+    sum_of_y: float = 0.0
+    sum_of_xx: float = 0.0
+
+    for symbol_info in symbol_data:
+        sum_of_x += n
+        sum_of_xy += n * symbol_info["vw"]
+        sum_of_y += symbol_info["vw"]
+        sum_of_xx += n * n
+        n += 1.0
+
+    if n == 1.0:
+        return 0.0, sum_of_y
+    slope: float = (n * sum_of_xy - sum_of_x * sum_of_y) / (n * sum_of_xx - sum_of_x * sum_of_x)
+    return slope, (sum_of_y - slope * sum_of_x) / n
+
+
+def baseline_score(symbol_data: list[dict[str, float | int | str]], window_percent: float) -> tuple[float, float, float]:
+    """
+    Copy of the original per bar and per window loops of analyze_requested_historical_bars, one least squares
+    regression per time_strength window
+    :param list[dict[str, float | int | str]] as symbol_data:
+    :param float as window_percent:
+    :return tuple[float, float, float]: stability_strength, time_strength, strength
+    """
+    symbol_data_len: int = len(symbol_data)
+    slope, y_intercept = baseline_regression(symbol_data)
+
+    stability_strength: float = 0.0
+    curr_x: float = 0.0
+    for symbol_info in symbol_data:
+        expected_value: float = slope * curr_x + y_intercept
+        if expected_value != 0.0:
+            stability_strength -= abs(abs(symbol_info["vw"] - expected_value) / expected_value)
+        curr_x += 1.0
+    stability_strength /= symbol_data_len
+
+    time_strength: float = 0.0
+    window_size: int = max(1, int(symbol_data_len * window_percent))
+    start_index: int = symbol_data_len - window_size
+    end_index: int = symbol_data_len
+    time_strength_multiplier: int = 16
+    num_windows: int = 0
+    while end_index > start_index:
+        slope, y_intercept = baseline_regression(symbol_data[start_index:end_index])
+        time_strength += time_strength_multiplier * ((slope * (end_index - start_index - 1) + y_intercept) / y_intercept - 1)
+        end_index = start_index
+        start_index = max(0, start_index - window_size)
+        num_windows += 1
+        if time_strength_multiplier > 1:
+            time_strength_multiplier >>= 1
+    time_strength /= num_windows
+    return stability_strength, time_strength, time_strength - stability_strength
+
+
+def random_prices(rng: np.random.Generator, count: int) -> np.ndarray:
+    """
+    Random walk of positive prices
+    :param np.random.Generator as rng:
+    :param int as count:
+    :return np.ndarray:
+    """
+    return 50.0 + np.cumsum(rng.normal(0.0, 1.0, count)) + np.arange(count) * 0.05
+
+
+def as_bars(prices: np.ndarray) -> list[dict[str, float | int | str]]:
+    """
+    Daily bars in the format request_past_prices returns with the prices as "vw"
+    :param np.ndarray as prices:
+    :return list[dict[str, float | int | str]]:
+    """
+    timestamps: list[str] = bf.BarFrame.format_timestamps(np.arange(len(prices), dtype=np.int64) * 86400 + 1577944800)
+    return [
+        {"t": timestamp, "o": price, "h": price, "l": price, "c": price, "v": 100, "vw": price, "n": 1}
+        for timestamp, price in zip(timestamps, prices.tolist())
+    ]
+
+
+def as_input(prices: np.ndarray, kind: str) -> list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray:
+    """
+    The prices in one of the forms score_universe and score_symbol take
+    :param np.ndarray as prices:
+    :param str as kind: One of INPUT_KINDS
+    :return list[dict[str, float | int | str]] | BarFrame | np.ndarray:
+    """
+    if kind == "ndarray":
+        return prices
+    if kind == "bars":
+        return as_bars(prices)
+    return bf.BarFrame.from_bars(as_bars(prices))
+
+
+def assert_matches_baseline(prices_by_symbol: dict[str, np.ndarray], window_percent: float, kind: str) -> None:
+    """
+    Checks score_universe and score_symbol against the original loops on the same prices
+    :param dict[str, np.ndarray] as prices_by_symbol:
+    :param float as window_percent:
+    :param str as kind: One of INPUT_KINDS
+    :return:
+    """
+    stock_info: dict[str, list[dict[str, float | int | str]] | bf.BarFrame | np.ndarray] = {
+        symbol: as_input(prices, kind) for symbol, prices in prices_by_symbol.items()
+    }
+    universe: list[at.SymbolStat] = se.ScoringEngine.score_universe(stock_info, window_percent)
+    assert [symbol_stat.symbol for symbol_stat in universe] == list(stock_info)
+
+    for symbol_stat in universe:
+        expected: tuple[float, float, float] = baseline_score(as_bars(prices_by_symbol[symbol_stat.symbol]), window_percent)
+        scored: at.SymbolStat = at.DataAnalysis.score_symbol(symbol_stat.symbol, stock_info[symbol_stat.symbol], window_percent)
+        for actual in (symbol_stat, scored):
+            assert actual.stability_strength == pytest.approx(expected[0], rel=1e-9, abs=1e-9)
+            assert actual.time_strength == pytest.approx(expected[1], rel=1e-9, abs=1e-9)
+            assert actual.strength == pytest.approx(expected[2], rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("kind", INPUT_KINDS)
+@pytest.mark.parametrize("window_percent", [0.01, 0.05, 0.3])
+def test_uneven_lengths_match_baseline(window_percent: float, kind: str) -> None:
+    rng: np.random.Generator = np.random.default_rng(7)
+    lengths: list[int] = [3, 17, 100, 101, 257, 999, 1300]
+    prices_by_symbol: dict[str, np.ndarray] = {f"S{index}": random_prices(rng, length) for index, length in enumerate(lengths)}
+    assert_matches_baseline(prices_by_symbol, window_percent, kind)
+
+
+@pytest.mark.parametrize("kind", INPUT_KINDS)
+@pytest.mark.parametrize("length", [1, 2])
+def test_one_and_two_point_series_match_baseline(length: int, kind: str) -> None:
+    rng: np.random.Generator = np.random.default_rng(length)
+    prices_by_symbol: dict[str, np.ndarray] = {"SHORT": random_prices(rng, length), "LONG": random_prices(rng, 250)}
+    assert_matches_baseline(prices_by_symbol, 0.01, kind)
+
+
+def test_one_point_series_is_flat() -> None:
+    symbol_stat: at.SymbolStat = se.ScoringEngine.score_universe({"ONE": np.array([42.0])})[0]
+    assert symbol_stat.time_strength == 0.0
+    assert np.isfinite(symbol_stat.stability_strength)
+    assert np.isfinite(symbol_stat.strength)
+
+
+def test_empty_symbols_are_skipped() -> None:
+    rng: np.random.Generator = np.random.default_rng(3)
+    universe: list[at.SymbolStat] = se.ScoringEngine.score_universe({"EMPTY": np.array([]), "FULL": random_prices(rng, 40)})
+    assert [symbol_stat.symbol for symbol_stat in universe] == ["FULL"]
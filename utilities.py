@@ -4,6 +4,20 @@ import globals as g
 import storage_manager
 from alpaca.broker import TradeAccount
 
+# Timeframe suffixes Alpaca accepts with how many seconds one unit spans, longer suffixes are checked first
+TIMEFRAME_UNIT_SECONDS: tuple[tuple[str, int], ...] = (
+    ("Month", 2592000),
+    ("Hour", 3600),
+    ("Week", 604800),
+    ("Min", 60),
+    ("Day", 86400),
+    ("T", 60),
+    ("H", 3600),
+    ("D", 86400),
+    ("W", 604800),
+    ("M", 2592000),
+)
+
 
 def no_trading_client() -> bool:
     """
@@ -30,6 +44,20 @@ def try_int(value: Any) -> int | None:
         return None
 
 
+def timeframe_to_seconds(timeframe: str) -> int | None:
+    """
+    Converts an Alpaca bar timeframe such as "1Min", "15T", "1Hour", "1Day", "1Week" or "1Month" to the number of
+    seconds it spans, a month is treated as 30 days, returns None if the timeframe is not understood
+    :param str as timeframe:
+    :return int | None:
+    """
+    for suffix, seconds in TIMEFRAME_UNIT_SECONDS:
+        if timeframe.endswith(suffix):
+            amount: int | None = try_int(timeframe[:-len(suffix)])
+            return None if amount is None or amount <= 0 else amount * seconds
+    return None
+
+
 def yes_or_no(msg: str = "View") -> str:
     """
     Keep in mind this asks for a "y" or "n" response
@@ -47,9 +75,11 @@ def view_account() -> None:
     if no_trading_client():
         return
 
+    g.alpaca_rate_limit.acquire(priority=g.RateLimiter.PRIORITY_ORDER)
     account: TradeAccount = g.trading_client.get_account()
     print(f"Current Cash: ${account.cash}")
 
+    g.alpaca_rate_limit.acquire(priority=g.RateLimiter.PRIORITY_ORDER)
     for p in g.trading_client.get_all_positions():
         p: Position
         print(f"{p.symbol}: {p.qty} shares")
@@ -63,10 +93,12 @@ def return_account_info() -> Optional[Tuple[float, Dict[str, int]]]:
     if no_trading_client():
         return
 
+    g.alpaca_rate_limit.acquire(priority=g.RateLimiter.PRIORITY_ORDER)
     account: TradeAccount = g.trading_client.get_account()
     print(f"Current Cash: ${account.cash}")
 
     symbol_qty: Dict[str, int] = {}
+    g.alpaca_rate_limit.acquire(priority=g.RateLimiter.PRIORITY_ORDER)
     for p in g.trading_client.get_all_positions():
         symbol_qty[p.symbol] = int(p.qty)
     